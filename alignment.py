@@ -0,0 +1,172 @@
+# 文件：alignment.py
+# PDB链 ↔ UniProt 比对引擎：按唯一序列去重、结果缓存、直接从比对坐标计算统计量
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from Bio.Align import PairwiseAligner
+
+from upstream import UpstreamClient
+
+UNIPROT_REST = "https://rest.uniprot.org/uniprotkb"
+
+
+def _make_aligner():
+    """与原有比对参数一致的全局比对器"""
+    aligner = PairwiseAligner()
+    aligner.mode = 'global'
+    aligner.match_score = 2
+    aligner.mismatch_score = -1
+    aligner.open_gap_score = -2
+    aligner.extend_gap_score = -0.5
+    return aligner
+
+
+def _segments_outside(blocks, length):
+    """返回 [0, length) 中未被比对块覆盖的区段（1-based 闭区间）"""
+    segments = []
+    current_pos = 0
+    for start, end in blocks:
+        if start > current_pos:
+            segments.append({'start': current_pos + 1, 'end': int(start), 'length': int(start - current_pos)})
+        current_pos = max(current_pos, int(end))
+    if current_pos < length:
+        segments.append({'start': current_pos + 1, 'end': length, 'length': length - current_pos})
+    return segments
+
+
+def best_alignment(uniprot_seq, pdb_seq):
+    """返回得分最高的全局比对"""
+    return _make_aligner().align(uniprot_seq, pdb_seq)[0]
+
+
+def align_sequences(uniprot_seq, pdb_seq):
+    """
+    比对一条PDB序列与UniProt序列（模块级函数，可在进程池中执行）
+    一致性、覆盖率和缺失/插入区段都由 alignment.aligned 坐标块计算
+    """
+    alignment = best_alignment(uniprot_seq, pdb_seq)
+    aligned_uniprot, aligned_pdb = alignment.aligned
+
+    u = np.frombuffer(uniprot_seq.encode(), dtype=np.uint8)
+    p = np.frombuffer(pdb_seq.encode(), dtype=np.uint8)
+    u_lengths = aligned_uniprot[:, 1] - aligned_uniprot[:, 0] if len(aligned_uniprot) else np.zeros(0, dtype=int)
+
+    matches = 0
+    for (us, ue), (ps, pe) in zip(aligned_uniprot, aligned_pdb):
+        matches += int(np.count_nonzero(u[us:ue] == p[ps:pe]))
+
+    uniprot_length = len(uniprot_seq)
+    covered = int(u_lengths.sum())
+    return {
+        'pdb_length': len(pdb_seq),
+        'aligned_length': covered,
+        'identity_percent': round(matches / uniprot_length * 100, 2) if uniprot_length else 0,
+        'coverage_percent': round(covered / uniprot_length * 100, 2) if uniprot_length else 0,
+        'missing_regions': _segments_outside(aligned_uniprot, uniprot_length),
+        'insertions': _segments_outside(aligned_pdb, len(pdb_seq)),
+        'alignment_score': float(alignment.score),
+    }
+
+
+class UniProtAlignmentEngine:
+    """按 (序列哈希, UniProt登录号) 缓存比对结果；唯一序列较多时分发到进程池（每个进程一个常驻进程池）"""
+
+    def __init__(self, max_cached_alignments=4096, parallel_threshold=8, processes=None,
+                 max_cached_sequences=1024, http_client=None):
+        # UniProt 请求经上游访问层（熔断、404负缓存、降级记录）
+        self.http = http_client or UpstreamClient()
+        self.max_cached_alignments = max_cached_alignments
+        self.max_cached_sequences = max_cached_sequences
+        self.parallel_threshold = parallel_threshold
+        self.processes = processes
+        self._alignments = OrderedDict()
+        self._uniprot_sequences = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    @staticmethod
+    def sequence_key(sequence, uniprot_id):
+        return hashlib.sha1(sequence.encode()).hexdigest(), uniprot_id.upper()
+
+    def fetch_uniprot_sequence(self, uniprot_id):
+        """获取UniProt canonical序列（进程内缓存，失败、不存在或上游熔断时返回None）"""
+        key = uniprot_id.upper()
+        with self._lock:
+            if key in self._uniprot_sequences:
+                self._uniprot_sequences.move_to_end(key)
+                return self._uniprot_sequences[key]
+        response = self.http.get(f"{UNIPROT_REST}/{uniprot_id}.fasta")
+        if response.status_code != 200:
+            return None
+        fasta_lines = response.text.strip().split('\n')
+        sequence = ''.join(fasta_lines[1:])
+        with self._lock:
+            self._uniprot_sequences[key] = sequence
+            while len(self._uniprot_sequences) > self.max_cached_sequences:
+                self._uniprot_sequences.popitem(last=False)
+        return sequence
+
+    def _pool(self):
+        """
+        当前进程的比对进程池：首次使用时创建，之后复用（fork 出的 worker 各自创建，不沿用父进程的池）
+        子进程用 forkserver（不支持时用 spawn）启动：worker 是多线程的，直接 fork 会把其他线程持有的锁带进子进程
+        """
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                     mp_context=multiprocessing.get_context(method))
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _align_parallel(self, uniprot_seqs, pdb_seqs):
+        try:
+            return list(self._pool().map(align_sequences, uniprot_seqs, pdb_seqs))
+        except BrokenProcessPool:
+            # 子进程异常退出（如被 OOM killer 结束）后进程池不可再用，下次重新创建；本次在当前进程内完成
+            with self._lock:
+                self._executor = None
+            return [align_sequences(u, p) for u, p in zip(uniprot_seqs, pdb_seqs)]
+
+    def align(self, jobs):
+        """
+        jobs: [(pdb_seq, uniprot_id, uniprot_seq), ...]
+        返回与 jobs 等长的结果列表；相同 (序列, 登录号) 只比对一次
+        """
+        results = [None] * len(jobs)
+        pending = OrderedDict()  # key -> (uniprot_seq, pdb_seq, [job下标])
+        with self._lock:
+            for i, (pdb_seq, uniprot_id, uniprot_seq) in enumerate(jobs):
+                key = self.sequence_key(pdb_seq, uniprot_id)
+                if key in self._alignments:
+                    self._alignments.move_to_end(key)
+                    results[i] = self._alignments[key]
+                elif key in pending:
+                    pending[key][2].append(i)
+                else:
+                    pending[key] = (uniprot_seq, pdb_seq, [i])
+
+        if pending:
+            uniprot_seqs = [v[0] for v in pending.values()]
+            pdb_seqs = [v[1] for v in pending.values()]
+            if len(pending) >= self.parallel_threshold:
+                computed = self._align_parallel(uniprot_seqs, pdb_seqs)
+            else:
+                computed = [align_sequences(u, p) for u, p in zip(uniprot_seqs, pdb_seqs)]
+
+            with self._lock:
+                for (key, (_, _, indices)), alignment in zip(pending.items(), computed):
+                    self._alignments[key] = alignment
+                    for i in indices:
+                        results[i] = alignment
+                while len(self._alignments) > self.max_cached_alignments:
+                    self._alignments.popitem(last=False)
+
+        return results
@@ -0,0 +1,134 @@
+# 文件：assembly.py
+# 生物组装体：解析 REMARK 350 (BIOMT) 对称操作，并以惰性坐标变换的方式展开
+import numpy as np
+
+from structure_arrays import bounding_box, boxes_overlap
+
+
+def parse_assemblies(pdb_file):
+    """
+    解析PDB文件头中的 REMARK 350
+    返回 {assembly_id: [{'chains': [...], 'operators': [(serial, rot, trans), ...]}, ...]}
+    """
+    assemblies = {}
+    current = None
+    group = None
+    rows = {}
+
+    with open(pdb_file) as handle:
+        for line in handle:
+            record = line[:6]
+            if record in ('ATOM  ', 'HETATM', 'MODEL '):
+                break  # 头部之后不会再有 REMARK 350
+            if not line.startswith('REMARK 350'):
+                continue
+
+            text = line[10:].strip()
+            if text.startswith('BIOMOLECULE:'):
+                current = text.split(':', 1)[1].strip()
+                assemblies[current] = []
+                group = None
+            elif current is not None and 'APPLY THE FOLLOWING TO CHAINS:' in text:
+                group = {'chains': [], 'operators': []}
+                assemblies[current].append(group)
+                group['chains'].extend(c.strip() for c in text.split(':', 1)[1].split(',') if c.strip())
+            elif group is not None and text.startswith('AND CHAINS:'):
+                # 链列表过长时的续行
+                group['chains'].extend(c.strip() for c in text.split(':', 1)[1].split(',') if c.strip())
+            elif current is not None and group is not None and text.startswith('BIOMT'):
+                parts = text.split()
+                row = int(parts[0][-1]) - 1
+                serial = int(parts[1])
+                rows.setdefault(serial, {})[row] = [float(v) for v in parts[2:6]]
+                if len(rows[serial]) == 3:
+                    matrix = np.array([rows[serial][r] for r in range(3)])
+                    group['operators'].append((serial, matrix[:, :3], matrix[:, 3]))
+                    del rows[serial]
+
+    return {aid: groups for aid, groups in assemblies.items() if groups}
+
+
+class BiologicalAssembly:
+    """由不对称单元坐标数组 + 对称操作组成的组装体，每个拷贝的坐标按需变换"""
+
+    def __init__(self, arrays, assembly_id, groups):
+        self.arrays = arrays
+        self.assembly_id = str(assembly_id)
+        self.copies = []
+        self._chain_boxes = {}
+
+        chain_atoms = {c: np.nonzero(arrays.chain == c)[0] for c in arrays.chain_ids()}
+        for group in groups:
+            for serial, rot, trans in group['operators']:
+                identity = np.allclose(rot, np.eye(3)) and np.allclose(trans, 0)
+                for chain_id in group['chains']:
+                    if chain_id not in chain_atoms:
+                        continue
+                    self.copies.append({
+                        'label': chain_id if identity else f"{chain_id}-{serial}",
+                        'chain': chain_id,
+                        'operator': serial,
+                        'identity': identity,
+                        'rot': rot,
+                        'trans': trans,
+                        'atoms': chain_atoms[chain_id],
+                    })
+
+    @classmethod
+    def from_file(cls, arrays, pdb_file, assembly_id):
+        """从PDB文件头读取指定组装体；不存在时返回None"""
+        groups = parse_assemblies(pdb_file).get(str(assembly_id))
+        if not groups:
+            return None
+        return cls(arrays, assembly_id, groups)
+
+    def __len__(self):
+        return len(self.copies)
+
+    def copy_coords(self, k, subset=None):
+        """第k个拷贝的坐标（subset为该链内的原子下标），变换在调用时才计算"""
+        copy = self.copies[k]
+        atoms = copy['atoms'] if subset is None else subset
+        coords = self.arrays.coords[atoms].astype(np.float64)
+        if copy['identity']:
+            return coords
+        return coords @ copy['rot'].T + copy['trans']
+
+    def copy_box(self, k):
+        """第k个拷贝的包围盒：只变换原链包围盒的8个角点，不触碰原子坐标"""
+        copy = self.copies[k]
+        chain_id = copy['chain']
+        if chain_id not in self._chain_boxes:
+            self._chain_boxes[chain_id] = bounding_box(self.arrays.coords[copy['atoms']].astype(np.float64))
+        lo, hi = self._chain_boxes[chain_id]
+        if copy['identity']:
+            return lo, hi
+        corners = np.array([[x, y, z] for x in (lo[0], hi[0]) for y in (lo[1], hi[1]) for z in (lo[2], hi[2])])
+        corners = corners @ copy['rot'].T + copy['trans']
+        return corners.min(axis=0), corners.max(axis=0)
+
+    def contact_pairs(self, cutoff, include_self=True):
+        """包围盒剪枝：返回扩展 cutoff 后包围盒相交的拷贝对 (i, j)，i <= j"""
+        if not self.copies:
+            return []
+        boxes = [self.copy_box(k) for k in range(len(self.copies))]
+        lo = np.array([b[0] for b in boxes])
+        hi = np.array([b[1] for b in boxes])
+        overlap = np.all((lo[:, None, :] - cutoff <= hi[None, :, :]) & (lo[None, :, :] - cutoff <= hi[:, None, :]), axis=2)
+        i_idx, j_idx = np.nonzero(np.triu(overlap, k=0 if include_self else 1))
+        return list(zip(i_idx.tolist(), j_idx.tolist()))
+
+    def neighbors_of(self, k, cutoff):
+        """与第k个拷贝包围盒相距不超过 cutoff 的其他拷贝"""
+        box_k = self.copy_box(k)
+        return [j for j in range(len(self.copies))
+                if j != k and boxes_overlap(box_k, self.copy_box(j), cutoff)]
+
+    def summary(self):
+        """组装体概要（可JSON序列化）"""
+        return {
+            'assembly_id': self.assembly_id,
+            'num_copies': len(self.copies),
+            'operators': sorted({c['operator'] for c in self.copies}),
+            'chains': [c['label'] for c in self.copies],
+        }
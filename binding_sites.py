@@ -0,0 +1,173 @@
+# 文件：binding_sites.py
+# 配体与结合位点：一次空间索引查询找出所有配体/离子/糖基与周围残基，按残基汇总最近距离与化学类别
+from collections import Counter
+
+import numpy as np
+
+from residue_properties import CATEGORIES, STANDARD, encode_resnames
+from structure_arrays import atom_pairs_within
+
+WATER = ('HOH', 'WAT', 'DOD', 'H2O')
+
+# 常见糖基残基（N/O-糖基化）
+GLYCANS = frozenset({'NAG', 'NDG', 'MAN', 'BMA', 'FUC', 'FUL', 'GAL', 'GLA', 'GLC', 'BGC', 'SIA', 'NGA', 'A2G',
+                     'XYS', 'XYP'})
+NUCLEOTIDES = frozenset({'A', 'C', 'G', 'U', 'I', 'DA', 'DC', 'DG', 'DT', 'DU', 'DI'})
+# 以 HETATM 记录的常见修饰氨基酸 → 母体氨基酸（用于化学类别）
+MODIFIED_PARENTS = {'MSE': 'MET', 'SEP': 'SER', 'TPO': 'THR', 'PTR': 'TYR', 'HYP': 'PRO', 'MLY': 'LYS',
+                    'M3L': 'LYS', 'KCX': 'LYS', 'LLP': 'LYS', 'CSO': 'CYS', 'CME': 'CYS', 'CSD': 'CYS',
+                    'SEC': 'CYS', 'PCA': 'GLU'}
+
+# 不同残基的原子距离不超过该值视为共价相连
+BOND_CUTOFF = 1.9
+
+
+def _residue_flags(residue_of_atom, atoms, mask, num_residues):
+    """每个残基是否含有满足 mask 的原子"""
+    return np.bincount(residue_of_atom[atoms[mask]], minlength=num_residues) > 0
+
+
+def _root(parent, r):
+    while parent[r] != r:
+        parent[r] = parent[parent[r]]
+        r = parent[r]
+    return r
+
+
+class BindingSiteAnalyzer:
+    """
+    结合位点分析
+    - 所有非水 HETATM 重原子一次性对全部重原子做近邻查询（KD树），共价键判定与接触残基都来自这一次查询
+    - 与聚合物共价相连且带主链原子的 HETATM 残基（MSE、修饰核苷酸等）视为聚合物残基，不算配体
+    - 彼此共价相连的 HETATM 残基（如糖链）合并为一个位点；单原子的为离子
+    """
+
+    def __init__(self, arrays, cutoff=4.0):
+        self.arrays = arrays
+        self.cutoff = cutoff
+        self.residue_starts = arrays.residue_starts()
+        residue_of_atom = np.zeros(len(arrays), dtype=np.int64)
+        residue_of_atom[self.residue_starts[1:]] = 1
+        self.residue_of_atom = np.cumsum(residue_of_atom)
+
+    def _label(self, r):
+        arrays, start = self.arrays, self.residue_starts[r]
+        return f"{arrays.chain[start]}:{arrays.resname[start]}{arrays.resseq[start]}{str(arrays.icode[start]).strip()}"
+
+    def run(self):
+        arrays = self.arrays
+        num_residues = len(self.residue_starts)
+        heavy = (arrays.element != 'H') & (arrays.element != 'D') & ~np.isin(arrays.resname, WATER)
+        hetero = np.asarray(arrays.hetero)
+        targets = np.nonzero(heavy)[0]
+        queries = np.nonzero(heavy & hetero)[0]
+        if not len(queries):
+            return self._result({}, {}, None)
+
+        qi, tj, dist = atom_pairs_within(arrays.coords[queries], arrays.coords[targets],
+                                         max(self.cutoff, BOND_CUTOFF))
+        query_residue = self.residue_of_atom[queries[qi]]
+        target_residue = self.residue_of_atom[targets[tj]]
+        bonded = (dist <= BOND_CUTOFF) & (query_residue != target_residue)
+
+        # 聚合物残基：ATOM 记录，加上与聚合物共价相连、带主链原子的 HETATM 残基
+        names = arrays.name[queries]
+        has = {name: _residue_flags(self.residue_of_atom, queries, names == name, num_residues)
+               for name in ('N', 'CA', 'C', 'P', "O3'")}
+        backbone = (has['N'] & has['CA'] & has['C']) | (has['P'] & has["O3'"])
+        polymer = np.zeros(num_residues, dtype=bool)
+        polymer[self.residue_of_atom[targets[~hetero[targets]]]] = True
+        linked = np.zeros(num_residues, dtype=bool)
+        linked[query_residue[bonded & polymer[target_residue]]] = True
+        polymer |= backbone & linked
+
+        atoms_per_residue = np.bincount(self.residue_of_atom[queries], minlength=num_residues)
+        ligand_residues = [r for r in np.unique(self.residue_of_atom[queries]).tolist() if not polymer[r]]
+
+        # 共价相连的配体残基合并为一个位点（离子不参与合并）
+        parent = {r: r for r in ligand_residues}
+        links = bonded & ~polymer[query_residue] & ~polymer[target_residue] \
+            & (atoms_per_residue[query_residue] > 1) & (atoms_per_residue[target_residue] > 1)
+        for a, b in set(zip(query_residue[links].tolist(), target_residue[links].tolist())):
+            root_a, root_b = _root(parent, a), _root(parent, b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+        site_of_residue = np.arange(num_residues)
+        components = {}
+        for r in ligand_residues:
+            site = site_of_residue[r] = _root(parent, r)
+            components.setdefault(site, []).append(r)
+
+        # 位点 × 聚合物残基：最近距离与原子接触数
+        contact = (dist <= self.cutoff) & ~polymer[query_residue] & polymer[target_residue]
+        keys, inverse = np.unique(site_of_residue[query_residue[contact]] * num_residues + target_residue[contact],
+                                  return_inverse=True)
+        min_distance = np.full(len(keys), np.inf)
+        np.minimum.at(min_distance, inverse, dist[contact])
+        num_contacts = np.bincount(inverse, minlength=len(keys))
+
+        contacted = keys % num_residues
+        classes = self._residue_classes(contacted, has['P'])
+        residues = {}
+        for k, (site, r) in enumerate(zip((keys // num_residues).tolist(), contacted.tolist())):
+            start = self.residue_starts[r]
+            residues.setdefault(site, []).append({
+                'residue': self._label(r),
+                'chain': str(arrays.chain[start]),
+                'resname': str(arrays.resname[start]),
+                'resseq': int(arrays.resseq[start]),
+                'icode': str(arrays.icode[start]).strip(),
+                'min_distance': round(min_distance[k], 2),
+                'num_contacts': int(num_contacts[k]),
+                'classes': classes[k],
+            })
+        return self._result(components, residues, atoms_per_residue)
+
+    def _residue_classes(self, residues, nucleotide_like):
+        """聚合物残基的化学类别：氨基酸按 residue_properties 的分类，核苷酸为 nucleotide，其余为 other"""
+        starts = self.residue_starts[residues]
+        resnames = self.arrays.resname[starts]
+        codes = encode_resnames([MODIFIED_PARENTS.get(str(name), str(name)) for name in resnames])
+        classes = []
+        for r, name, code in zip(residues.tolist(), resnames.tolist(), codes.tolist()):
+            if STANDARD[code]:
+                classes.append([category for category, flags in CATEGORIES.items() if flags[code]])
+            elif name in NUCLEOTIDES or nucleotide_like[r]:
+                classes.append(['nucleotide'])
+            else:
+                classes.append(['other'])
+        return classes
+
+    def _result(self, components, residues, atoms_per_residue):
+        arrays = self.arrays
+        sites = []
+        for root, members in sorted(components.items()):
+            resnames = [str(arrays.resname[self.residue_starts[r]]) for r in members]
+            num_atoms = int(sum(atoms_per_residue[r] for r in members))
+            if num_atoms == 1:
+                site_type = 'ion'
+            elif all(name in GLYCANS for name in resnames):
+                site_type = 'glycan'
+            else:
+                site_type = 'ligand'
+            site_residues = residues.get(root, [])
+            sites.append({
+                'site': self._label(root),
+                'type': site_type,
+                'resname': resnames[0],
+                'chain': str(arrays.chain[self.residue_starts[root]]),
+                'components': [self._label(r) for r in members],
+                'num_atoms': num_atoms,
+                'num_residues': len(site_residues),
+                'residues': site_residues,
+                'chemistry': dict(Counter(c for residue in site_residues for c in residue['classes'])),
+            })
+        counts = Counter(site['type'] for site in sites)
+        return {
+            'cutoff': self.cutoff,
+            'num_sites': len(sites),
+            'counts': {site_type: counts.get(site_type, 0) for site_type in ('ligand', 'ion', 'glycan')},
+            'ligand_names': dict(Counter(str(arrays.resname[self.residue_starts[r]])
+                                         for members in components.values() for r in members).most_common()),
+            'sites': sites,
+        }
@@ -0,0 +1,213 @@
+# 文件：contacts.py
+# 残基接触图：空间索引求残基对，稀疏COO存储（int32下标 + float16距离），紧凑二进制编码与按结构/截断距离缓存
+import json
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from structure_arrays import atom_pairs_self
+
+CONTACT_MODES = ('ca', 'heavy')
+# 截断距离保留的小数位：8 与 8.0000001 视为同一缓存条目，8.12345 与 8.12346 不会共用一个文件名
+CUTOFF_DECIMALS = 2
+
+
+def normalize_cutoff(cutoff):
+    """接触图计算与缓存使用的截断距离"""
+    return round(float(cutoff), CUTOFF_DECIMALS)
+
+# 二进制格式：魔数 + 版本 + 头部长度 + JSON头部 + rows(int32) + cols(int32) + distances(float16)，小端
+BINARY_MAGIC = b'G2PC'
+BINARY_VERSION = 1
+
+
+class ContactMap:
+    """残基接触图：residues 为残基表，(rows, cols, distances) 为 i < j 的稀疏上三角"""
+
+    def __init__(self, pdb_id, cutoff, mode, residues, rows, cols, distances):
+        self.pdb_id = pdb_id
+        self.cutoff = cutoff
+        self.mode = mode
+        self.residues = residues  # {'chain': [...], 'resseq': [...], 'icode': [...], 'resname': [...]}
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.cols = np.asarray(cols, dtype=np.int32)
+        self.distances = np.asarray(distances, dtype=np.float16)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def chain_min_distances(self):
+        """链对之间的最小接触距离（仅截断距离内有接触的链对）"""
+        if not len(self):
+            return {}
+        chain_ids, chain_index = np.unique(np.asarray(self.residues['chain']), return_inverse=True)
+        a, b = chain_index[self.rows], chain_index[self.cols]
+        inter = a != b
+        lo, hi = np.minimum(a, b)[inter], np.maximum(a, b)[inter]
+        n = len(chain_ids)
+        best = np.full(n * n, np.inf)
+        np.minimum.at(best, lo * n + hi, self.distances[inter].astype(np.float64))
+        return {f"{chain_ids[k // n]}-{chain_ids[k % n]}": round(best[k], 2)
+                for k in np.nonzero(np.isfinite(best))[0]}
+
+    def header(self):
+        return {'pdb_id': self.pdb_id, 'cutoff': self.cutoff, 'mode': self.mode,
+                'num_residues': len(self.residues['chain']), 'num_contacts': len(self),
+                'residues': self.residues, 'chain_min_distances': self.chain_min_distances()}
+
+    def to_dict(self):
+        """JSON表示"""
+        return dict(self.header(), rows=self.rows.tolist(), cols=self.cols.tolist(),
+                    distances=np.round(self.distances.astype(np.float64), 2))
+
+    def to_bytes(self):
+        """紧凑二进制编码"""
+        header = json.dumps(self.header(), separators=(',', ':')).encode()
+        return b''.join([
+            BINARY_MAGIC, struct.pack('<II', BINARY_VERSION, len(header)), header,
+            self.rows.astype('<i4').tobytes(), self.cols.astype('<i4').tobytes(),
+            self.distances.astype('<f2').tobytes(),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != BINARY_MAGIC:
+            raise ValueError('不是接触图二进制数据')
+        _, header_len = struct.unpack('<II', data[4:12])
+        header = json.loads(data[12:12 + header_len])
+        n = header['num_contacts']
+        offset = 12 + header_len
+        rows = np.frombuffer(data, dtype='<i4', count=n, offset=offset)
+        cols = np.frombuffer(data, dtype='<i4', count=n, offset=offset + 4 * n)
+        distances = np.frombuffer(data, dtype='<f2', count=n, offset=offset + 8 * n)
+        return cls(header['pdb_id'], header['cutoff'], header['mode'], header['residues'], rows, cols, distances)
+
+
+def compute_contact_map(pdb_id, arrays, cutoff=8.0, mode='ca'):
+    """
+    计算蛋白残基间接触（仅 ATOM 记录）
+    mode='ca'：Cα-Cα 距离；mode='heavy'：两残基重原子间的最小距离
+    """
+    polymer = arrays.select(~np.asarray(arrays.hetero))
+    if mode == 'ca':
+        atoms = polymer.select(polymer.name == 'CA')
+    else:
+        atoms = polymer.select(polymer.element != 'H')
+
+    # 残基表与原子 → 残基下标
+    starts = atoms.residue_starts()
+    residue_of_atom = np.zeros(len(atoms), dtype=np.int64)
+    if len(starts):
+        residue_of_atom[starts[1:]] = 1
+        residue_of_atom = np.cumsum(residue_of_atom)
+    residues = {
+        'chain': [str(c) for c in atoms.chain[starts]],
+        'resseq': [int(r) for r in atoms.resseq[starts]],
+        'icode': [str(i).strip() for i in atoms.icode[starts]],
+        'resname': [str(r) for r in atoms.resname[starts]],
+    }
+
+    i_idx, j_idx, dist = atom_pairs_self(atoms.coords, cutoff)
+    res_i, res_j = residue_of_atom[i_idx], residue_of_atom[j_idx]
+    keep = res_i != res_j
+    res_i, res_j, dist = res_i[keep], res_j[keep], dist[keep]
+    rows, cols = np.minimum(res_i, res_j), np.maximum(res_i, res_j)
+
+    # 同一残基对保留最小原子距离
+    if len(rows):
+        key = rows * len(starts) + cols
+        order = np.lexsort((dist, key))
+        key, rows, cols, dist = key[order], rows[order], cols[order], dist[order]
+        first = np.concatenate(([True], key[1:] != key[:-1]))
+        rows, cols, dist = rows[first], cols[first], dist[first]
+
+    return ContactMap(pdb_id, cutoff, mode, residues, rows, cols, dist)
+
+
+class ContactMapCache:
+    """按 (PDB ID, 截断距离, 模式) 缓存编码后的接触图：进程内LRU + 本地文件"""
+
+    def __init__(self, cache_dir='.gene2pdb_cache/contacts', max_in_memory=64):
+        self.cache_dir = cache_dir
+        self.max_in_memory = max_in_memory
+        self._blobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, pdb_id, cutoff, mode):
+        return os.path.join(self.cache_dir, f"{pdb_id.lower()}_{mode}_{normalize_cutoff(cutoff):g}.bin")
+
+    @staticmethod
+    def _key(pdb_id, cutoff, mode):
+        return pdb_id.lower(), normalize_cutoff(cutoff), mode
+
+    def get(self, pdb_id, cutoff, mode):
+        key = self._key(pdb_id, cutoff, mode)
+        path = self._path(pdb_id, cutoff, mode)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except OSError:
+            stamp = None
+        with self._lock:
+            cached = self._blobs.get(key)
+            # 内存中的副本只在文件未被失效/重写（其他进程同步修订）时有效；未能落盘的副本直接使用
+            if cached is not None and (cached[1] is None or cached[1] == stamp):
+                self._blobs.move_to_end(key)
+                return cached[0]
+        if stamp is None:
+            return None
+        with open(path, 'rb') as handle:
+            blob = handle.read()
+        self._remember(key, blob, stamp)
+        return blob
+
+    def put(self, pdb_id, cutoff, mode, blob):
+        stamp = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(pdb_id, cutoff, mode)
+            # 每次写入使用独立的临时文件，多个进程同时写同一条目时不会互相覆盖半成品
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f'.{os.path.basename(path)}-')
+            try:
+                with os.fdopen(fd, 'wb') as handle:
+                    handle.write(blob)
+                os.replace(tmp_path, path)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+            stamp = os.stat(path).st_mtime_ns
+        except OSError as e:
+            print(f"⚠️  写入接触图缓存失败: {e}")
+        self._remember(self._key(pdb_id, cutoff, mode), blob, stamp)
+
+    def _remember(self, key, blob, stamp):
+        with self._lock:
+            self._blobs[key] = (blob, stamp)
+            self._blobs.move_to_end(key)
+            while len(self._blobs) > self.max_in_memory:
+                self._blobs.popitem(last=False)
+
+    def keys_for(self, pdb_id):
+        """某个结构已缓存的接触图 [(cutoff, mode)]"""
+        prefix = pdb_id.lower() + '_'
+        keys = []
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix) and name.endswith('.bin'):
+                    mode, cutoff = name[len(prefix):-len('.bin')].rsplit('_', 1)
+                    keys.append((float(cutoff), mode))
+        return keys
+
+    def invalidate(self, pdb_id):
+        """删除某个结构的全部接触图"""
+        prefix = pdb_id.lower() + '_'
+        with self._lock:
+            for key in [k for k in self._blobs if k[0] == pdb_id.lower()]:
+                del self._blobs[key]
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(self.cache_dir, name))
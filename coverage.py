@@ -0,0 +1,138 @@
+# 文件：coverage.py
+# 基因（UniProt）层面的结构覆盖：每个结构的 UniProt 区间展开为逐残基的覆盖深度与最佳分辨率，贪心选出覆盖全长的最少结构
+import numpy as np
+
+# 分辨率缺失（NMR 等）时按该值参与比较
+MISSING_RESOLUTION = 99.0
+
+
+class StructureIntervals:
+    """
+    PDBe best_structures 记录的区间表示：每条链一个 [start, end]（UniProt 编号，1 起，闭区间）
+    区间下标 i 对应 pdb_ids[i] / chain_ids[i]
+    """
+
+    def __init__(self, pdb_ids, chain_ids, starts, ends, resolutions):
+        self.pdb_ids = np.asarray(pdb_ids, dtype=str)
+        self.chain_ids = np.asarray(chain_ids, dtype=str)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.resolutions = np.asarray(resolutions, dtype=np.float64)
+
+    @classmethod
+    def from_best_structures(cls, records):
+        """由 best_structures 接口的记录构建（缺少区间的记录跳过）"""
+        rows = [(r['pdb_id'].lower(), str(r.get('chain_id', '')), int(r['unp_start']), int(r['unp_end']),
+                 r.get('resolution') if r.get('resolution') is not None else MISSING_RESOLUTION)
+                for r in records if r.get('unp_start') is not None and r.get('unp_end') is not None]
+        return cls(*zip(*rows)) if rows else cls([], [], [], [], [])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def clip(self, length):
+        """截到 [1, length]，去掉截后为空的区间"""
+        starts, ends = np.maximum(self.starts, 1), np.minimum(self.ends, length)
+        keep = starts <= ends
+        return StructureIntervals(self.pdb_ids[keep], self.chain_ids[keep], starts[keep], ends[keep],
+                                  self.resolutions[keep])
+
+    def expand(self):
+        """展开为 (区间下标, 残基下标) 两个等长数组（残基下标 0 起）"""
+        lengths = self.ends - self.starts + 1
+        owner = np.repeat(np.arange(len(self)), lengths)
+        offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.arange(int(lengths.sum())) - offsets + np.repeat(self.starts - 1, lengths)
+        return owner, positions
+
+
+def coverage_tracks(intervals, length):
+    """逐残基的覆盖深度（int32）与最佳分辨率（float64，未覆盖为 nan）"""
+    depth = np.zeros(length + 1, dtype=np.int32)
+    np.add.at(depth, intervals.starts - 1, 1)
+    np.add.at(depth, intervals.ends, -1)
+    depth = np.cumsum(depth[:length], dtype=np.int32)
+
+    best = np.full(length, np.inf)
+    owner, positions = intervals.expand()
+    np.minimum.at(best, positions, intervals.resolutions[owner])
+    best[np.isinf(best)] = np.nan
+    return depth, best
+
+
+def minimal_cover(intervals, length, best, resolution_tolerance=0.5, max_structures=None):
+    """
+    贪心求覆盖：残基 r 由分辨率不差于 best[r] + resolution_tolerance 的区间“良好覆盖”
+    每轮选良好覆盖的未覆盖残基最多的区间（相同时取分辨率更好的），直到所有可覆盖残基都被覆盖
+    返回 [(区间下标, 新覆盖残基数)]，按选择顺序
+    """
+    owner, positions = intervals.expand()
+    good = intervals.resolutions[owner] <= best[positions] + resolution_tolerance
+    owner, positions = owner[good], positions[good]
+    covered = np.zeros(length, dtype=bool)
+    # 分辨率作为次要关键字：增益相同时选分辨率更好的区间
+    tie_break = -intervals.resolutions / (intervals.resolutions.max() + 1.0) if len(intervals) else None
+
+    chosen = []
+    while max_structures is None or len(chosen) < max_structures:
+        open_pairs = ~covered[positions]
+        if not open_pairs.any():
+            break
+        gains = np.bincount(owner[open_pairs], minlength=len(intervals))
+        pick = int(np.argmax(gains + tie_break))
+        chosen.append((pick, int(gains[pick])))
+        covered[positions[owner == pick]] = True
+    return chosen
+
+
+def _runs(*tracks):
+    """把若干等长逐残基数组压成取值不变的区段 [(start, end, values...)]（1 起，闭区间）"""
+    length = len(tracks[0])
+    if not length:
+        return []
+    change = np.zeros(length, dtype=bool)
+    change[0] = True
+    for track in tracks:
+        same = (track[1:] == track[:-1]) | (np.isnan(track[1:]) & np.isnan(track[:-1])
+                                            if track.dtype.kind == 'f' else False)
+        change[1:] |= ~same
+    starts = np.nonzero(change)[0]
+    ends = np.append(starts[1:], length) - 1
+    return [(int(s) + 1, int(e) + 1, *(track[s] for track in tracks)) for s, e in zip(starts, ends)]
+
+
+def gene_coverage(records, length=None, resolution_tolerance=0.5, max_structures=None):
+    """
+    由 best_structures 记录计算覆盖图与最少结构集合
+    length: UniProt 序列长度（未知时取区间最大终点）
+    """
+    intervals = StructureIntervals.from_best_structures(records)
+    if length is None:
+        length = int(intervals.ends.max()) if len(intervals) else 0
+    intervals = intervals.clip(length)
+    depth, best = coverage_tracks(intervals, length)
+    chosen = minimal_cover(intervals, length, best, resolution_tolerance, max_structures)
+
+    selected = [{'pdb_id': str(intervals.pdb_ids[i]), 'chain_id': str(intervals.chain_ids[i]),
+                 'start': int(intervals.starts[i]), 'end': int(intervals.ends[i]),
+                 'resolution': None if intervals.resolutions[i] == MISSING_RESOLUTION
+                 else intervals.resolutions[i],
+                 'new_residues': gain} for i, gain in chosen]
+    selected_covered = np.zeros(length, dtype=bool)
+    for item in selected:
+        selected_covered[item['start'] - 1:item['end']] = True
+
+    covered = int(np.count_nonzero(depth))
+    return {
+        'length': length,
+        'num_structures': len(set(intervals.pdb_ids.tolist())),
+        'num_chains': len(intervals),
+        'covered_residues': covered,
+        'coverage_pct': round(covered / length * 100, 1) if length else 0.0,
+        'selected': selected,
+        'selected_coverage_pct': round(int(selected_covered.sum()) / length * 100, 1) if length else 0.0,
+        # 逐残基轨道按取值不变的区段返回
+        'segments': [{'start': s, 'end': e, 'depth': int(d),
+                      'best_resolution': None if np.isnan(r) or r == MISSING_RESOLUTION else r}
+                     for s, e, d, r in _runs(depth, best)],
+    }
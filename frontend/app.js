@@ -6,6 +6,7 @@ let currentPdbId = null;
 let viewer = null;
 let currentReport = '';
 let currentSequencePdbId = null; // 跟踪当前序列分析的PDB ID
+const structureInfoCache = {}; // 结构基本信息缓存（列表与详情共用，避免重复请求）
 
 // 页面加载完成后初始化
 document.addEventListener('DOMContentLoaded', () => {
@@ -63,7 +64,7 @@ async function searchByGene(geneName) {
 
     // 获取相关结构
     const structuresResponse = await fetch(
-        `${API_BASE}/gene/structures?gene_name=${encodeURIComponent(geneName)}&species=${species}`
+        `${API_BASE}/gene/structures?gene_name=${encodeURIComponent(geneName)}&species=${species}&strategy=coverage`
     );
     const structuresData = await structuresResponse.json();
 
@@ -102,6 +103,7 @@ async function searchByPdbId(pdbId) {
     if (infoData.error) {
         throw new Error(infoData.error);
     }
+    structureInfoCache[pdbId] = infoData;
 
     // 显示基本信息
     displayBasicInfo({
@@ -111,12 +113,9 @@ async function searchByPdbId(pdbId) {
         method: infoData.method
     });
 
-    // 显示单个结构
+    // 显示单个结构（会自动选中并加载详情）
     await displayStructuresList([pdbId]);
 
-    // 显示详情
-    await showStructureDetail(pdbId);
-
     // 生成报告
     await generateReportForPdb(pdbId);
 
@@ -161,8 +160,14 @@ async function displayStructuresList(pdbIds) {
 
     for (const pdbId of pdbIds) {
         try {
-            const response = await fetch(`${API_BASE}/pdb/info/${pdbId}`);
-            const info = await response.json();
+            let info = structureInfoCache[pdbId];
+            if (!info) {
+                const response = await fetch(`${API_BASE}/pdb/info/${pdbId}`);
+                info = await response.json();
+                if (!info.error) {
+                    structureInfoCache[pdbId] = info;
+                }
+            }
 
             html += `
                 <div class="structure-item" onclick="selectStructure('${pdbId}')" id="structure-${pdbId}">
@@ -215,7 +220,36 @@ async function selectStructure(pdbId) {
     load3DViewer(pdbId);
 }
 
-// 显示结构详情
+// 流式读取结构面板合集：后端一次解析，每完成一段回调一次
+async function fetchStructureBundle(pdbId, sections, onSection) {
+    const response = await fetch(`${API_BASE}/pdb/bundle/${pdbId}?sections=${sections.join(',')}&stream=1`);
+    if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.error || response.statusText);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) {
+                const { section, data } = JSON.parse(line);
+                onSection(section, data);
+            }
+        }
+    }
+}
+
+// 显示结构详情（一次请求获取基本信息、物化性质、高级分析和序列组成）
 async function showStructureDetail(pdbId) {
     const container = document.getElementById('structureDetail');
     const content = document.getElementById('detailContent');
@@ -223,99 +257,122 @@ async function showStructureDetail(pdbId) {
     container.classList.remove('hidden');
     content.innerHTML = '<p>正在加载详情...</p>';
 
-    try {
-        // 获取 PDB 信息
-        const infoResponse = await fetch(`${API_BASE}/pdb/info/${pdbId}`);
-        const info = await infoResponse.json();
-
-        let html = `
-            <div class="detail-section">
-                <h3>📄 基本信息</h3>
-                <p><strong>PDB ID:</strong> ${pdbId.toUpperCase()}</p>
-                <p><strong>标题:</strong> ${info.title || 'N/A'}</p>
-                <p><strong>分辨率:</strong> ${info.resolution || 'N/A'}Å</p>
-                <p><strong>实验方法:</strong> ${info.method || 'N/A'}</p>
-                <p><strong>来源生物:</strong> ${info.organism || 'N/A'}</p>
-                <p><strong>发布日期:</strong> ${info.release_date || 'N/A'}</p>
-            </div>
-        `;
-
-        // 尝试获取分析数据
-        try {
-            const analysisResponse = await fetch(`${API_BASE}/pdb/analyze/${pdbId}`);
-            const analysis = await analysisResponse.json();
-
-            if (!analysis.error) {
-                html += `
-                    <div class="detail-section">
-                        <h3>🧪 物化性质</h3>
-                        <p><strong>链数:</strong> ${analysis.num_chains || 'N/A'}</p>
-                        <p><strong>残基数:</strong> ${analysis.num_residues || 'N/A'}</p>
-                        <p><strong>原子数:</strong> ${analysis.num_atoms || 'N/A'}</p>
-                    </div>
-                `;
-
-                if (analysis.secondary_structure) {
-                    const ss = analysis.secondary_structure;
-                    let ssHtml = `
-                        <div class="detail-section">
-                            <h3>🔗 二级结构</h3>
-                    `;
-
-                    if (ss.helix !== 'N/A') {
-                        ssHtml += `<p><strong>螺旋:</strong> ${ss.helix}${ss.helix_pct ? ` (${ss.helix_pct}%)` : ''}</p>`;
-                    } else {
-                        ssHtml += `<p><strong>螺旋:</strong> N/A</p>`;
-                    }
-
-                    if (ss.beta_sheet !== 'N/A') {
-                        ssHtml += `<p><strong>β折叠:</strong> ${ss.beta_sheet}${ss.beta_pct ? ` (${ss.beta_pct}%)` : ''}</p>`;
-                    } else {
-                        ssHtml += `<p><strong>β折叠:</strong> N/A</p>`;
-                    }
-
-                    if (ss.coil !== 'N/A') {
-                        ssHtml += `<p><strong>线圈:</strong> ${ss.coil}${ss.coil_pct ? ` (${ss.coil_pct}%)` : ''}</p>`;
-                    } else {
-                        ssHtml += `<p><strong>线圈:</strong> N/A</p>`;
-                    }
+    const sections = ['analysis', 'advanced'];
+    let info = structureInfoCache[pdbId];
+    let analysis = null;
+    if (info) {
+        renderStructureDetail(pdbId, info, null);
+    } else {
+        sections.unshift('info');
+    }
 
-                    if (ss.note) {
-                        ssHtml += `<p class="note"><small>💡 ${ss.note}</small></p>`;
-                    }
-                    if (ss.source) {
-                        ssHtml += `<p><small>数据来源: ${ss.source}</small></p>`;
-                    }
+    showAdvancedLoading();
+    if (prepareSequenceAnalysis(pdbId)) {
+        sections.push('composition');
+    }
 
-                    ssHtml += `</div>`;
-                    html += ssHtml;
+    try {
+        await fetchStructureBundle(pdbId, sections, (section, data) => {
+            // 已切换到其他结构时丢弃旧结果
+            if (currentPdbId && currentPdbId !== pdbId) {
+                return;
+            }
+            if (section === 'info') {
+                info = data;
+                if (!data.error) {
+                    structureInfoCache[pdbId] = data;
                 }
+                renderStructureDetail(pdbId, info, analysis);
+            } else if (section === 'analysis') {
+                analysis = data;
+                renderStructureDetail(pdbId, info || {}, analysis);
+            } else if (section === 'advanced') {
+                renderAdvancedAnalysis(data);
+            } else if (section === 'composition') {
+                renderSequenceAnalysis(pdbId, data);
             }
-        } catch (e) {
-            console.log('分析数据获取失败:', e);
-        }
+        });
+    } catch (error) {
+        content.innerHTML = `<p>加载详情失败: ${error.message}</p>`;
+    }
+}
+
+// 渲染结构详情（基本信息 + 物化性质 + 二级结构 + 外部链接）
+function renderStructureDetail(pdbId, info, analysis) {
+    const content = document.getElementById('detailContent');
 
-        // 添加外部链接
+    let html = `
+        <div class="detail-section">
+            <h3>📄 基本信息</h3>
+            <p><strong>PDB ID:</strong> ${pdbId.toUpperCase()}</p>
+            <p><strong>标题:</strong> ${info.title || 'N/A'}</p>
+            <p><strong>分辨率:</strong> ${info.resolution || 'N/A'}Å</p>
+            <p><strong>实验方法:</strong> ${info.method || 'N/A'}</p>
+            <p><strong>来源生物:</strong> ${info.organism || 'N/A'}</p>
+            <p><strong>发布日期:</strong> ${info.release_date || 'N/A'}</p>
+        </div>
+    `;
+
+    if (!analysis) {
+        html += '<p>正在加载物化性质...</p>';
+    } else if (!analysis.error) {
         html += `
             <div class="detail-section">
-                <h3>🔗 外部链接</h3>
-                <p><a href="https://www.rcsb.org/structure/${pdbId}" target="_blank">RCSB PDB 官网 →</a></p>
-                <p><a href="https://www.rcsb.org/3d-view/${pdbId}" target="_blank">RCSB 3D 查看器 →</a></p>
-                <p><a href="https://molstar.org/viewer/?pdb-id=${pdbId}" target="_blank">Molstar 查看器 →</a></p>
+                <h3>🧪 物化性质</h3>
+                <p><strong>链数:</strong> ${analysis.num_chains || 'N/A'}</p>
+                <p><strong>残基数:</strong> ${analysis.num_residues || 'N/A'}</p>
+                <p><strong>原子数:</strong> ${analysis.num_atoms || 'N/A'}</p>
             </div>
         `;
 
-        content.innerHTML = html;
+        if (analysis.secondary_structure) {
+            const ss = analysis.secondary_structure;
+            let ssHtml = `
+                <div class="detail-section">
+                    <h3>🔗 二级结构</h3>
+            `;
 
-        // 加载高级分析
-        loadAdvancedAnalysis(pdbId);
+            if (ss.helix !== 'N/A') {
+                ssHtml += `<p><strong>螺旋:</strong> ${ss.helix}${ss.helix_pct ? ` (${ss.helix_pct}%)` : ''}</p>`;
+            } else {
+                ssHtml += `<p><strong>螺旋:</strong> N/A</p>`;
+            }
 
-        // 加载序列分析
-        loadSequenceAnalysis(pdbId);
+            if (ss.beta_sheet !== 'N/A') {
+                ssHtml += `<p><strong>β折叠:</strong> ${ss.beta_sheet}${ss.beta_pct ? ` (${ss.beta_pct}%)` : ''}</p>`;
+            } else {
+                ssHtml += `<p><strong>β折叠:</strong> N/A</p>`;
+            }
 
-    } catch (error) {
-        content.innerHTML = `<p>加载详情失败: ${error.message}</p>`;
+            if (ss.coil !== 'N/A') {
+                ssHtml += `<p><strong>线圈:</strong> ${ss.coil}${ss.coil_pct ? ` (${ss.coil_pct}%)` : ''}</p>`;
+            } else {
+                ssHtml += `<p><strong>线圈:</strong> N/A</p>`;
+            }
+
+            if (ss.note) {
+                ssHtml += `<p class="note"><small>💡 ${ss.note}</small></p>`;
+            }
+            if (ss.source) {
+                ssHtml += `<p><small>数据来源: ${ss.source}</small></p>`;
+            }
+
+            ssHtml += `</div>`;
+            html += ssHtml;
+        }
     }
+
+    // 添加外部链接
+    html += `
+        <div class="detail-section">
+            <h3>🔗 外部链接</h3>
+            <p><a href="https://www.rcsb.org/structure/${pdbId}" target="_blank">RCSB PDB 官网 →</a></p>
+            <p><a href="https://www.rcsb.org/3d-view/${pdbId}" target="_blank">RCSB 3D 查看器 →</a></p>
+            <p><a href="https://molstar.org/viewer/?pdb-id=${pdbId}" target="_blank">Molstar 查看器 →</a></p>
+        </div>
+    `;
+
+    content.innerHTML = html;
 }
 
 // 加载 3D 查看器
@@ -476,17 +533,19 @@ function hideError() {
 }
 
 // ==================== 高级结构分析 ====================
-async function loadAdvancedAnalysis(pdbId) {
+function showAdvancedLoading() {
     const container = document.getElementById('advancedAnalysis');
     const content = document.getElementById('advancedContent');
 
     container.classList.remove('hidden');
     content.innerHTML = '<p>正在加载高级分析数据...</p>';
+}
 
-    try {
-        const response = await fetch(`${API_BASE}/pdb/analyze-advanced/${pdbId}`);
-        const data = await response.json();
+// 渲染高级分析（数据来自结构面板合集的 advanced 段）
+function renderAdvancedAnalysis(data) {
+    const content = document.getElementById('advancedContent');
 
+    try {
         if (data.error) {
             content.innerHTML = `<p>加载失败: ${data.error}</p>`;
             return;
@@ -686,13 +745,14 @@ async function analyzeMutation() {
 // ==================== 序列组成分析 ====================
 let sequenceCharts = {};
 
-async function loadSequenceAnalysis(pdbId) {
+// 准备序列分析面板；已经加载过该结构时返回 false（无需再请求 composition 段）
+function prepareSequenceAnalysis(pdbId) {
     const container = document.getElementById('sequenceAnalysis');
     const content = document.getElementById('sequenceContent');
 
     // 如果是同一个PDB ID，不重复加载
     if (currentSequencePdbId === pdbId) {
-        return;
+        return false;
     }
 
     container.classList.remove('hidden');
@@ -709,11 +769,14 @@ async function loadSequenceAnalysis(pdbId) {
     sequenceCharts = {};
 
     currentSequencePdbId = pdbId;
+    return true;
+}
 
-    try {
-        const response = await fetch(`${API_BASE}/pdb/sequence-composition/${pdbId}`);
-        const data = await response.json();
+// 渲染序列组成（数据来自结构面板合集的 composition 段）
+function renderSequenceAnalysis(pdbId, data) {
+    const content = document.getElementById('sequenceContent');
 
+    try {
         // 检查是否仍然是当前请求的PDB（防止异步竞态）
         if (currentSequencePdbId !== pdbId) {
             return;
@@ -4,107 +4,218 @@ from Bio.PDB import PDBParser, PDBList
 from Bio.PDB.DSSP import DSSP
 from Bio.PDB.SASA import ShrakeRupley
 from Bio.SeqUtils import ProtParam
-from Bio.Align import PairwiseAligner
 import py3Dmol
 import pandas as pd
+import numpy as np
+import os
+import shutil
+import tempfile
+import threading
 import warnings
 import re
+from contextlib import contextmanager
+
+from alignment import UniProtAlignmentEngine
+from assembly import BiologicalAssembly, parse_assemblies
+from binding_sites import BindingSiteAnalyzer
+from contacts import CONTACT_MODES, ContactMap, ContactMapCache, compute_contact_map, normalize_cutoff
+from coverage import gene_coverage
+from interfaces import InterfaceAnalyzer, assembly_units, chain_units
+from memory_budget import PDB_LINE_BYTES, MemoryBudgetExceeded, estimate_bytes, memory_admitted
+from quick_jobs import QuickAnalysisJobs, is_pdb_id
+from result_store import stored_result
+from serialization import project, wants
+from single_flight import SingleFlight, single_flight
+from residue_mapping import ResidueMapIndex, map_from_alignment, map_from_sifts
+from residue_properties import (AMINO_ACID_PROPERTIES, AMINO_ACIDS, HYDROPHOBIC, STANDARD, THREE_TO_ONE, UNKNOWN,
+                                category_counts, decode, encode_resnames, encode_sequence, residue_counts)
+from structure_stream import summarize_pdb_file
+from upstream import UPSTREAM_BASE, UpstreamClient, rewrite_url
+from structure_arrays import AtomArrays, atom_pairs_within, atomic_radii, shrake_rupley
+from variant_annotation import (BURIED_RSA, SS_NAMES, impact_level, parse_protein_change, residue_burial,
+                                substitution_impact)
 
 warnings.filterwarnings('ignore')
 
-# 氨基酸属性常量
-AMINO_ACID_PROPERTIES = {
-    'A': {'name': 'Alanine', 'charge': 0, 'hydrophobic': True, 'volume': 88.6, 'polar': False},
-    'C': {'name': 'Cysteine', 'charge': 0, 'hydrophobic': True, 'volume': 108.5, 'polar': False},
-    'D': {'name': 'Aspartic acid', 'charge': -1, 'hydrophobic': False, 'volume': 111.1, 'polar': True},
-    'E': {'name': 'Glutamic acid', 'charge': -1, 'hydrophobic': False, 'volume': 138.4, 'polar': True},
-    'F': {'name': 'Phenylalanine', 'charge': 0, 'hydrophobic': True, 'volume': 189.9, 'polar': False},
-    'G': {'name': 'Glycine', 'charge': 0, 'hydrophobic': True, 'volume': 60.1, 'polar': False},
-    'H': {'name': 'Histidine', 'charge': 0.5, 'hydrophobic': False, 'volume': 153.2, 'polar': True},
-    'I': {'name': 'Isoleucine', 'charge': 0, 'hydrophobic': True, 'volume': 166.7, 'polar': False},
-    'K': {'name': 'Lysine', 'charge': 1, 'hydrophobic': False, 'volume': 168.6, 'polar': True},
-    'L': {'name': 'Leucine', 'charge': 0, 'hydrophobic': True, 'volume': 166.7, 'polar': False},
-    'M': {'name': 'Methionine', 'charge': 0, 'hydrophobic': True, 'volume': 162.9, 'polar': False},
-    'N': {'name': 'Asparagine', 'charge': 0, 'hydrophobic': False, 'volume': 114.1, 'polar': True},
-    'P': {'name': 'Proline', 'charge': 0, 'hydrophobic': True, 'volume': 112.7, 'polar': False},
-    'Q': {'name': 'Glutamine', 'charge': 0, 'hydrophobic': False, 'volume': 143.8, 'polar': True},
-    'R': {'name': 'Arginine', 'charge': 1, 'hydrophobic': False, 'volume': 173.4, 'polar': True},
-    'S': {'name': 'Serine', 'charge': 0, 'hydrophobic': False, 'volume': 89.0, 'polar': True},
-    'T': {'name': 'Threonine', 'charge': 0, 'hydrophobic': False, 'volume': 116.1, 'polar': True},
-    'V': {'name': 'Valine', 'charge': 0, 'hydrophobic': True, 'volume': 140.0, 'polar': False},
-    'W': {'name': 'Tryptophan', 'charge': 0, 'hydrophobic': True, 'volume': 227.8, 'polar': False},
-    'Y': {'name': 'Tyrosine', 'charge': 0, 'hydrophobic': False, 'volume': 193.6, 'polar': True},
-}
-
-# 三字母到单字母氨基酸转换
-THREE_TO_ONE = {
-    'ALA': 'A', 'CYS': 'C', 'ASP': 'D', 'GLU': 'E', 'PHE': 'F',
-    'GLY': 'G', 'HIS': 'H', 'ILE': 'I', 'LYS': 'K', 'LEU': 'L',
-    'MET': 'M', 'ASN': 'N', 'PRO': 'P', 'GLN': 'Q', 'ARG': 'R',
-    'SER': 'S', 'THR': 'T', 'VAL': 'V', 'TRP': 'W', 'TYR': 'Y'
-}
+# PDB 坐标文件下载服务器（Bio.PDB.PDBList 的默认值）
+PDB_FILE_SERVER = 'https://files.wwpdb.org'
+
+# 结构面板合集（/api/pdb/bundle）可选的分段
+BUNDLE_SECTIONS = ('info', 'analysis', 'advanced', 'composition')
+
+# 盐桥判定使用的带电原子
+SALT_BRIDGE_POSITIVE_ATOMS = {'ARG': ['NH1', 'NH2', 'NE'], 'LYS': ['NZ'], 'HIS': ['ND1', 'NE2']}
+SALT_BRIDGE_NEGATIVE_ATOMS = {'ASP': ['OD1', 'OD2'], 'GLU': ['OE1', 'OE2']}
+
+
+def download_pdb_file(pdb_id, pdb_dir, overwrite=False):
+    """
+    下载坐标文件到 pdb_dir/pdbXXXX.ent：先下载解压到临时目录再原子替换，
+    其他线程/进程不会读到写了一半的文件；已存在且不覆盖时直接返回，失败返回None并保留旧文件
+    """
+    path = os.path.join(pdb_dir, f"pdb{pdb_id.lower()}.ent")
+    if not overwrite and os.path.exists(path):
+        return path
+    os.makedirs(pdb_dir or '.', exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=pdb_dir, prefix='.download-')
+    try:
+        downloaded = PDBList(server=rewrite_url(PDB_FILE_SERVER)).retrieve_pdb_file(
+            pdb_id, pdir=tmp_dir, file_format='pdb', overwrite=True)
+        if not downloaded:
+            return None
+        os.replace(downloaded, path)
+        return path
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
 class GGETPDB:
     """gget的PDB结构分析扩展"""
 
-    def __init__(self):
+    def __init__(self, structure_cache=None, pdb_dir='.', use_remote_annotations=True,
+                 residue_map_dir='.gene2pdb_cache/residue_maps', result_store=None, sequence_index=None,
+                 stream_threshold_mb=64, http_client=None, contacts_dir='.gene2pdb_cache/contacts',
+                 memory_budget=None, memory_monitor=None):
         self.rcsb_base = "https://data.rcsb.org/rest/v1"
         self.uniprot_api = "https://rest.uniprot.org/uniprotkb"
+        # 可选的跨进程结构数组缓存（SharedStructureCache）
+        self.structure_cache = structure_cache
+        # PDB文件的下载/查找目录
+        self.pdb_dir = pdb_dir
+        # 为False时不调用PDBe/RCSB注解接口，二级结构和氢键直接使用DSSP（离线批量扫描）
+        self.use_remote_annotations = use_remote_annotations
+        # 残基级 UniProt ↔ PDB 编号映射（按结构和登录号缓存到本地）
+        self.residue_maps = ResidueMapIndex(residue_map_dir)
+        # 可选的分析结果持久化存储（ResultStore）；命中时直接返回已保存的结果
+        self.result_store = result_store
+        # 可选的本地 k-mer 序列索引（KmerSequenceIndex）；新解析的结构自动加入
+        self.sequence_index = sequence_index
+        # 坐标文件不小于该大小（且未在共享缓存中）时，计数/组成统计走流式单遍扫描，不构建对象树
+        self.stream_threshold_bytes = stream_threshold_mb * 1024 ** 2
+        # 外部注解接口访问层：按上游熔断、404负缓存、过期数据先返回再后台刷新
+        self.http = http_client or UpstreamClient()
+        # PDB链 ↔ UniProt 比对引擎（UniProt序列与比对结果缓存，序列经上述访问层获取）
+        self.alignment_engine = UniProtAlignmentEngine(http_client=self.http)
+        # 残基接触图缓存（按结构、截断距离和模式）
+        self.contact_cache = ContactMapCache(contacts_dir)
+        # 可选的全局内存预算（MemoryBudget）：重分析按预估内存排队、降级或拒绝
+        self.memory_budget = memory_budget
+        # 可选的按请求内存记录（MemoryMonitor）：记录准入模式与预估值
+        self.memory_monitor = memory_monitor
+        # 计算级单飞：同一结构/参数的并发分析与下载只执行一次，其余调用共享结果（设为None关闭）
+        self.single_flight = SingleFlight(events=self.http)
+        # 有时间预算的快速分析任务（到期返回部分结果，凭令牌续取）
+        self.quick_jobs = QuickAnalysisJobs(self)
+        # 线程内的解析作用域：作用域内同一结构只解析一次
+        self._parse_scope = threading.local()
+        # 线程内当前的准入模式（'full' / 'reduced'）
+        self._admission = threading.local()
 
     # ==================== 1. 智能映射 ====================
-    def gene_to_structures(self, gene_name, species="human", max_structures=5):
-        """将基因名映射到相关PDB结构"""
+    def gene_to_structures(self, gene_name, species="human", max_structures=5, strategy='resolution'):
+        """
+        将基因名映射到相关PDB结构
+        strategy='resolution' 按分辨率取前 max_structures 个；'coverage' 取覆盖蛋白全长的最少结构（最多 max_structures 个）
+        """
         print(f"🔍 正在查询基因 '{gene_name}' 的蛋白结构...")
 
-        # 使用gget获取基因信息
         try:
-            import gget
-            search_result = gget.search(gene_name, species=species)
-            # 正确判断DataFrame是否为空，并提取第一个基因的ID
-            if search_result.empty:  # 使用 .empty 属性判断
-                return []
-
-            gene_id = search_result.iloc[0]['ensembl_id']
-            info_df = gget.info([gene_id])  # 返回的是一个DataFrame
-            # 从DataFrame中提取‘uniprot_id’列，如果没有该列则为None
-            if not info_df.empty and 'uniprot_id' in info_df.columns:
-                uniprot_id = info_df.iloc[0]['uniprot_id']
-                # 处理可能存在的多个ID（比如用分号隔开的情况）
-                if pd.notna(uniprot_id):
-                    # 取第一个ID（如果需要所有ID，可以保留列表）
-                    uniprot_id = str(uniprot_id).split(';')[0].strip()
-                else:
-                    uniprot_id = None
-            else:
-                uniprot_id = None
+            uniprot_id = self._gene_uniprot_id(gene_name, species)
+            if uniprot_id:
+                structures = self._best_structures(uniprot_id)
+                if strategy == 'coverage':
+                    coverage = gene_coverage(structures, self._uniprot_length(uniprot_id),
+                                             max_structures=max_structures)
+                    return list(dict.fromkeys(item['pdb_id'] for item in coverage['selected']))
+                sorted_structures = sorted(structures, key=lambda x: x.get('resolution') or 999)
+                return [s['pdb_id'] for s in sorted_structures[:max_structures]]
+        except Exception as e:
+            print(f"⚠️  映射过程中出现错误: {e}")
 
-            if not uniprot_id:
-                # 备用方案：直接通过UniProt API搜索
-                params = {"query": f"gene:{gene_name} AND organism:{species}", "format": "json"}
-                response = requests.get(self.uniprot_api, params=params).json()
-                if response.get("results"):
-                    uniprot_id = response["results"][0]["primaryAccession"]
+        return []
 
-            if uniprot_id:
-                # 通过PDBe API获取结构映射
-                url = f"https://www.ebi.ac.uk/pdbe/api/mappings/best_structures/{uniprot_id}"
-                response = requests.get(url)
-                if response.status_code == 200:
-                    structures = response.json().get(uniprot_id, [])
-                    sorted_structures = sorted(structures, key=lambda x: x.get('resolution') or 999)
-                    return [s['pdb_id'] for s in sorted_structures[:max_structures]]
+    def gene_structure_coverage(self, gene_name, species="human", resolution_tolerance=0.5):
+        """
+        基因的结构覆盖图：逐残基覆盖深度与最佳分辨率（按区段），以及覆盖全长的最少结构集合
+        残基 r 的候选结构须不差于该位置最佳分辨率 + resolution_tolerance Å
+        """
+        print(f"🗺️ 正在计算基因 '{gene_name}' 的结构覆盖...")
+        try:
+            uniprot_id = self._gene_uniprot_id(gene_name, species)
+            structures = self._best_structures(uniprot_id) if uniprot_id else []
         except Exception as e:
             print(f"⚠️  映射过程中出现错误: {e}")
+            return {'gene_name': gene_name, 'error': str(e)}
+        if not uniprot_id:
+            return {'gene_name': gene_name, 'error': f'未找到基因 {gene_name} 对应的UniProt条目'}
+        result = {'gene_name': gene_name, 'species': species, 'uniprot_id': uniprot_id,
+                  'resolution_tolerance': resolution_tolerance}
+        result.update(gene_coverage(structures, self._uniprot_length(uniprot_id), resolution_tolerance))
+        return result
+
+    def _gene_uniprot_id(self, gene_name, species):
+        """基因名 → UniProt 登录号；找不到时返回None"""
+        # 使用gget获取基因信息（上游指向本地替身时跳过：gget 访问的 Ensembl 无法改写地址）
+        info_df = pd.DataFrame()
+        # gget 调用经 'ensembl' 熔断器；失败或熔断时返回None，改用下方的 UniProt 搜索
+        if not UPSTREAM_BASE:
+            import gget
+            search_result = self.http.call('ensembl', gget.search, gene_name, species=species)
+            # 正确判断DataFrame是否为空，并提取第一个基因的ID
+            if search_result is not None and search_result.empty:  # 使用 .empty 属性判断
+                return None
+
+            if search_result is not None:
+                gene_id = search_result.iloc[0]['ensembl_id']
+                info = self.http.call('ensembl', gget.info, [gene_id])  # 返回的是一个DataFrame
+                if info is not None:
+                    info_df = info
+        # 从DataFrame中提取‘uniprot_id’列，如果没有该列则为None
+        if not info_df.empty and 'uniprot_id' in info_df.columns:
+            uniprot_id = info_df.iloc[0]['uniprot_id']
+            # 处理可能存在的多个ID（比如用分号隔开的情况）
+            if pd.notna(uniprot_id):
+                # 取第一个ID（如果需要所有ID，可以保留列表）
+                uniprot_id = str(uniprot_id).split(';')[0].strip()
+            else:
+                uniprot_id = None
+        else:
+            uniprot_id = None
 
+        if not uniprot_id:
+            # 备用方案：直接通过UniProt API搜索
+            params = {"query": f"gene:{gene_name} AND organism:{species}", "format": "json"}
+            response = self.http.get(self.uniprot_api, params=params)
+            results = response.json().get("results") if response.status_code == 200 else None
+            if results:
+                uniprot_id = results[0]["primaryAccession"]
+        return uniprot_id
+
+    def _best_structures(self, uniprot_id):
+        """PDBe best_structures：覆盖该UniProt条目的每条链及其 UniProt 区间、分辨率"""
+        url = f"https://www.ebi.ac.uk/pdbe/api/mappings/best_structures/{uniprot_id}"
+        response = self.http.get(url)
+        if response.status_code == 200:
+            return response.json().get(uniprot_id, [])
         return []
 
+    def _uniprot_length(self, uniprot_id):
+        """UniProt canonical 序列长度；获取失败返回None（由区间终点推断）"""
+        try:
+            sequence = self.alignment_engine.fetch_uniprot_sequence(uniprot_id)
+        except requests.RequestException as e:
+            print(f"⚠️  获取UniProt序列失败: {e}")
+            return None
+        return len(sequence) if sequence else None
+
     # ==================== 2. PDB查询与获取 ====================
+    @single_flight('info')
+    @stored_result('info')
     def fetch_pdb_info(self, pdb_id):
         """获取PDB结构详细信息"""
         url = f"{self.rcsb_base}/core/entry/{pdb_id}"
         try:
-            response = requests.get(url)
+            response = self.http.get(url)
             if response.status_code == 200:
                 data = response.json()
                 # 提取关键信息
@@ -120,7 +231,7 @@ class GGETPDB:
 
                 # 获取链信息和来源生物
                 polymer_url = f"{self.rcsb_base}/core/polymer_entity/{pdb_id}/1"
-                polymer_resp = requests.get(polymer_url)
+                polymer_resp = self.http.get(polymer_url)
                 if polymer_resp.status_code == 200:
                     polymer_data = polymer_resp.json()
                     info['sequence'] = polymer_data.get('entity_poly', {}).get('pdbx_seq_one_letter_code_can', '')
@@ -182,27 +293,236 @@ class GGETPDB:
         print(f"🔄 正在对比 {pdb_id1} (红色) 和 {pdb_id2} (蓝色)")
         return viewer
 
+    @staticmethod
+    def revision_key(accession):
+        """rcsb_accession_info → 修订标识 '修订日期/主版本.次版本'"""
+        return (f"{accession.get('revision_date', '')}/"
+                f"{accession.get('major_revision', '')}.{accession.get('minor_revision', '')}")
+
+    def entry_revision(self, pdb_id):
+        """条目修订标识（RCSB rcsb_accession_info 的修订日期与版本号），获取失败返回None"""
+        try:
+            response = self.http.get(f"{self.rcsb_base}/core/entry/{pdb_id}")
+            if response.status_code == 200:
+                return self.revision_key(response.json().get('rcsb_accession_info', {}))
+        except ValueError as e:
+            print(f"获取条目修订信息失败: {e}")
+        return None
+
+    # ==================== 结构加载 ====================
+    def _retrieve_pdb_file(self, pdb_id):
+        """下载PDB文件（本地已存在时直接复用）；同一结构的并发下载只进行一次"""
+        path = os.path.join(self.pdb_dir, f"pdb{pdb_id.lower()}.ent")
+        if os.path.exists(path):
+            return path
+        if self.single_flight is None:
+            return download_pdb_file(pdb_id, self.pdb_dir)
+        return self.single_flight.do(('download', pdb_id.lower()), lambda: download_pdb_file(pdb_id, self.pdb_dir))
+
+    @contextmanager
+    def parse_scope(self):
+        """在作用域内复用已解析的模型和坐标数组（多个分析共享一次下载与解析）"""
+        scope = self._parse_scope
+        if getattr(scope, 'depth', 0) == 0:
+            scope.models = {}
+            scope.arrays = {}
+            scope.streams = {}
+        scope.depth = getattr(scope, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            scope.depth -= 1
+            if scope.depth == 0:
+                scope.models = {}
+                scope.arrays = {}
+                scope.streams = {}
+
+    def _scoped(self, kind, pdb_id, loader):
+        """处于 parse_scope 中时按 pdb_id 记忆 loader 的结果"""
+        if getattr(self._parse_scope, 'depth', 0) == 0:
+            return loader()
+        memo = getattr(self._parse_scope, kind)
+        key = pdb_id.lower()
+        if key not in memo:
+            memo[key] = loader()
+        return memo[key]
+
+    def _load_model(self, pdb_id, quiet=True):
+        """下载（或复用本地）PDB文件并解析第一个模型，返回 (model, pdb_file)"""
+        def load():
+            pdb_file = self._retrieve_pdb_file(pdb_id)
+
+            if not pdb_file:
+                return None, None
+
+            parser = PDBParser(QUIET=quiet)
+            structure = parser.get_structure(pdb_id, pdb_file)
+            return structure[0], pdb_file
+
+        return self._scoped('models', pdb_id, load)
+
+    def _load_arrays(self, pdb_id):
+        """获取结构的坐标数组；配置了共享缓存时各进程直接挂载已解析的数组"""
+        def build():
+            model, _ = self._load_model(pdb_id)
+            return AtomArrays.from_model(model) if model is not None else None
+
+        def load():
+            if self.structure_cache is None:
+                arrays = build()
+            else:
+                arrays = self.structure_cache.get_or_build(pdb_id, build)
+            if arrays is not None and self.sequence_index is not None and pdb_id not in self.sequence_index:
+                self.sequence_index.add_structure(pdb_id, self._chain_sequences(arrays))
+            return arrays
+
+        return self._scoped('arrays', pdb_id, load)
+
+    def search_sequence(self, sequence, top_n=10):
+        """在本地已解析/缓存的结构中检索相似链序列"""
+        if self.sequence_index is None:
+            return {'error': '序列索引未启用'}
+        hits = self.sequence_index.search(sequence, top_n=top_n)
+        return {'query_length': len(''.join(sequence.split())), 'hits': hits,
+                'index': self.sequence_index.status()}
+
+    def _use_streaming(self, pdb_id):
+        """只需计数/序列时是否走流式统计：已有坐标数组（缓存或作用域内）时直接复用数组"""
+        if self.structure_cache is not None and pdb_id in self.structure_cache:
+            return False
+        if pdb_id.lower() in getattr(self._parse_scope, 'arrays', {}):
+            return False
+        pdb_file = self._retrieve_pdb_file(pdb_id)
+        return bool(pdb_file) and os.path.getsize(pdb_file) >= self.stream_threshold_bytes
+
+    def estimate_atoms(self, pdb_id, assembly_id=None):
+        """
+        预估分析涉及的原子数：共享缓存中有数组时取准确值，否则按坐标文件大小估算
+        指定组装体时乘以对称操作数（偏保守）
+        """
+        atoms = self.structure_cache.atom_count(pdb_id) if self.structure_cache is not None else None
+        pdb_file = None
+        if atoms is None or assembly_id is not None:
+            pdb_file = self._retrieve_pdb_file(pdb_id)
+            if not pdb_file:
+                return 0
+        if atoms is None:
+            atoms = os.path.getsize(pdb_file) // PDB_LINE_BYTES
+        if assembly_id is not None:
+            groups = parse_assemblies(pdb_file).get(str(assembly_id), [])
+            atoms *= max(1, sum(len(group['operators']) for group in groups))
+        return atoms
+
+    @contextmanager
+    def _memory_admission(self, kind, pdb_id, assembly_id=None, reduced_kind=None):
+        """
+        按预估内存向 memory_budget 申请额度，值为运行模式 'full' / 'reduced'
+        未配置预算时直接执行；同一线程内的嵌套调用沿用外层额度
+        """
+        outer = getattr(self._admission, 'mode', None)
+        if self.memory_budget is None or outer is not None:
+            yield outer or 'full'
+            return
+
+        atoms = self.estimate_atoms(pdb_id, assembly_id)
+        estimate = estimate_bytes(kind, atoms)
+        reduced = estimate_bytes(reduced_kind, atoms) if reduced_kind else None
+        with self.memory_budget.admit(f"{kind}:{pdb_id}", estimate, reduced) as mode:
+            if self.memory_monitor is not None:
+                self.memory_monitor.annotate(admission=mode, estimated_atoms=atoms,
+                                             estimated_mb=round((estimate if mode == 'full' else reduced)
+                                                                / 1024 ** 2, 1))
+            self._admission.mode = mode
+            try:
+                yield mode
+            finally:
+                self._admission.mode = None
+
+    def _reduced_memory(self):
+        """当前分析是否以降级模式运行（内存预算不足）"""
+        return getattr(self._admission, 'mode', None) == 'reduced'
+
+    def _stream_summary(self, pdb_id):
+        """流式单遍统计（StreamingStructureSummary），峰值内存与原子数无关"""
+        def load():
+            pdb_file = self._retrieve_pdb_file(pdb_id)
+            return summarize_pdb_file(pdb_file, THREE_TO_ONE) if pdb_file else None
+
+        return self._scoped('streams', pdb_id, load)
+
+    def _load_assembly(self, arrays, pdb_id, assembly_id):
+        """读取生物组装体的对称操作；拷贝坐标在使用时才变换"""
+        return BiologicalAssembly.from_file(arrays, self._retrieve_pdb_file(pdb_id), assembly_id)
+
+    def _chain_residues(self, arrays):
+        """
+        从坐标数组提取每条链已观测的标准残基
+        返回 {chain_id: (作者编号数组, 插入码数组, 单字母序列)}
+        """
+        if not len(arrays):
+            return {}
+        starts = arrays.residue_starts()
+        codes = encode_resnames(arrays.resname[starts])
+        standard = STANDARD[codes]
+        chains, codes = arrays.chain[starts][standard], codes[standard]
+        resseq, icode = arrays.resseq[starts][standard], arrays.icode[starts][standard]
+        # 按链首次出现的顺序
+        _, first = np.unique(chains, return_index=True)
+        residues = {}
+        for chain_id in chains[np.sort(first)]:
+            in_chain = chains == chain_id
+            residues[str(chain_id)] = (resseq[in_chain].astype(np.int32),
+                                       np.char.strip(icode[in_chain].astype(str)).astype('U1'),
+                                       decode(codes[in_chain]))
+        return residues
+
+    def _chain_sequences(self, arrays):
+        """从坐标数组提取每条链的单字母序列（跳过非标准残基）"""
+        return {chain_id: seq for chain_id, (_, _, seq) in self._chain_residues(arrays).items()}
+
     # ==================== 4. 物化性质分析 ====================
-    def analyze_structure(self, pdb_id, properties=None):
-        """分析蛋白结构的物化性质"""
+    @single_flight('analysis')
+    @stored_result('analysis')
+    @memory_admitted('analysis', reduced_kind='streaming')
+    def analyze_structure(self, pdb_id, properties=None, assembly_id=None, fields=None):
+        """分析蛋白结构的物化性质（assembly_id 指定时按生物组装体统计；fields 指定时只计算并返回这些字段）"""
         if properties is None:
             properties = ['all']
         print(f"🧪 正在分析 {pdb_id} 的物化性质...")
 
-        # 下载PDB文件
-        pdbl = PDBList()
-        pdb_file = pdbl.retrieve_pdb_file(pdb_id, pdir='.', file_format='pdb')
-
-        if not pdb_file:
-            return None
-
-        # 解析结构
-        parser = PDBParser()
-        structure = parser.get_structure(pdb_id, pdb_file)
-        model = structure[0]
-
-        results: dict = {'pdb_id': pdb_id, 'num_chains': len(list(model.get_chains())),
-                         'num_residues': len(list(model.get_residues())), 'num_atoms': len(list(model.get_atoms()))}
+        # 超大结构（或内存预算不足）且不涉及组装体时，计数由流式单遍扫描得到，不构建对象树
+        reduced = self._reduced_memory()
+        streaming = assembly_id is None and (reduced or self._use_streaming(pdb_id))
+        if streaming:
+            summary = self._stream_summary(pdb_id)
+            if summary is None:
+                return None
+            results: dict = {'pdb_id': pdb_id, 'num_chains': summary.num_chains,
+                             'num_residues': summary.num_residues, 'num_atoms': summary.num_atoms,
+                             'streaming': True}
+            if reduced:
+                results['downgraded'] = {'reason': '内存预算不足，改用流式统计（不构建对象树）'}
+        else:
+            # 获取坐标数组（计数只需数组，DSSP备用方案才解析完整模型）
+            arrays = self._load_arrays(pdb_id)
+            if arrays is None:
+                return None
+
+            residue_starts = arrays.residue_starts()
+            results = {'pdb_id': pdb_id, 'num_chains': len(arrays.chain_ids()),
+                       'num_residues': len(residue_starts), 'num_atoms': len(arrays)}
+
+        if assembly_id is not None:
+            assembly = self._load_assembly(arrays, pdb_id, assembly_id)
+            if assembly is None:
+                return {'pdb_id': pdb_id, 'error': f'未找到生物组装体 {assembly_id}'}
+            # 每个拷贝与其来源链的残基/原子数相同，无需展开原子
+            chain_of_residue, residue_counts = np.unique(arrays.chain[residue_starts], return_counts=True)
+            residues_per_chain = dict(zip(chain_of_residue.tolist(), residue_counts.tolist()))
+            results['num_chains'] = len(assembly)
+            results['num_residues'] = sum(residues_per_chain[c['chain']] for c in assembly.copies)
+            results['num_atoms'] = sum(len(c['atoms']) for c in assembly.copies)
+            results['assembly'] = assembly.summary()
 
         # 1. 基础信息
 
@@ -215,12 +535,25 @@ class GGETPDB:
 
         # 3. 二级结构估算（优先从API获取，失败后尝试DSSP）
         # 首先尝试从API获取二级结构
-        ss_from_api = self._get_secondary_structure_from_api(pdb_id)
-        if ss_from_api:
+        want_ss = wants(fields, 'secondary_structure')
+        ss_from_api = self._get_secondary_structure_from_api(pdb_id) \
+            if want_ss and self.use_remote_annotations else None
+        if not want_ss:
+            pass
+        elif ss_from_api:
             results['secondary_structure'] = ss_from_api
+        elif streaming:
+            # DSSP需要完整模型，超大结构不为此构建对象树
+            results['secondary_structure'] = {
+                'helix': 'N/A',
+                'beta_sheet': 'N/A',
+                'coil': 'N/A',
+                'note': '结构过大，未运行DSSP；二级结构注解接口不可用'
+            }
         else:
             # 备用方案：尝试DSSP
             try:
+                model, pdb_file = self._load_model(pdb_id, quiet=False)
                 dssp = DSSP(model, pdb_file)
                 ss_counts = {'H': 0, 'B': 0, 'E': 0, 'G': 0, 'I': 0, 'T': 0, 'S': 0, '-': 0}
                 for key in dssp.keys():
@@ -246,14 +579,14 @@ class GGETPDB:
                     'note': 'DSSP未安装，请运行: brew install dssp (macOS) 或 apt-get install dssp (Linux)'
                 }
 
-        return results
+        return project(results, fields)
 
     def _get_secondary_structure_from_api(self, pdb_id):
         """从RCSB/PDBe API获取二级结构信息"""
         # 方法1: 尝试从PDBe API获取二级结构注解
         try:
             pdbe_url = f"https://www.ebi.ac.uk/pdbe/api/pdb/entry/secondary_structure/{pdb_id.lower()}"
-            response = requests.get(pdbe_url, timeout=10)
+            response = self.http.get(pdbe_url)
             if response.status_code == 200:
                 data = response.json()
                 pdb_data = data.get(pdb_id.lower(), {})
@@ -288,7 +621,7 @@ class GGETPDB:
                 # 从RCSB获取总残基数
                 try:
                     rcsb_url = f"https://data.rcsb.org/rest/v1/core/entry/{pdb_id}"
-                    rcsb_resp = requests.get(rcsb_url, timeout=10)
+                    rcsb_resp = self.http.get(rcsb_url)
                     if rcsb_resp.status_code == 200:
                         rcsb_data = rcsb_resp.json()
                         total_residues = rcsb_data.get('rcsb_entry_info', {}).get('deposited_polymer_monomer_count', 0)
@@ -318,7 +651,7 @@ class GGETPDB:
         # 方法2: 尝试从RCSB获取简化的二级结构信息
         try:
             url = f"https://data.rcsb.org/rest/v1/core/polymer_entity/{pdb_id}/1"
-            response = requests.get(url, timeout=10)
+            response = self.http.get(url)
             if response.status_code == 200:
                 data = response.json()
                 # 从entity_poly获取序列长度
@@ -355,7 +688,7 @@ class GGETPDB:
         try:
             # PDBe提供的分子间相互作用API
             url = f"https://www.ebi.ac.uk/pdbe/api/pdb/entry/summary/{pdb_id.lower()}"
-            response = requests.get(url, timeout=10)
+            response = self.http.get(url)
             if response.status_code == 200:
                 data = response.json()
                 pdb_data = data.get(pdb_id.lower(), [{}])[0]
@@ -368,7 +701,7 @@ class GGETPDB:
                 # 获取残基数用于估算
                 try:
                     rcsb_url = f"https://data.rcsb.org/rest/v1/core/entry/{pdb_id}"
-                    rcsb_resp = requests.get(rcsb_url, timeout=10)
+                    rcsb_resp = self.http.get(rcsb_url)
                     if rcsb_resp.status_code == 200:
                         rcsb_data = rcsb_resp.json()
                         total_residues = rcsb_data.get('rcsb_entry_info', {}).get('deposited_polymer_monomer_count', 0)
@@ -390,34 +723,54 @@ class GGETPDB:
         return None
 
     # ==================== 4.1 高级结构分析 ====================
-    def analyze_advanced_structure(self, pdb_id):
-        """高级结构分析：氢键、盐桥、二硫键、SASA、疏水/亲水比例"""
+    @single_flight('advanced')
+    @stored_result('advanced')
+    @memory_admitted('advanced', reduced_kind='advanced_reduced')
+    def analyze_advanced_structure(self, pdb_id, assembly_id=None, fields=None):
+        """
+        高级结构分析：氢键、盐桥、二硫键、SASA、疏水/亲水比例（可选生物组装体）
+        fields 指定时只计算请求的部分（如 fields=['salt_bridges.count'] 不运行DSSP与SASA）
+        """
         print(f"🔬 正在进行 {pdb_id} 的高级结构分析...")
 
-        # 下载PDB文件
-        pdbl = PDBList()
-        pdb_file = pdbl.retrieve_pdb_file(pdb_id, pdir='.', file_format='pdb')
-
-        if not pdb_file:
+        # 下载并解析PDB文件
+        model, pdb_file = self._load_model(pdb_id)
+        if model is None:
             return None
 
-        # 解析结构
-        parser = PDBParser(QUIET=True)
-        structure = parser.get_structure(pdb_id, pdb_file)
-        model = structure[0]
+        assembly = None
+        if assembly_id is not None:
+            assembly = self._load_assembly(self._load_arrays(pdb_id), pdb_id, assembly_id)
+            if assembly is None:
+                return {'pdb_id': pdb_id, 'error': f'未找到生物组装体 {assembly_id}'}
 
-        results: dict = {'pdb_id': pdb_id, 'disulfide_bonds': self._find_disulfide_bonds(model),
-                         'salt_bridges': self._find_salt_bridges(model)}
+        results: dict = {'pdb_id': pdb_id}
+        if assembly is not None:
+            results['assembly'] = assembly.summary()
 
         # 1. 二硫键分析
+        if wants(fields, 'disulfide_bonds'):
+            results['disulfide_bonds'] = self._find_disulfide_bonds(model) if assembly is None \
+                else self._find_assembly_disulfide_bonds(assembly)
 
         # 2. 盐桥分析
+        if wants(fields, 'salt_bridges'):
+            results['salt_bridges'] = self._find_salt_bridges(model) if assembly is None \
+                else self._find_assembly_salt_bridges(assembly)
 
         # 3. 氢键统计（优先从API获取，失败后尝试DSSP）
         # 首先尝试从API获取氢键信息
-        hbonds_from_api = self._get_hydrogen_bonds_from_api(pdb_id)
-        if hbonds_from_api:
+        want_hbonds, want_sasa = wants(fields, 'hydrogen_bonds'), wants(fields, 'sasa_per_chain')
+        hbonds_from_api = self._get_hydrogen_bonds_from_api(pdb_id) \
+            if want_hbonds and self.use_remote_annotations else None
+        reduced = self._reduced_memory()
+        if not want_hbonds:
+            pass
+        elif hbonds_from_api:
             results['hydrogen_bonds'] = hbonds_from_api
+        elif reduced:
+            results['hydrogen_bonds'] = {'backbone_hbonds': 'N/A', 'total': 'N/A',
+                                         'note': '内存预算不足，未运行DSSP'}
         else:
             # 备用方案：尝试DSSP
             try:
@@ -440,13 +793,24 @@ class GGETPDB:
                         'error': error_msg
                     }
 
-        # 4. SASA分析（每条链）
-        results['sasa_per_chain'] = self._calculate_sasa(model)
+        # 4. SASA分析（每条链；组装体模式下为每个拷贝，计入相邻拷贝的遮挡）
+        if reduced and (want_sasa or (want_hbonds and not hbonds_from_api)):
+            skipped = (['sasa'] if want_sasa else []) + (['dssp'] if want_hbonds and not hbonds_from_api else [])
+            results['downgraded'] = {'reason': '内存预算不足，跳过SASA与DSSP', 'skipped': skipped}
+        if not want_sasa:
+            pass
+        elif reduced:
+            results['sasa_per_chain'] = {}
+        elif assembly is None:
+            results['sasa_per_chain'] = self._calculate_sasa(model)
+        else:
+            results['sasa_per_chain'] = self._calculate_assembly_sasa(assembly)
 
         # 5. 疏水/亲水残基比例（每条链）
-        results['hydrophobicity_per_chain'] = self._analyze_hydrophobicity(model)
+        if wants(fields, 'hydrophobicity_per_chain'):
+            results['hydrophobicity_per_chain'] = self._analyze_hydrophobicity(model)
 
-        return results
+        return project(results, fields)
 
     def _find_disulfide_bonds(self, model):
         """查找二硫键"""
@@ -467,7 +831,7 @@ class GGETPDB:
         # 检查半胱氨酸之间的距离（二硫键距离约2.05Å）
         for i, cys1 in enumerate(cysteine_residues):
             for cys2 in cysteine_residues[i+1:]:
-                distance = float(cys1['atom'] - cys2['atom'])  # 转换为 Python float
+                distance = cys1['atom'] - cys2['atom']
                 if distance < 2.5:  # 二硫键距离阈值
                     disulfide_bonds.append({
                         'cys1': f"{cys1['chain']}:{cys1['resnum']}",
@@ -486,11 +850,11 @@ class GGETPDB:
         # 负电荷残基的原子
         negative_atoms = []
 
-        positive_residues = ['ARG', 'LYS', 'HIS']
-        negative_residues = ['ASP', 'GLU']
+        positive_residues = list(SALT_BRIDGE_POSITIVE_ATOMS)
+        negative_residues = list(SALT_BRIDGE_NEGATIVE_ATOMS)
 
-        positive_atom_names = {'ARG': ['NH1', 'NH2', 'NE'], 'LYS': ['NZ'], 'HIS': ['ND1', 'NE2']}
-        negative_atom_names = {'ASP': ['OD1', 'OD2'], 'GLU': ['OE1', 'OE2']}
+        positive_atom_names = SALT_BRIDGE_POSITIVE_ATOMS
+        negative_atom_names = SALT_BRIDGE_NEGATIVE_ATOMS
 
         for chain in model:
             for residue in chain:
@@ -518,7 +882,7 @@ class GGETPDB:
         seen_pairs = set()
         for pos in positive_atoms:
             for neg in negative_atoms:
-                distance = float(pos['atom'] - neg['atom'])  # 转换为 Python float
+                distance = pos['atom'] - neg['atom']
                 if distance <= distance_cutoff:
                     pair_key = tuple(sorted([
                         f"{pos['chain']}:{pos['resname']}{pos['resnum']}",
@@ -534,6 +898,87 @@ class GGETPDB:
 
         return {'count': len(salt_bridges), 'bridges': salt_bridges}
 
+    def _assembly_atoms(self, assembly, k, atom_names):
+        """第k个拷贝中 {残基名: [原子名]} 指定的原子下标（全局下标）"""
+        arrays = assembly.arrays
+        atoms = assembly.copies[k]['atoms']
+        mask = np.zeros(len(atoms), dtype=bool)
+        for resname, names in atom_names.items():
+            mask |= (arrays.resname[atoms] == resname) & np.isin(arrays.name[atoms], names)
+        return atoms[mask]
+
+    def _assembly_pairs(self, assembly, atoms_a, atoms_b, cutoff, symmetric):
+        """
+        遍历包围盒可能接触的拷贝对，返回 (拷贝i, 原子a, 拷贝j, 原子b, 距离)
+        symmetric=True 表示 a/b 为同一类原子（如二硫键），同一拷贝内只取 a < b
+        """
+        arrays = assembly.arrays
+        found = []
+        for i, j in assembly.contact_pairs(cutoff):
+            directions = [(i, j)] if (symmetric or i == j) else [(i, j), (j, i)]
+            for ki, kj in directions:
+                sel_a, sel_b = atoms_a[ki], atoms_b[kj]
+                if len(sel_a) == 0 or len(sel_b) == 0:
+                    continue
+                ia, ib, dist = atom_pairs_within(assembly.copy_coords(ki, sel_a),
+                                                 assembly.copy_coords(kj, sel_b), cutoff)
+                for a, b, d in zip(ia, ib, dist):
+                    if symmetric and ki == kj and sel_a[a] >= sel_b[b]:
+                        continue
+                    found.append((ki, sel_a[a], kj, sel_b[b], d))
+        return found
+
+    def _find_assembly_disulfide_bonds(self, assembly):
+        """在生物组装体中查找二硫键（含拷贝之间）"""
+        arrays = assembly.arrays
+        sg_atoms = [self._assembly_atoms(assembly, k, {'CYS': ['SG']}) for k in range(len(assembly))]
+        disulfide_bonds = []
+        for ki, a, kj, b, distance in self._assembly_pairs(assembly, sg_atoms, sg_atoms, 2.5, symmetric=True):
+            disulfide_bonds.append({
+                'cys1': f"{assembly.copies[ki]['label']}:{arrays.resseq[a]}",
+                'cys2': f"{assembly.copies[kj]['label']}:{arrays.resseq[b]}",
+                'distance': round(distance, 2)
+            })
+        return {'count': len(disulfide_bonds), 'bonds': disulfide_bonds}
+
+    def _find_assembly_salt_bridges(self, assembly, distance_cutoff=4.0):
+        """在生物组装体中查找盐桥（含拷贝之间）"""
+        arrays = assembly.arrays
+        positive = [self._assembly_atoms(assembly, k, SALT_BRIDGE_POSITIVE_ATOMS) for k in range(len(assembly))]
+        negative = [self._assembly_atoms(assembly, k, SALT_BRIDGE_NEGATIVE_ATOMS) for k in range(len(assembly))]
+
+        salt_bridges = []
+        seen_pairs = set()
+        for ki, a, kj, b, distance in self._assembly_pairs(assembly, positive, negative, distance_cutoff,
+                                                            symmetric=False):
+            pos = f"{assembly.copies[ki]['label']}:{arrays.resname[a]}{arrays.resseq[a]}"
+            neg = f"{assembly.copies[kj]['label']}:{arrays.resname[b]}{arrays.resseq[b]}"
+            pair_key = tuple(sorted([pos, neg]))
+            if pair_key not in seen_pairs:
+                seen_pairs.add(pair_key)
+                salt_bridges.append({'positive': pos, 'negative': neg, 'distance': round(distance, 2)})
+
+        return {'count': len(salt_bridges), 'bridges': salt_bridges}
+
+    def _calculate_assembly_sasa(self, assembly, probe_radius=1.40):
+        """计算组装体中每个拷贝的SASA，只把包围盒相邻的拷贝作为遮挡原子"""
+        sasa_results = {}
+        try:
+            arrays = assembly.arrays
+            radii = atomic_radii(arrays.element)
+            margin = 2 * (float(radii.max()) + probe_radius)
+            for k, copy in enumerate(assembly.copies):
+                parts = [k] + assembly.neighbors_of(k, margin)
+                coords = np.concatenate([assembly.copy_coords(j) for j in parts])
+                copy_radii = np.concatenate([radii[assembly.copies[j]['atoms']] for j in parts])
+                own = np.arange(len(copy['atoms']))
+                sasa = shrake_rupley(coords, copy_radii, probe_radius=probe_radius, indices=own)
+                sasa_results[copy['label']] = round(sasa.sum(), 2)
+        except Exception as e:
+            sasa_results['error'] = str(e)
+
+        return sasa_results
+
     def _count_hydrogen_bonds(self, dssp):
         """统计氢键数量（基于DSSP）"""
         # DSSP提供的氢键信息
@@ -565,9 +1010,9 @@ class GGETPDB:
                 total_sasa = 0.0
                 for residue in chain:
                     if hasattr(residue, 'sasa'):
-                        total_sasa += float(residue.sasa)  # 转换为 Python float
+                        total_sasa += residue.sasa
 
-                sasa_results[chain_id] = round(float(total_sasa), 2)  # 确保是 Python float
+                sasa_results[chain_id] = round(total_sasa, 2)
         except Exception as e:
             sasa_results['error'] = str(e)
 
@@ -575,25 +1020,24 @@ class GGETPDB:
 
     def _analyze_hydrophobicity(self, model):
         """分析每条链的疏水/亲水残基比例"""
-        results = {}
+        return self._hydrophobicity_from_codes(
+            {chain.id: encode_resnames([residue.get_resname() for residue in chain]) for chain in model})
 
-        for chain in model:
-            chain_id = chain.id
-            hydrophobic_count = 0
-            hydrophilic_count = 0
-            total = 0
+    def _hydrophobicity_from_sequences(self, sequences):
+        """由每条链的单字母序列统计疏水/亲水残基比例（流式统计使用）"""
+        return self._hydrophobicity_from_codes(
+            {chain_id: encode_sequence(sequence) for chain_id, sequence in sequences.items()})
 
-            for residue in chain:
-                resname = residue.get_resname()
-                one_letter = THREE_TO_ONE.get(resname)
-                if one_letter and one_letter in AMINO_ACID_PROPERTIES:
-                    total += 1
-                    if AMINO_ACID_PROPERTIES[one_letter]['hydrophobic']:
-                        hydrophobic_count += 1
-                    else:
-                        hydrophilic_count += 1
+    def _hydrophobicity_from_codes(self, chain_codes):
+        """由每条链的残基编码统计疏水/亲水残基比例（非标准残基不计）"""
+        results = {}
 
+        for chain_id, codes in chain_codes.items():
+            counts = residue_counts(codes)
+            total = int(counts[STANDARD].sum())
             if total > 0:
+                hydrophobic_count = int(counts[HYDROPHOBIC].sum())
+                hydrophilic_count = total - hydrophobic_count
                 results[chain_id] = {
                     'hydrophobic_count': hydrophobic_count,
                     'hydrophilic_count': hydrophilic_count,
@@ -604,21 +1048,123 @@ class GGETPDB:
 
         return results
 
+    def stream_statistics(self, pdb_id):
+        """流式单遍统计：链/残基/原子计数、每条链序列与疏水比例（不构建对象树，内存与原子数无关）"""
+        summary = self._stream_summary(pdb_id)
+        if summary is None:
+            return None
+        sequences = summary.chain_sequences()
+        return {
+            'pdb_id': pdb_id,
+            'num_chains': summary.num_chains,
+            'num_residues': summary.num_residues,
+            'num_atoms': summary.num_atoms,
+            'chain_sequences': sequences,
+            'hydrophobicity_per_chain': self._hydrophobicity_from_sequences(sequences)
+        }
+
+    # ==================== 4.1.1 残基接触图 ====================
+    @single_flight('contacts')
+    def contact_map_bytes(self, pdb_id, cutoff=8.0, mode='ca'):
+        """
+        残基接触图的二进制编码（见 contacts.ContactMap.to_bytes），按结构/截断距离/模式缓存
+        mode='ca' 为 Cα-Cα 距离，'heavy' 为重原子最小距离；结构不可用时返回None
+        """
+        if mode not in CONTACT_MODES:
+            raise ValueError(f"无效的接触模式: {mode}，可选: {', '.join(CONTACT_MODES)}")
+        cutoff = normalize_cutoff(cutoff)
+        blob = self.contact_cache.get(pdb_id, cutoff, mode)
+        if blob is None:
+            print(f"🕸️ 正在计算 {pdb_id} 的残基接触图 (cutoff={cutoff}Å, mode={mode})...")
+            with self._memory_admission('contacts', pdb_id):
+                arrays = self._load_arrays(pdb_id)
+                if arrays is None:
+                    return None
+                blob = compute_contact_map(pdb_id, arrays, cutoff, mode).to_bytes()
+            self.contact_cache.put(pdb_id, cutoff, mode, blob)
+        return blob
+
+    def contact_map(self, pdb_id, cutoff=8.0, mode='ca'):
+        """残基接触图（ContactMap，稀疏COO）"""
+        blob = self.contact_map_bytes(pdb_id, cutoff, mode)
+        return ContactMap.from_bytes(blob) if blob is not None else None
+
+    # ==================== 4.1.2 链间界面 ====================
+    @single_flight('interfaces')
+    @stored_result('interfaces')
+    @memory_admitted('interfaces')
+    def analyze_interfaces(self, pdb_id, assembly_id=None, contact_cutoff=5.0):
+        """
+        链间界面分析：哪些链相互接触、埋藏表面积（BSA）与界面残基
+        指定 assembly_id 时分析生物组装体各拷贝之间的界面
+        """
+        print(f"🤝 正在分析 {pdb_id} 的链间界面...")
+        arrays = self._load_arrays(pdb_id)
+        if arrays is None:
+            return None
+
+        # 只用蛋白重原子（不含配体、水和氢）
+        mask = ~np.asarray(arrays.hetero) & (arrays.element != 'H')
+        result = {'pdb_id': pdb_id}
+        if assembly_id is None:
+            units = chain_units(arrays, mask)
+        else:
+            assembly = self._load_assembly(arrays, pdb_id, assembly_id)
+            if assembly is None:
+                return {'pdb_id': pdb_id, 'error': f'未找到生物组装体 {assembly_id}'}
+            result['assembly'] = assembly.summary()
+            units = assembly_units(assembly, mask)
+
+        result.update(InterfaceAnalyzer(arrays, units, contact_cutoff=contact_cutoff).run())
+        return result
+
+    # ==================== 4.1.3 配体结合位点 ====================
+    @single_flight('binding_sites')
+    @stored_result('binding_sites')
+    @memory_admitted('binding_sites')
+    def analyze_binding_sites(self, pdb_id, cutoff=4.0):
+        """
+        配体/离子/糖基结合位点：每个非水 HETATM 基团（共价相连的合并）及 cutoff Å 内的聚合物残基
+        每个残基给出最近距离、原子接触数与化学类别
+        """
+        print(f"💊 正在分析 {pdb_id} 的配体结合位点...")
+        arrays = self._load_arrays(pdb_id)
+        if arrays is None:
+            return None
+
+        result = {'pdb_id': pdb_id}
+        result.update(BindingSiteAnalyzer(arrays, cutoff=cutoff).run())
+        return result
+
     # ==================== 4.2 突变影响分析 ====================
-    def analyze_mutation(self, pdb_id, mutation_str):
+    def analyze_mutation(self, pdb_id, mutation_str, numbering='pdb', uniprot_id=None):
         """
         分析突变影响
         mutation_str格式: "A:K33E" 表示A链第33位由K突变为E
+        numbering='uniprot' 时位置按UniProt编号解释，链可省略（如 "K33E"，取第一条覆盖该位置的链）
         """
         print(f"🧬 正在分析突变 {mutation_str} 对 {pdb_id} 的影响...")
 
         # 解析突变字符串
-        match = re.match(r'([A-Z]):([A-Z])(\d+)([A-Z])', mutation_str.upper())
-        if not match:
+        match = re.match(r'(?:([A-Z0-9]+):)?([A-Z])(\d+)([A-Z])$', mutation_str.upper())
+        if not match or (numbering != 'uniprot' and not match.group(1)):
             return {'error': '突变格式无效，请使用格式: A:K33E (链:原氨基酸+位置+新氨基酸)'}
 
         chain_id, wt_aa, position, mut_aa = match.groups()
         position = int(position)
+        icode = ' '
+
+        # UniProt编号 → 结构中的作者编号
+        numbering_info = None
+        if numbering == 'uniprot':
+            hits = self.translate_uniprot_position(pdb_id, position, uniprot_id, chain_id)
+            if not hits:
+                return {'error': f'UniProt位置 {position} 未被 {pdb_id} 的{f"链 {chain_id}" if chain_id else "任何链"}覆盖'}
+            chain_id = hits[0]['chain']
+            numbering_info = {'scheme': 'uniprot', 'uniprot_position': position,
+                              'pdb_chain': chain_id,
+                              'pdb_residue': f"{hits[0]['resseq']}{hits[0]['icode']}"}
+            position, icode = hits[0]['resseq'], hits[0]['icode'] or ' '
 
         # 验证氨基酸
         if wt_aa not in AMINO_ACID_PROPERTIES or mut_aa not in AMINO_ACID_PROPERTIES:
@@ -627,51 +1173,21 @@ class GGETPDB:
         wt_props = AMINO_ACID_PROPERTIES[wt_aa]
         mut_props = AMINO_ACID_PROPERTIES[mut_aa]
 
-        # 计算变化
-        charge_change = mut_props['charge'] - wt_props['charge']
-        volume_change = mut_props['volume'] - wt_props['volume']
-        hydrophobicity_change = mut_props['hydrophobic'] != wt_props['hydrophobic']
-        polarity_change = mut_props['polar'] != wt_props['polar']
-
-        # 评估影响
-        impact_score = 0
-        impact_reasons = []
-
-        if abs(charge_change) >= 1:
-            impact_score += 3
-            impact_reasons.append(f"电荷变化: {'+' if charge_change > 0 else ''}{charge_change}")
-
-        if abs(volume_change) > 50:
-            impact_score += 2
-            impact_reasons.append(f"体积变化: {'+' if volume_change > 0 else ''}{volume_change:.1f}Å³")
-        elif abs(volume_change) > 20:
-            impact_score += 1
-            impact_reasons.append(f"中等体积变化: {'+' if volume_change > 0 else ''}{volume_change:.1f}Å³")
-
-        if hydrophobicity_change:
-            impact_score += 2
-            if wt_props['hydrophobic']:
-                impact_reasons.append("疏水 → 亲水 (可能影响蛋白折叠)")
-            else:
-                impact_reasons.append("亲水 → 疏水 (可能影响溶解性)")
-
-        if polarity_change:
-            impact_score += 1
-            impact_reasons.append("极性变化")
+        # 计算变化并评估影响
+        impact = substitution_impact(wt_aa, mut_aa)
+        charge_change, volume_change = impact['charge_change'], impact['volume_change']
+        hydrophobicity_change, polarity_change = impact['hydrophobicity_change'], impact['polarity_change']
+        impact_score = impact['score']
+        impact_reasons = impact['reasons']
 
         # 下载并检查结构中的实际残基
-        pdbl = PDBList()
-        pdb_file = pdbl.retrieve_pdb_file(pdb_id, pdir='.', file_format='pdb')
+        model, pdb_file = self._load_model(pdb_id)
 
         structural_context = None
         if pdb_file:
-            parser = PDBParser(QUIET=True)
-            structure = parser.get_structure(pdb_id, pdb_file)
-            model = structure[0]
-
             try:
                 chain = model[chain_id]
-                residue = chain[position]
+                residue = chain[(' ', position, icode)]
                 actual_resname = THREE_TO_ONE.get(residue.get_resname(), '?')
 
                 structural_context = {
@@ -686,20 +1202,15 @@ class GGETPDB:
                 # 检查是否在二级结构中
                 try:
                     dssp = DSSP(model, pdb_file)
-                    dssp_key = (chain_id, (' ', position, ' '))
+                    dssp_key = (chain_id, (' ', position, icode))
                     if dssp_key in dssp:
                         ss = dssp[dssp_key][2]
-                        ss_mapping = {
-                            'H': 'α-螺旋', 'G': '3₁₀-螺旋', 'I': 'π-螺旋',
-                            'E': 'β-折叠', 'B': 'β-桥', 'T': '转角',
-                            'S': '弯曲', '-': '环区'
-                        }
-                        structural_context['secondary_structure'] = ss_mapping.get(ss, ss)
+                        structural_context['secondary_structure'] = SS_NAMES.get(ss, ss)
 
                         # 在二级结构核心区域的突变影响更大
                         if ss in ['H', 'E']:
                             impact_score += 1
-                            impact_reasons.append(f"位于{ss_mapping[ss]}核心区域")
+                            impact_reasons.append(f"位于{SS_NAMES[ss]}核心区域")
                 except:
                     pass
 
@@ -712,15 +1223,7 @@ class GGETPDB:
                 }
 
         # 生成影响评估
-        if impact_score >= 5:
-            impact_level = "高"
-            impact_description = "该突变可能严重影响蛋白结构或功能"
-        elif impact_score >= 3:
-            impact_level = "中"
-            impact_description = "该突变可能对蛋白有中等程度的影响"
-        else:
-            impact_level = "低"
-            impact_description = "该突变可能是保守性替换，影响较小"
+        level, impact_description = impact_level(impact_score)
 
         return {
             'mutation': mutation_str,
@@ -747,132 +1250,362 @@ class GGETPDB:
             },
             'impact_assessment': {
                 'score': impact_score,
-                'level': impact_level,
+                'level': level,
                 'description': impact_description,
                 'reasons': impact_reasons
             },
-            'structural_context': structural_context
+            'structural_context': structural_context,
+            'numbering': numbering_info
         }
 
+    # ==================== 4.2.1 批量变异注释 ====================
+    def annotate_variants(self, records, species="human", resolution_tolerance=0.5):
+        """
+        批量注释错义变异，逐行产出注释结果（按结构分组产出，index 为输入中的行号）
+        records: [{'gene', 'variant', 'extra'?}]，variant 为 UniProt 编号的蛋白变化（R1699W / p.Arg1699Trp）
+        每个基因只解析一次（UniProt 登录号与覆盖结构）；变异归到覆盖其位置的最少结构集合中，
+        每个结构只下载/解析一次并只运行一次DSSP与SASA
+        """
+        pending = {}
+        for index, record in enumerate(records):
+            row = dict(record.get('extra') or {}, index=index, gene=record.get('gene', ''),
+                       variant=record.get('variant', ''))
+            parsed = parse_protein_change(row['variant'])
+            if not row['gene'] or not parsed:
+                row['error'] = '缺少基因名' if not row['gene'] else f"无法识别的蛋白变化: {row['variant']}"
+                yield row
+                continue
+            row['wild_type'], row['uniprot_position'], row['mutant'] = parsed
+            pending.setdefault(row['gene'].upper(), []).append(row)
+
+        print(f"🧬 正在批量注释 {sum(len(rows) for rows in pending.values())} 个变异（{len(pending)} 个基因）...")
+        by_structure = {}
+        for rows in pending.values():
+            for row in self._assign_variant_structures(rows, species, resolution_tolerance):
+                if row.get('error'):
+                    yield row
+                else:
+                    by_structure.setdefault(row['pdb_id'], []).append(row)
+
+        for pdb_id, rows in by_structure.items():
+            yield from self._annotate_structure_variants(pdb_id, rows)
+
+    def _assign_variant_structures(self, rows, species, resolution_tolerance):
+        """同一基因的变异：解析一次 UniProt 与覆盖结构，每个变异取最少覆盖集合中第一个覆盖其位置的链"""
+        gene_name = rows[0]['gene']
+        try:
+            uniprot_id = self._gene_uniprot_id(gene_name, species)
+            structures = self._best_structures(uniprot_id) if uniprot_id else []
+            sequence = self.alignment_engine.fetch_uniprot_sequence(uniprot_id) if uniprot_id else None
+        except Exception as e:
+            for row in rows:
+                row['error'] = f'基因映射失败: {e}'
+            return rows
+        if not uniprot_id:
+            for row in rows:
+                row['error'] = f'未找到基因 {gene_name} 对应的UniProt条目'
+            return rows
+
+        selected = gene_coverage(structures, len(sequence) if sequence else None, resolution_tolerance)['selected']
+        for row in rows:
+            position = row['uniprot_position']
+            row['uniprot_id'] = uniprot_id
+            if sequence and position > len(sequence):
+                row['error'] = f'UniProt位置 {position} 超出序列长度 {len(sequence)}'
+                continue
+            if sequence and sequence[position - 1] != row['wild_type']:
+                row['warning'] = f"UniProt序列该位置为 {sequence[position - 1]}，而非 {row['wild_type']}"
+            cover = next((item for item in selected if item['start'] <= position <= item['end']), None)
+            if cover is None:
+                row['error'] = f'UniProt位置 {position} 未被任何实验结构覆盖'
+                continue
+            row['pdb_id'], row['chain'], row['resolution'] = cover['pdb_id'], cover['chain_id'], cover['resolution']
+        return rows
+
+    def _annotate_structure_variants(self, pdb_id, rows):
+        """
+        同一结构上的变异：一次解析、一次DSSP、一次只针对变异残基的SASA
+        指定链未观测到该残基时改用同一结构中其他映射到该位置的链
+        """
+        try:
+            with self.parse_scope(), self._memory_admission('advanced', pdb_id, reduced_kind='advanced_reduced'):
+                model, pdb_file = self._load_model(pdb_id)
+                arrays = self._load_arrays(pdb_id)
+                if model is None or arrays is None:
+                    raise ValueError(f'无法加载结构 {pdb_id}')
+
+                located = []
+                for row in rows:
+                    chain_maps = self.residue_map(pdb_id, row['uniprot_id']) or {}
+                    chains = sorted(chain_maps, key=lambda cid: cid != row['chain'])
+                    hit = None
+                    for cid in chains:
+                        translated = chain_maps[cid].to_pdb(row['uniprot_position'])
+                        if translated:
+                            hit = cid, translated
+                            break
+                    if hit is None:
+                        row['error'] = f"UniProt位置 {row['uniprot_position']} 在 {pdb_id} 中未被观测到"
+                        continue
+                    chain_id, (resseq, icode, residue) = hit
+                    row.update(chain=chain_id, pdb_residue=f'{resseq}{icode}', found_residue=residue,
+                               matches_wt=residue == row['wild_type'])
+                    located.append((row, (chain_id, resseq, icode)))
+
+                dssp, burial, note = None, {}, None
+                if self._reduced_memory():
+                    note = '内存预算不足，未计算二级结构与埋藏程度'
+                elif located:
+                    try:
+                        dssp = DSSP(model, pdb_file)
+                    except Exception:
+                        dssp = None
+                    burial = residue_burial(arrays, [key for _, key in located])
+        except MemoryBudgetExceeded as e:
+            for row in rows:
+                row['error'] = str(e)
+                yield row
+            return
+        except Exception as e:
+            for row in rows:
+                row.setdefault('error', str(e))
+                yield row
+            return
+
+        for row, key in located:
+            impact = substitution_impact(row['wild_type'], row['mutant'])
+            score, reasons = impact['score'], impact['reasons']
+            chain_id, resseq, icode = key
+            dssp_key = (chain_id, (' ', resseq, icode or ' '))
+            if dssp is not None and dssp_key in dssp:
+                ss = dssp[dssp_key][2]
+                row['secondary_structure'] = SS_NAMES.get(ss, ss)
+                if ss in ['H', 'E']:
+                    score += 1
+                    reasons.append(f"位于{SS_NAMES[ss]}核心区域")
+            if key in burial:
+                row['relative_sasa'] = burial[key]
+                row['buried'] = burial[key] < BURIED_RSA
+                if row['buried']:
+                    score += 1
+                    reasons.append(f"位于蛋白内部 (相对可及表面积 {burial[key]:.1%})")
+            if not row['matches_wt']:
+                warning = f"结构中该位置的氨基酸是 {row['found_residue']}，而非 {row['wild_type']}"
+                row['warning'] = '; '.join(filter(None, [row.get('warning'), warning]))
+            if note:
+                row['warning'] = '; '.join(filter(None, [row.get('warning'), note]))
+            row.update(charge_change=impact['charge_change'], volume_change=round(impact['volume_change'], 2),
+                       hydrophobicity_change=impact['hydrophobicity_change'],
+                       polarity_change=impact['polarity_change'], impact_score=score,
+                       impact_level=impact_level(score)[0], impact_reasons=reasons)
+        for row in rows:
+            yield row
+
     # ==================== 4.3 序列分析 ====================
-    def analyze_sequence_composition(self, pdb_id):
-        """分析每条链的氨基酸组成"""
+    @single_flight('composition')
+    @stored_result('composition')
+    @memory_admitted('composition', reduced_kind='streaming')
+    def analyze_sequence_composition(self, pdb_id, uniprot_region=None, uniprot_id=None, fields=None):
+        """
+        分析每条链的氨基酸组成
+        uniprot_region=(start, end) 时只统计映射到该UniProt区间的已观测残基
+        fields 指定时只计算请求的部分，如 ['chains.*.length', 'chains.*.category_statistics']
+        """
         print(f"📊 正在分析 {pdb_id} 的序列组成...")
 
-        # 下载PDB文件
-        pdbl = PDBList()
-        pdb_file = pdbl.retrieve_pdb_file(pdb_id, pdir='.', file_format='pdb')
+        results = {'pdb_id': pdb_id, 'chains': {}}
 
-        if not pdb_file:
-            return None
+        if uniprot_region:
+            start, end = uniprot_region
+            chain_maps = self.residue_map(pdb_id, uniprot_id)
+            if not chain_maps:
+                return {'pdb_id': pdb_id, 'error': '无法建立UniProt残基编号映射'}
+            sequences = {chain_id: ''.join(np.array(list(m.sequence), dtype='U1')[m.uniprot_mask(start, end)])
+                         for chain_id, m in chain_maps.items()}
+            results['uniprot_region'] = {'start': start, 'end': end}
+        elif self._reduced_memory() or self._use_streaming(pdb_id):
+            # 超大结构（或内存预算不足）：流式单遍扫描得到每条链序列
+            summary = self._stream_summary(pdb_id)
+            if summary is None:
+                return None
+            sequences = summary.chain_sequences()
+        else:
+            # 获取坐标数组
+            arrays = self._load_arrays(pdb_id)
+            if arrays is None:
+                return None
+            sequences = self._chain_sequences(arrays)
+
+        want_counts = wants(fields, 'chains.*.amino_acid_counts')
+        want_percentages = wants(fields, 'chains.*.amino_acid_percentages')
+        want_categories = wants(fields, 'chains.*.category_statistics')
+        for chain_id, sequence in sequences.items():
+            if sequence:
+                total = len(sequence)
+                chain = {'sequence': sequence, 'length': total}
+                if want_counts or want_percentages or want_categories:
+                    counts = residue_counts(encode_sequence(sequence))
+                    aa_counts = dict(zip(AMINO_ACIDS, counts[:UNKNOWN].tolist()))
+                if want_counts:
+                    chain['amino_acid_counts'] = aa_counts
+                if want_percentages:
+                    # 计算百分比
+                    chain['amino_acid_percentages'] = {aa: round(count / total * 100, 2)
+                                                       for aa, count in aa_counts.items()}
 
-        parser = PDBParser(QUIET=True)
-        structure = parser.get_structure(pdb_id, pdb_file)
-        model = structure[0]
+                # 分类统计（与疏水性分析、突变分析共用 residue_properties 中的属性）
+                if want_categories:
+                    category_statistics = {}
+                    for category, count in category_counts(counts).items():
+                        category_statistics[category] = count
+                        category_statistics[f'{category}_pct'] = round(count / total * 100, 2)
+                    chain['category_statistics'] = category_statistics
 
-        results = {'pdb_id': pdb_id, 'chains': {}}
+                results['chains'][chain_id] = chain
 
-        for chain in model:
-            chain_id = chain.id
-            sequence = []
-            aa_counts = {aa: 0 for aa in AMINO_ACID_PROPERTIES.keys()}
+        return project(results, fields)
 
-            for residue in chain:
-                resname = residue.get_resname()
-                one_letter = THREE_TO_ONE.get(resname)
-                if one_letter:
-                    sequence.append(one_letter)
-                    if one_letter in aa_counts:
-                        aa_counts[one_letter] += 1
+    def _polymer_entities(self, pdb_id):
+        """
+        返回蛋白聚合物实体列表 [{'entity_id', 'sequence', 'chains'}]
+        优先使用RCSB实体信息（实体→作者链ID），失败时从结构文件按相同序列归并链
+        """
+        entities = []
+        try:
+            entry_resp = self.http.get(f"{self.rcsb_base}/core/entry/{pdb_id}")
+            if entry_resp.status_code == 200:
+                entity_ids = entry_resp.json().get('rcsb_entry_container_identifiers', {}).get('polymer_entity_ids', [])
+                for entity_id in entity_ids:
+                    resp = self.http.get(f"{self.rcsb_base}/core/polymer_entity/{pdb_id}/{entity_id}")
+                    if resp.status_code != 200:
+                        continue
+                    data = resp.json()
+                    entity_poly = data.get('entity_poly', {})
+                    if entity_poly.get('rcsb_entity_polymer_type', 'Protein') != 'Protein':
+                        continue
+                    sequence = (entity_poly.get('pdbx_seq_one_letter_code_can') or '').replace('\n', '')
+                    chains = data.get('rcsb_polymer_entity_container_identifiers', {}).get('auth_asym_ids', [])
+                    if sequence and chains:
+                        entities.append({'entity_id': str(entity_id), 'sequence': sequence, 'chains': chains})
+        except Exception as e:
+            print(f"获取实体信息失败: {e}")
+
+        if entities:
+            return entities
+
+        # 备用方案：结构文件中序列相同的链视为同一实体
+        arrays = self._load_arrays(pdb_id)
+        if arrays is None:
+            return []
+        by_sequence = {}
+        for chain_id, sequence in self._chain_sequences(arrays).items():
+            by_sequence.setdefault(sequence, []).append(chain_id)
+        return [{'entity_id': None, 'sequence': sequence, 'chains': chains}
+                for sequence, chains in by_sequence.items()]
+
+    def _sifts_uniprot_entries(self, pdb_id):
+        """获取PDBe SIFTS映射 {UniProt登录号: {'mappings': [...]}}，失败返回空字典"""
+        try:
+            url = f"https://www.ebi.ac.uk/pdbe/api/mappings/uniprot/{pdb_id}"
+            response = self.http.get(url)
+            if response.status_code == 200:
+                return response.json().get(pdb_id.lower(), {}).get('UniProt', {})
+        except Exception as e:
+            print(f"获取UniProt映射失败: {e}")
+        return {}
+
+    def _uniprot_mapping(self, pdb_id):
+        """从PDBe SIFTS映射获取 {entity_id: UniProt登录号}"""
+        entity_accessions = {}
+        for accession, entry in self._sifts_uniprot_entries(pdb_id).items():
+            for mapping in entry.get('mappings', []):
+                entity_accessions.setdefault(str(mapping.get('entity_id')), accession)
+            entity_accessions.setdefault(None, accession)  # 首个登录号作为默认值
+        return entity_accessions
+
+    def residue_map(self, pdb_id, uniprot_id=None):
+        """
+        残基级编号映射 {chain_id: ChainResidueMap}
+        优先使用SIFTS区段（作者编号连续时），其余链用已观测序列与UniProt序列比对；结果缓存到本地
+        """
+        sifts_entries = None
+        if not uniprot_id:
+            sifts_entries = self._sifts_uniprot_entries(pdb_id)
+            uniprot_id = next(iter(sifts_entries), None)
+            if not uniprot_id:
+                return None
 
-            if sequence:
-                total = len(sequence)
-                # 计算百分比
-                aa_percentages = {aa: round(count / total * 100, 2)
-                                 for aa, count in aa_counts.items()}
-
-                # 分类统计
-                charged_positive = sum(aa_counts[aa] for aa in ['K', 'R', 'H'])
-                charged_negative = sum(aa_counts[aa] for aa in ['D', 'E'])
-                hydrophobic = sum(aa_counts[aa] for aa in ['A', 'V', 'L', 'I', 'M', 'F', 'W', 'P'])
-                polar = sum(aa_counts[aa] for aa in ['S', 'T', 'N', 'Q', 'Y', 'C'])
-                aromatic = sum(aa_counts[aa] for aa in ['F', 'Y', 'W'])
-
-                results['chains'][chain_id] = {
-                    'sequence': ''.join(sequence),
-                    'length': total,
-                    'amino_acid_counts': aa_counts,
-                    'amino_acid_percentages': aa_percentages,
-                    'category_statistics': {
-                        'charged_positive': charged_positive,
-                        'charged_positive_pct': round(charged_positive / total * 100, 2),
-                        'charged_negative': charged_negative,
-                        'charged_negative_pct': round(charged_negative / total * 100, 2),
-                        'hydrophobic': hydrophobic,
-                        'hydrophobic_pct': round(hydrophobic / total * 100, 2),
-                        'polar_uncharged': polar,
-                        'polar_uncharged_pct': round(polar / total * 100, 2),
-                        'aromatic': aromatic,
-                        'aromatic_pct': round(aromatic / total * 100, 2)
-                    }
-                }
+        cached = self.residue_maps.get(pdb_id, uniprot_id)
+        if cached is not None:
+            return cached
 
-        return results
+        arrays = self._load_arrays(pdb_id)
+        if arrays is None:
+            return None
+        uniprot_seq = self.alignment_engine.fetch_uniprot_sequence(uniprot_id)
+        if not uniprot_seq:
+            return None
+
+        if sifts_entries is None:
+            sifts_entries = self._sifts_uniprot_entries(pdb_id)
+        chain_segments = {}
+        for accession, entry in sifts_entries.items():
+            if accession.upper() == uniprot_id.upper():
+                for mapping in entry.get('mappings', []):
+                    chain_segments.setdefault(mapping.get('chain_id'), []).append(mapping)
+
+        chain_maps = {}
+        for chain_id, (resseq, icode, sequence) in self._chain_residues(arrays).items():
+            chain_map = None
+            if chain_id in chain_segments:
+                chain_map = map_from_sifts(chain_id, resseq, icode, sequence,
+                                           chain_segments[chain_id], len(uniprot_seq))
+            if chain_map is None and len(sequence) >= 10:
+                chain_map = map_from_alignment(chain_id, resseq, icode, sequence, uniprot_seq)
+            if chain_map is not None and chain_map.summary()['mapped_residues']:
+                chain_maps[chain_id] = chain_map
+
+        self.residue_maps.put(pdb_id, uniprot_id, chain_maps)
+        return chain_maps
+
+    def translate_uniprot_position(self, pdb_id, uniprot_pos, uniprot_id=None, chain_id=None):
+        """
+        UniProt位置 → PDB残基 [{'chain', 'resseq', 'icode', 'residue'}]
+        指定chain_id时只查该链；未覆盖的链不出现在结果中
+        """
+        chain_maps = self.residue_map(pdb_id, uniprot_id) or {}
+        hits = []
+        for cid, chain_map in chain_maps.items():
+            if chain_id and cid != chain_id:
+                continue
+            translated = chain_map.to_pdb(uniprot_pos)
+            if translated:
+                resseq, icode, residue = translated
+                hits.append({'chain': cid, 'resseq': resseq, 'icode': icode, 'residue': residue})
+        return hits
 
     def align_with_uniprot(self, pdb_id, uniprot_id=None):
-        """将PDB序列与UniProt canonical序列比对"""
+        """将PDB序列与UniProt canonical序列比对（每个唯一实体序列只比对一次）"""
         print(f"🔗 正在比对 {pdb_id} 与 UniProt 序列...")
 
-        # 获取PDB序列
-        pdb_info = self.fetch_pdb_info(pdb_id)
-        if not pdb_info or not pdb_info.get('sequence'):
-            # 尝试从结构文件获取
-            pdbl = PDBList()
-            pdb_file = pdbl.retrieve_pdb_file(pdb_id, pdir='.', file_format='pdb')
-            if pdb_file:
-                parser = PDBParser(QUIET=True)
-                structure = parser.get_structure(pdb_id, pdb_file)
-                model = structure[0]
-
-                pdb_sequences = {}
-                for chain in model:
-                    seq = []
-                    for residue in chain:
-                        one_letter = THREE_TO_ONE.get(residue.get_resname())
-                        if one_letter:
-                            seq.append(one_letter)
-                    if seq:
-                        pdb_sequences[chain.id] = ''.join(seq)
-            else:
-                return {'error': f'无法获取 {pdb_id} 的序列'}
-        else:
-            pdb_sequences = {'A': pdb_info.get('sequence', '')}
+        # 获取PDB实体序列及其对应的链
+        entities = self._polymer_entities(pdb_id)
+        if not entities:
+            return {'error': f'无法获取 {pdb_id} 的序列'}
+        pdb_sequences = {chain_id: e['sequence'] for e in entities for chain_id in e['chains']}
 
-        # 如果没有提供UniProt ID，尝试从PDB映射获取
-        if not uniprot_id:
-            try:
-                url = f"https://www.ebi.ac.uk/pdbe/api/mappings/uniprot/{pdb_id}"
-                response = requests.get(url)
-                if response.status_code == 200:
-                    data = response.json()
-                    uniprot_entries = data.get(pdb_id.lower(), {}).get('UniProt', {})
-                    if uniprot_entries:
-                        uniprot_id = list(uniprot_entries.keys())[0]
-            except:
-                pass
+        # 如果没有提供UniProt ID，按实体从PDB映射获取
+        entity_accessions = {} if uniprot_id else self._uniprot_mapping(pdb_id)
+        uniprot_id = uniprot_id or entity_accessions.get(None)
 
         if not uniprot_id:
             return {'error': '无法确定UniProt ID，请手动提供', 'pdb_sequences': pdb_sequences}
 
         # 获取UniProt序列
         try:
-            url = f"https://rest.uniprot.org/uniprotkb/{uniprot_id}.fasta"
-            response = requests.get(url)
-            if response.status_code != 200:
+            uniprot_seq = self.alignment_engine.fetch_uniprot_sequence(uniprot_id)
+            if uniprot_seq is None:
                 return {'error': f'无法获取UniProt序列: {uniprot_id}'}
-
-            fasta_lines = response.text.strip().split('\n')
-            uniprot_seq = ''.join(fasta_lines[1:])
         except Exception as e:
             return {'error': f'获取UniProt序列失败: {e}'}
 
@@ -881,85 +1614,91 @@ class GGETPDB:
             'pdb_id': pdb_id,
             'uniprot_id': uniprot_id,
             'uniprot_length': len(uniprot_seq),
-            'chain_alignments': {}
+            'chain_alignments': {},
+            'entities': []
         }
 
-        aligner = PairwiseAligner()
-        aligner.mode = 'global'
-        aligner.match_score = 2
-        aligner.mismatch_score = -1
-        aligner.open_gap_score = -2
-        aligner.extend_gap_score = -0.5
-
-        for chain_id, pdb_seq in pdb_sequences.items():
-            if len(pdb_seq) < 10:  # 跳过太短的序列
+        jobs = []
+        aligned_entities = []
+        for entity in entities:
+            if len(entity['sequence']) < 10:  # 跳过太短的序列
                 continue
-
-            alignments = aligner.align(uniprot_seq, pdb_seq)
-            if alignments:
-                best_alignment = alignments[0]
-
-                # 计算序列一致性
-                aligned_uniprot, aligned_pdb = best_alignment.aligned
-
-                # 简单计算一致性
-                matches = 0
-                total_aligned = 0
-                gaps_in_pdb = []  # 缺失区段
-                insertions_in_pdb = []  # 插入区段
-
-                uniprot_aligned = str(best_alignment).split('\n')[0]
-                pdb_aligned = str(best_alignment).split('\n')[2] if len(str(best_alignment).split('\n')) > 2 else ''
-
-                # 计算identity
-                for i, (u, p) in enumerate(zip(uniprot_aligned, pdb_aligned)):
-                    if u != '-' and p != '-':
-                        total_aligned += 1
-                        if u == p:
-                            matches += 1
-
-                identity = round(matches / len(uniprot_seq) * 100, 2) if uniprot_seq else 0
-                coverage = round(len(pdb_seq) / len(uniprot_seq) * 100, 2) if uniprot_seq else 0
-
-                # 检测缺失和插入区段
-                # 通过aligned块来识别
-                current_pos = 0
-                for block in aligned_uniprot:
-                    start, end = block
-                    if start > current_pos:
-                        gaps_in_pdb.append({'start': current_pos + 1, 'end': start, 'length': start - current_pos})
-                    current_pos = end
-
-                if current_pos < len(uniprot_seq):
-                    gaps_in_pdb.append({'start': current_pos + 1, 'end': len(uniprot_seq), 'length': len(uniprot_seq) - current_pos})
-
-                results['chain_alignments'][chain_id] = {
-                    'pdb_length': len(pdb_seq),
-                    'identity_percent': identity,
-                    'coverage_percent': coverage,
-                    'missing_regions': gaps_in_pdb,
-                    'alignment_score': best_alignment.score
-                }
+            accession = entity_accessions.get(entity['entity_id'], uniprot_id)
+            try:
+                accession_seq = uniprot_seq if accession == uniprot_id else self.alignment_engine.fetch_uniprot_sequence(accession)
+            except Exception as e:
+                print(f"获取UniProt序列失败: {e}")
+                accession_seq = None
+            if not accession_seq:
+                accession, accession_seq = uniprot_id, uniprot_seq
+            jobs.append((entity['sequence'], accession, accession_seq))
+            aligned_entities.append((entity, accession, len(accession_seq)))
+
+        for (entity, accession, accession_length), alignment in zip(aligned_entities,
+                                                                    self.alignment_engine.align(jobs)):
+            results['entities'].append({
+                'entity_id': entity['entity_id'],
+                'chains': entity['chains'],
+                'uniprot_id': accession,
+                'uniprot_length': accession_length
+            })
+            for chain_id in entity['chains']:
+                results['chain_alignments'][chain_id] = dict(alignment, entity_id=entity['entity_id'],
+                                                             uniprot_id=accession)
 
         return results
 
+    # ==================== 4.4 结构面板合集 ====================
+    def iter_bundle(self, pdb_id, sections=None, assembly_id=None):
+        """
+        一次解析计算选中结构的多个面板，按完成顺序逐段产出 (section, result)
+        sections 取自 BUNDLE_SECTIONS: info / analysis / advanced / composition
+        """
+        runners = {
+            'info': lambda: self.fetch_pdb_info(pdb_id),
+            'analysis': lambda: self.analyze_structure(pdb_id, assembly_id=assembly_id),
+            'advanced': lambda: self.analyze_advanced_structure(pdb_id, assembly_id=assembly_id),
+            'composition': lambda: self.analyze_sequence_composition(pdb_id),
+        }
+        with self.parse_scope():
+            for section in sections or BUNDLE_SECTIONS:
+                try:
+                    result = runners[section]()
+                except Exception as e:
+                    result = {'error': str(e)}
+                yield section, result if result else {'error': f'无法计算 {section}: {pdb_id}'}
+
+    def analyze_bundle(self, pdb_id, sections=None, assembly_id=None):
+        """iter_bundle 的非流式版本"""
+        bundle = {'pdb_id': pdb_id}
+        bundle.update(self.iter_bundle(pdb_id, sections, assembly_id))
+        return bundle
+
     # ==================== 5. 报告生成 ====================
-    def generate_report(self, gene_name=None, pdb_ids=None):
-        """生成交互式分析报告"""
+    def generate_report(self, gene_name=None, pdb_ids=None, uniprot_positions=None):
+        """
+        生成交互式分析报告
+        uniprot_positions: 需要在各结构中定位的UniProt位点列表
+        """
         report = []
         report.append("# 🧬 蛋白结构综合分析报告\n")
 
         if gene_name:
             report.append(f"## 1. 基因查询: {gene_name}")
-            structures = self.gene_to_structures(gene_name)
+            # 选覆盖蛋白不同区域的最少结构，而不是同一结构域的多个近似结构
+            coverage = self.gene_structure_coverage(gene_name)
+            selected = coverage.get('selected', [])[:5]
+            structures = list(dict.fromkeys(item['pdb_id'] for item in selected))
 
             if structures:
-                report.append(f"找到 {len(structures)} 个相关结构:")
-                for i, pdb_id in enumerate(structures[:3], 1):
-                    info = self.fetch_pdb_info(pdb_id)
-                    if info:
-                        report.append(f"{i}. **{pdb_id}**: {info['title']} (分辨率: {info['resolution']}Å)")
-                pdb_ids = structures[:]  # 取前两个进行分析
+                report.append(f"UniProt {coverage['uniprot_id']}（{coverage['length']} 个残基）共有 "
+                              f"{coverage['num_structures']} 个结构，覆盖 {coverage['coverage_pct']}%；"
+                              f"选出 {len(structures)} 个覆盖不同区域的结构:")
+                for i, item in enumerate(selected, 1):
+                    resolution = f"{item['resolution']}Å" if item['resolution'] is not None else "N/A"
+                    report.append(f"{i}. **{item['pdb_id']}** 链 {item['chain_id']}: "
+                                  f"UniProt {item['start']}-{item['end']} (分辨率: {resolution})")
+                pdb_ids = structures[:]
             else:
                 report.append("⚠️ 未找到相关结构，请直接提供PDB ID")
                 pdb_ids = pdb_ids or []
@@ -987,6 +1726,17 @@ class GGETPDB:
                     report.append(f"- 残基数: {analysis['num_residues']}")
                     report.append(f"- 原子数: {analysis['num_atoms']}")
 
+                # UniProt位点 → 结构残基
+                if uniprot_positions:
+                    report.append("\n**UniProt 位点映射**:")
+                    for position in uniprot_positions:
+                        hits = self.translate_uniprot_position(pdb_id, int(position))
+                        if hits:
+                            located = ', '.join(f"{h['chain']}:{h['residue']}{h['resseq']}{h['icode']}" for h in hits)
+                            report.append(f"- UniProt {position} → {located}")
+                        else:
+                            report.append(f"- UniProt {position} → 结构中未解析")
+
         # 可视化部分
         report.append("\n## 3. 3D可视化")
         report.append("运行以下代码查看3D结构:")
@@ -1008,12 +1758,19 @@ class GGETPDB:
         return "\n".join(report)
 
     # ==================== 便捷函数 ====================
-    def quick_analysis(self, input_term):
-        """一键式快速分析：接受基因名或PDB ID"""
+    def quick_analysis(self, input_term, deadline_ms=None):
+        """
+        一键式快速分析：接受基因名或PDB ID
+        deadline_ms: 时间预算；指定时各阶段并发执行，到期返回已完成的部分，
+        未完成的阶段列在 pending 中，凭 continuation_token 调用 quick_analysis_resume 获取其余部分
+        """
+        if deadline_ms is not None:
+            return self.quick_jobs.collect(self.quick_jobs.start(input_term), deadline_ms / 1000)
+
         result = {}
 
         # 判断输入类型
-        if len(input_term) == 4 and input_term.isalnum():  # 可能是PDB ID
+        if is_pdb_id(input_term):  # 可能是PDB ID
             result['type'] = 'pdb_id'
             result['pdb_ids'] = [input_term]
             result['info'] = self.fetch_pdb_info(input_term)
@@ -1021,13 +1778,20 @@ class GGETPDB:
         else:  # 可能是基因名
             result['type'] = 'gene'
             result['gene_name'] = input_term
-            result['pdb_ids'] = self.gene_to_structures(input_term)
+            result['pdb_ids'] = self.gene_to_structures(input_term, strategy='coverage')
             if result['pdb_ids']:
                 result['info'] = self.fetch_pdb_info(result['pdb_ids'][0])
                 result['analysis'] = self.analyze_structure(result['pdb_ids'][0])
 
         return result
 
+    def quick_analysis_resume(self, token, deadline_ms=0):
+        """按续取令牌获取快速分析的其余部分（最多再等待 deadline_ms 毫秒）"""
+        job = self.quick_jobs.resume(token)
+        if job is None:
+            return {'error': '无效的续取令牌'}
+        return self.quick_jobs.collect(job, deadline_ms / 1000)
+
 
 # 创建全局实例
 gget_pdb = GGETPDB()
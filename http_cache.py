@@ -0,0 +1,120 @@
+# 文件：http_cache.py
+# HTTP缓存语义：由 PDB ID + 条目修订 + 分析版本生成确定性 ETag，条件请求在计算前短路，大响应压缩
+import functools
+import gzip
+import hashlib
+import os
+
+from flask import make_response, request
+
+try:
+    import brotli
+except ImportError:  # 未安装时只提供gzip
+    brotli = None
+
+from result_store import RESULT_VERSIONS
+
+# 没有独立分析版本的接口（突变、比对、映射、报告等）共用的版本号
+API_VERSION = 1
+
+# 可被 CDN / 反向代理缓存的时长（秒）
+MAX_AGE = int(os.environ.get('GENE2PDB_HTTP_MAX_AGE', 3600))
+STALE_WHILE_REVALIDATE = int(os.environ.get('GENE2PDB_HTTP_STALE_SECONDS', 86400))
+
+# 小于该字节数的响应不压缩
+MIN_COMPRESS_BYTES = 1024
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'application/octet-stream',
+                          'text/plain', 'text/markdown')
+
+
+def make_etag(endpoint, pdb_ids, revisions, version, args):
+    """确定性弱 ETag：接口 + PDB ID + 条目修订 + 分析版本 + 查询参数"""
+    parts = [endpoint, str(version)]
+    parts += [f"{pdb_id.lower()}@{revision}" for pdb_id, revision in zip(pdb_ids, revisions)]
+    parts += [f"{key}={value}" for key, value in sorted(args.items(multi=True))]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:24]
+
+
+def cache_headers(response):
+    response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, stale-while-revalidate={STALE_WHILE_REVALIDATE}'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def cacheable(response):
+    """
+    流式响应在生成完之前无法确认内容（中途可能出错），不可缓存；
+    JSON 结果顶层或其中某一部分（如合集的某个 section）带 error 时也不缓存（部分接口出错时仍返回200）
+    """
+    if response.is_streamed:
+        return False
+    if response.mimetype != 'application/json':
+        return True
+    payload = response.get_json(silent=True)
+    if isinstance(payload, dict):
+        return 'error' not in payload and not any(isinstance(v, dict) and 'error' in v for v in payload.values())
+    return True
+
+
+def conditional(analyzer, kind=None, pdb_ids=None):
+    """
+    Flask 视图装饰器：计算 ETag，命中 If-None-Match 时直接返回 304（不执行分析）
+    kind: 对应 RESULT_VERSIONS 的分析类型，组合多种分析的接口（如 bundle）传元组，任一分析版本变化 ETag 即变化
+    pdb_ids: 从请求中取 PDB ID 列表的函数
+    无法获取条目修订（上游不可用）时不生成 ETag
+    """
+    if isinstance(kind, tuple):
+        version = '.'.join(f"{k}{RESULT_VERSIONS.get(k, API_VERSION)}" for k in kind)
+    else:
+        version = RESULT_VERSIONS.get(kind, API_VERSION)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            ids = pdb_ids() if pdb_ids else [kwargs.get('pdb_id') or request.args.get('pdb_id', '')]
+            ids = [pdb_id for pdb_id in ids if pdb_id]
+            revisions = [analyzer.entry_revision(pdb_id) for pdb_id in ids]
+            if not ids or None in revisions:
+                return view(*args, **kwargs)
+
+            etag = make_etag(request.endpoint, ids, revisions, version, request.args)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or not cacheable(response):
+                    return response
+            response.set_etag(etag, weak=True)
+            return cache_headers(response)
+        return wrapper
+    return decorator
+
+
+def compress_response(response):
+    """按 Accept-Encoding 对较大的响应做 brotli / gzip 压缩"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(data, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    """
+    注册压缩钩子；应在其他 after_request 钩子之前调用，
+    Flask 按注册的逆序执行 after_request，这样压缩最后执行
+    """
+    app.after_request(compress_response)
@@ -0,0 +1,174 @@
+# 文件：interfaces.py
+# 链间界面：包围盒剪枝找相邻链对，空间索引求界面原子，只对界面附近原子重算SASA得到埋藏面积
+import numpy as np
+
+from structure_arrays import atom_pairs_within, atomic_radii, bounding_box, shrake_rupley
+
+
+def chain_units(arrays, mask):
+    """不对称单元中每条链一个单元：{'label', 'atoms', 'coords'}（atoms 为 arrays 中的下标）"""
+    units = []
+    for chain_id in arrays.chain_ids():
+        atoms = np.nonzero((arrays.chain == chain_id) & mask)[0]
+        if len(atoms):
+            units.append({'label': str(chain_id), 'atoms': atoms,
+                          'coords': arrays.coords[atoms].astype(np.float64)})
+    return units
+
+
+def assembly_units(assembly, mask):
+    """生物组装体中每个拷贝一个单元（坐标为对称变换后的坐标）"""
+    units = []
+    for k, copy in enumerate(assembly.copies):
+        atoms = copy['atoms'][mask[copy['atoms']]]
+        if len(atoms):
+            units.append({'label': copy['label'], 'atoms': atoms, 'coords': assembly.copy_coords(k, subset=atoms)})
+    return units
+
+
+def _within_box(coords, box, margin):
+    lo, hi = box
+    return np.nonzero(np.all((coords >= lo - margin) & (coords <= hi + margin), axis=1))[0]
+
+
+class InterfaceAnalyzer:
+    """
+    单元（链或组装体拷贝）间的界面分析
+    - 包围盒扩展后相交的单元对才做原子级搜索，且只取落在对方包围盒附近的原子
+    - 埋藏面积 = 界面附近原子单独时的SASA − 复合物中的SASA；远离界面的原子SASA不变，不参与计算
+    - 每个原子单独时的SASA只算一次，在该单元的所有界面之间复用
+    """
+
+    def __init__(self, arrays, units, contact_cutoff=5.0, probe_radius=1.40, n_points=100):
+        self.arrays = arrays
+        self.units = units
+        self.contact_cutoff = contact_cutoff
+        self.probe_radius = probe_radius
+        self.n_points = n_points
+
+        self.radii = atomic_radii(arrays.element)
+        # 原子 → 残基下标
+        self.residue_starts = arrays.residue_starts() if len(arrays) else np.zeros(0, dtype=np.int64)
+        residue_of_atom = np.zeros(len(arrays), dtype=np.int64)
+        residue_of_atom[self.residue_starts[1:]] = 1
+        self.residue_of_atom = np.cumsum(residue_of_atom)
+
+        max_radius = float(self.radii[np.concatenate([u['atoms'] for u in units])].max()) if units else 0.0
+        # 两原子相距超过该距离时互不遮挡
+        self.occlusion_margin = 2 * (max_radius + probe_radius)
+        self._boxes = [bounding_box(u['coords']) for u in units]
+        self._isolated = [np.full(len(u['atoms']), np.nan) for u in units]
+
+    def candidate_pairs(self, margin):
+        """包围盒扩展 margin 后相交的单元对 (i, j)，i < j"""
+        if len(self.units) < 2:
+            return []
+        lo = np.array([b[0] for b in self._boxes])
+        hi = np.array([b[1] for b in self._boxes])
+        overlap = np.all((lo[:, None, :] - margin <= hi[None, :, :]) & (lo[None, :, :] - margin <= hi[:, None, :]),
+                         axis=2)
+        i_idx, j_idx = np.nonzero(np.triu(overlap, k=1))
+        return list(zip(i_idx.tolist(), j_idx.tolist()))
+
+    def _local_region(self, k, positions):
+        """单元k中可能遮挡 positions 这些原子的原子（位置下标，有序）"""
+        coords = self.units[k]['coords']
+        return _within_box(coords, bounding_box(coords[positions]), self.occlusion_margin)
+
+    def _isolated_sasa(self, k, positions):
+        """单元k单独存在时指定原子的SASA（按原子缓存）"""
+        cache = self._isolated[k]
+        missing = positions[np.isnan(cache[positions])]
+        if len(missing):
+            unit = self.units[k]
+            region = self._local_region(k, missing)
+            cache[missing] = shrake_rupley(unit['coords'][region], self.radii[unit['atoms'][region]],
+                                           probe_radius=self.probe_radius, n_points=self.n_points,
+                                           indices=np.searchsorted(region, missing))
+        return cache[positions]
+
+    def _complex_sasa(self, a, b, affected_a, affected_b):
+        """单元 a、b 组成复合物时界面附近原子的SASA"""
+        unit_a, unit_b = self.units[a], self.units[b]
+        region_a = self._local_region(a, affected_a)
+        region_b = self._local_region(b, affected_b)
+        coords = np.concatenate([unit_a['coords'][region_a], unit_b['coords'][region_b]])
+        radii = np.concatenate([self.radii[unit_a['atoms'][region_a]], self.radii[unit_b['atoms'][region_b]]])
+        indices = np.concatenate([np.searchsorted(region_a, affected_a),
+                                  len(region_a) + np.searchsorted(region_b, affected_b)])
+        sasa = shrake_rupley(coords, radii, probe_radius=self.probe_radius, n_points=self.n_points, indices=indices)
+        return sasa[:len(affected_a)], sasa[len(affected_a):]
+
+    def _residue_table(self, k, contact_positions, affected, buried):
+        """界面残基列表：有原子接触或有埋藏面积的残基"""
+        unit = self.units[k]
+        arrays = self.arrays
+        residue_buried = {}
+        for residue, area in zip(self.residue_of_atom[unit['atoms'][affected]].tolist(), buried):
+            residue_buried[residue] = residue_buried.get(residue, 0.0) + float(area)
+        keep = {r for r, area in residue_buried.items() if area > 0.0}
+        keep.update(self.residue_of_atom[unit['atoms'][contact_positions]].tolist())
+
+        residues = []
+        for residue in sorted(keep):
+            start = self.residue_starts[residue]
+            icode = str(arrays.icode[start]).strip()
+            residues.append({
+                'residue': f"{unit['label']}:{arrays.resname[start]}{arrays.resseq[start]}{icode}",
+                'resname': str(arrays.resname[start]),
+                'resseq': int(arrays.resseq[start]),
+                'icode': icode,
+                'buried_sasa': round(residue_buried.get(residue, 0.0), 2),
+            })
+        return residues
+
+    def interface(self, a, b):
+        """单元对 (a, b) 的界面；没有接触时返回None"""
+        unit_a, unit_b = self.units[a], self.units[b]
+        reach = max(self.occlusion_margin, self.contact_cutoff)
+        near_a = _within_box(unit_a['coords'], self._boxes[b], reach)
+        near_b = _within_box(unit_b['coords'], self._boxes[a], reach)
+        if not len(near_a) or not len(near_b):
+            return None
+        i_idx, j_idx, dist = atom_pairs_within(unit_a['coords'][near_a], unit_b['coords'][near_b], reach)
+        in_contact = dist <= self.contact_cutoff
+        if not np.any(in_contact):
+            return None
+
+        # 只有彼此可能遮挡的原子SASA会变化
+        pos_a, pos_b = near_a[i_idx], near_b[j_idx]
+        occluding = dist < (self.radii[unit_a['atoms'][pos_a]] + self.radii[unit_b['atoms'][pos_b]]
+                            + 2 * self.probe_radius)
+        affected_a, affected_b = np.unique(pos_a[occluding]), np.unique(pos_b[occluding])
+        complex_a, complex_b = self._complex_sasa(a, b, affected_a, affected_b)
+        buried_a = np.clip(self._isolated_sasa(a, affected_a) - complex_a, 0.0, None)
+        buried_b = np.clip(self._isolated_sasa(b, affected_b) - complex_b, 0.0, None)
+
+        label_a, label_b = unit_a['label'], unit_b['label']
+        return {
+            'chains': [label_a, label_b],
+            'buried_sasa': round(buried_a.sum() + buried_b.sum(), 2),
+            'buried_sasa_per_chain': {label_a: round(buried_a.sum(), 2), label_b: round(buried_b.sum(), 2)},
+            'num_atom_contacts': int(np.count_nonzero(in_contact)),
+            'residues': {
+                label_a: self._residue_table(a, pos_a[in_contact], affected_a, buried_a),
+                label_b: self._residue_table(b, pos_b[in_contact], affected_b, buried_b),
+            },
+        }
+
+    def run(self):
+        """全部界面，按埋藏面积降序"""
+        interfaces = []
+        for a, b in self.candidate_pairs(max(self.occlusion_margin, self.contact_cutoff)):
+            found = self.interface(a, b)
+            if found:
+                interfaces.append(found)
+        interfaces.sort(key=lambda x: -x['buried_sasa'])
+
+        partners = {u['label']: [] for u in self.units}
+        for item in interfaces:
+            label_a, label_b = item['chains']
+            partners[label_a].append(label_b)
+            partners[label_b].append(label_a)
+        return {'contact_cutoff': self.contact_cutoff, 'num_units': len(self.units),
+                'num_interfaces': len(interfaces), 'interfaces': interfaces, 'partners': partners}
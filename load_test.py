@@ -0,0 +1,495 @@
+# 文件：load_test.py
+# 并发负载测试：API 的外部依赖（RCSB / PDBe / UniProt / 坐标文件下载）指向本地替身（可注入延迟与错误），
+# 按流量组合驱动并发虚拟用户，输出各路由吞吐、p50/p95/p99 延迟与错误率，结果保存为JSON便于跨版本对比
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import requests
+
+from residue_properties import THREE_TO_ONE
+from structure_stream import summarize_pdb_file
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 流量组合：场景 → 权重
+MIXES = {
+    'browse': {'gene_flow': 0.6, 'structure_flow': 0.3, 'info_only': 0.1},
+    'analysis': {'structure_flow': 1.0},
+    'search': {'gene_flow': 0.5, 'info_only': 0.5},
+}
+
+
+# ==================== 上游替身 ====================
+class StubCatalog:
+    """由本地坐标文件生成替身数据：每个结构的条目/实体/二级结构信息，以及若干合成基因到结构的映射"""
+
+    def __init__(self, structures_dir, num_genes=10, structures_per_gene=3):
+        self.structures = {}
+        for name in sorted(os.listdir(structures_dir)):
+            match = re.match(r'pdb(\w{4})\.ent(\.gz)?$', name, re.IGNORECASE)
+            if not match:
+                continue
+            path = os.path.join(structures_dir, name)
+            opener = gzip.open if match.group(2) else open
+            with opener(path, 'rb') as handle:
+                raw = handle.read()
+            summary = summarize_pdb_file(path, THREE_TO_ONE)
+            pdb_id = match.group(1).upper()
+            self.structures[pdb_id] = {
+                'file_gz': gzip.compress(raw),
+                'sequences': summary.chain_sequences(),
+                'num_residues': summary.num_residues,
+                'resolution': round(1.2 + zlib.crc32(pdb_id.encode()) % 200 / 100, 2),
+            }
+        if not self.structures:
+            raise ValueError(f"{structures_dir} 中没有 pdbXXXX.ent(.gz) 文件")
+
+        ids = sorted(self.structures)
+        self.genes = {}
+        for k in range(num_genes):
+            accession = f"P{k:05d}"
+            members = [ids[(k + i) % len(ids)] for i in range(min(structures_per_gene, len(ids)))]
+            self.genes[f"GENE{k + 1}"] = {'accession': accession, 'structures': members}
+        self.accessions = {g['accession']: g for g in self.genes.values()}
+
+    def route(self, host, path, query):
+        """返回 (状态码, 响应体bytes, Content-Type)"""
+        parts = [p for p in path.split('/') if p]
+        if host == 'files.wwpdb.org' and parts and parts[-1].endswith('.ent.gz'):
+            entry = self.structures.get(parts[-1][3:7].upper())
+            return (200, entry['file_gz'], 'application/gzip') if entry else (404, b'', 'text/plain')
+
+        if host == 'rest.uniprot.org' and parts[:1] == ['uniprotkb']:
+            if len(parts) == 1:
+                gene = re.search(r'gene:(\S+)', (query.get('query') or [''])[0])
+                found = self.genes.get(gene.group(1).upper()) if gene else None
+                return self._json({'results': [{'primaryAccession': found['accession']}] if found else []})
+            accession = parts[1].split('.')[0]
+            gene = self.accessions.get(accession)
+            if not gene:
+                return 404, b'', 'text/plain'
+            sequence = next(iter(self.structures[gene['structures'][0]]['sequences'].values()), '')
+            return 200, f">sp|{accession}|STUB\n{sequence}\n".encode(), 'text/plain'
+
+        if host == 'www.ebi.ac.uk' and parts[:2] == ['pdbe', 'api']:
+            key = parts[-1]
+            if parts[2:4] == ['mappings', 'best_structures']:
+                gene = self.accessions.get(key)
+                if not gene:
+                    return self._json({}, 404)
+                return self._json({key: [{'pdb_id': pdb_id.lower(), 'chain_id': 'A',
+                                          'resolution': self.structures[pdb_id]['resolution'],
+                                          'unp_start': 1, 'unp_end': self.structures[pdb_id]['num_residues']}
+                                         for pdb_id in gene['structures']]})
+            entry = self.structures.get(key.upper())
+            if entry is None:
+                return self._json({}, 404)
+            if parts[2:5] == ['pdb', 'entry', 'secondary_structure']:
+                chains = []
+                for chain_id, sequence in entry['sequences'].items():
+                    n = len(sequence)
+                    chains.append({'chain_id': chain_id, 'secondary_structure': {
+                        'helices': [{'start': {'residue_number': 1}, 'end': {'residue_number': max(1, n * 2 // 5)}}],
+                        'strands': [{'start': {'residue_number': n // 2}, 'end': {'residue_number': n * 7 // 10}}],
+                    }})
+                return self._json({key.lower(): {'molecules': [{'chains': chains}]}})
+            if parts[2:5] == ['pdb', 'entry', 'summary']:
+                return self._json({key.lower(): [{'number_of_entities': {'polypeptide': len(entry['sequences'])}}]})
+            if parts[2:4] == ['mappings', 'uniprot']:
+                return self._json({key.lower(): {'UniProt': {}}})
+            return self._json({}, 404)
+
+        if host == 'data.rcsb.org' and parts[:3] == ['rest', 'v1', 'core']:
+            entry = self.structures.get(parts[4].upper()) if len(parts) > 4 else None
+            if entry is None:
+                return self._json({}, 404)
+            if parts[3] == 'entry':
+                return self._json({
+                    'struct': {'title': f'Load test structure {parts[4].upper()}'},
+                    'rcsb_entry_info': {'resolution_combined': [entry['resolution']],
+                                        'deposited_polymer_monomer_count': entry['num_residues']},
+                    'exptl': [{'method': 'X-RAY DIFFRACTION'}],
+                    'rcsb_accession_info': {'deposit_date': '2020-01-01T00:00:00+0000',
+                                            'revision_date': '2020-06-01T00:00:00+0000',
+                                            'major_revision': 1, 'minor_revision': 0},
+                    'rcsb_entry_container_identifiers': {'polymer_entity_ids': ['1']},
+                })
+            if parts[3] == 'polymer_entity':
+                sequence = next(iter(entry['sequences'].values()), '')
+                return self._json({
+                    'entity_poly': {'pdbx_seq_one_letter_code_can': sequence, 'rcsb_entity_polymer_type': 'Protein'},
+                    'rcsb_entity_source_organism': [{'scientific_name': 'Homo sapiens'}],
+                    'rcsb_polymer_entity_container_identifiers': {'auth_asym_ids': list(entry['sequences'])},
+                })
+        return 404, b'', 'text/plain'
+
+    @staticmethod
+    def _json(payload, status=200):
+        return status, json.dumps(payload).encode(), 'application/json'
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.stub.handle(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UpstreamStub:
+    """
+    本地上游替身：请求路径为 /<原域名>/<原路径>（与 upstream.rewrite_url 对应）
+    每个请求先等待 latency_ms ± jitter_ms，再以 error_rate 的概率返回 503
+    """
+
+    def __init__(self, catalog, latency_ms=50.0, jitter_ms=20.0, error_rate=0.0, seed=0):
+        self.catalog = catalog
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {}
+        self._server = None
+
+    def start(self, host='127.0.0.1', port=0):
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        threading.Thread(target=self._server.serve_forever, name='upstream-stub', daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, handler):
+        parsed = urlparse(handler.path)
+        host, _, rest = parsed.path.lstrip('/').partition('/')
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.error_rate
+            counters = self.stats.setdefault(host, {'requests': 0, 'injected_errors': 0})
+            counters['requests'] += 1
+            counters['injected_errors'] += int(fail)
+        time.sleep(delay)
+
+        if fail:
+            status, body, content_type = 503, b'injected error', 'text/plain'
+        else:
+            status, body, content_type = self.catalog.route(host, '/' + rest, parse_qs(parsed.query))
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+# ==================== API 进程 ====================
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_api(upstream_base, workdir, server='threaded', workers=4, result_store=None):
+    """
+    在 workdir 中启动 API 子进程（下载的坐标文件、缓存、结果库都落在 workdir）
+    server='threaded'：单进程多线程（Flask 内置服务器）；'serve'：serve.py 多 worker 进程
+    返回 (子进程, API 地址)
+    """
+    port = _free_port()
+    env = dict(os.environ,
+               GENE2PDB_UPSTREAM_BASE=upstream_base,
+               GENE2PDB_CACHE_DIR=os.path.join(workdir, '.gene2pdb_cache', 'arrays'),
+               GENE2PDB_RESULT_STORE=result_store or f"sqlite:///{os.path.join(workdir, '.gene2pdb_cache', 'results.db')}",
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])),
+               PYTHONUNBUFFERED='1')
+    if server == 'serve':
+        command = [sys.executable, os.path.join(REPO_DIR, 'serve.py'), '--host', '127.0.0.1', '--port', str(port),
+                   '--workers', str(workers)]
+    else:
+        command = [sys.executable, '-c',
+                   f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    log = open(os.path.join(workdir, 'api.log'), 'w')
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    api_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API 进程启动失败，日志见 {log.name}")
+        try:
+            if requests.get(f"{api_url}/api/health", timeout=1).status_code == 200:
+                return process, api_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"API 60 秒内未就绪，日志见 {log.name}")
+
+
+# ==================== 虚拟用户 ====================
+class Recorder:
+    """线程安全地记录每次请求 (路由, 耗时秒, 状态码, 是否降级, 异常)"""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, route, elapsed, status, degraded=False, error=None):
+        with self._lock:
+            self.samples.append((route, elapsed, status, degraded, error))
+
+
+class VirtualUser(threading.Thread):
+    """按流量组合循环执行场景，场景之间有随机思考时间"""
+
+    def __init__(self, api_url, catalog, mix, recorder, stop_event, think_ms=200.0, timeout=120.0, seed=0):
+        super().__init__(daemon=True)
+        self.api_url = api_url
+        self.catalog = catalog
+        self.scenarios = list(mix)
+        self.weights = list(mix.values())
+        self.recorder = recorder
+        self.stop_event = stop_event
+        self.think_ms = think_ms
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.session = requests.Session()
+
+    def call(self, route, path, **params):
+        """发起请求并记录；返回解析后的JSON（失败返回None）"""
+        start = time.perf_counter()
+        try:
+            response = self.session.get(self.api_url + path, params=params or None, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.recorder.add(route, time.perf_counter() - start, None, error=type(e).__name__)
+            return None
+        self.recorder.add(route, time.perf_counter() - start, response.status_code,
+                          degraded='X-Upstream-Degraded' in response.headers)
+        if response.status_code != 200:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    # ---------- 场景 ----------
+    def gene_flow(self):
+        """基因查询 → 前几个结构的信息 → 第一个结构的分析与高级分析"""
+        gene = self.rng.choice(list(self.catalog.genes))
+        found = self.call('/api/gene/structures', '/api/gene/structures', gene_name=gene)
+        pdb_ids = (found or {}).get('structures') or []
+        for pdb_id in pdb_ids[:3]:
+            self.call('/api/pdb/info/<pdb_id>', f'/api/pdb/info/{pdb_id}')
+        if pdb_ids:
+            self.call('/api/pdb/analyze/<pdb_id>', f'/api/pdb/analyze/{pdb_ids[0]}')
+            self.call('/api/pdb/analyze-advanced/<pdb_id>', f'/api/pdb/analyze-advanced/{pdb_ids[0]}')
+
+    def structure_flow(self):
+        """直接打开某个结构：信息 → 分析 → 高级分析"""
+        pdb_id = self.rng.choice(list(self.catalog.structures))
+        self.call('/api/pdb/info/<pdb_id>', f'/api/pdb/info/{pdb_id}')
+        self.call('/api/pdb/analyze/<pdb_id>', f'/api/pdb/analyze/{pdb_id}')
+        self.call('/api/pdb/analyze-advanced/<pdb_id>', f'/api/pdb/analyze-advanced/{pdb_id}')
+
+    def info_only(self):
+        pdb_id = self.rng.choice(list(self.catalog.structures))
+        self.call('/api/pdb/info/<pdb_id>', f'/api/pdb/info/{pdb_id}')
+
+    def run(self):
+        while not self.stop_event.is_set():
+            scenario = self.rng.choices(self.scenarios, weights=self.weights)[0]
+            getattr(self, scenario)()
+            if self.think_ms:
+                self.stop_event.wait(self.rng.expovariate(1000.0 / self.think_ms))
+
+
+# ==================== 统计与保存 ====================
+def summarize(samples, duration):
+    """按路由汇总：请求数、吞吐、错误率（5xx 与连接异常）、4xx 数、降级数、延迟分位数（毫秒）"""
+    def stats(rows):
+        latencies = np.array([r[1] for r in rows]) * 1000
+        errors = sum(1 for r in rows if r[2] is None or r[2] >= 500)
+        return {
+            'requests': len(rows),
+            'throughput_rps': round(len(rows) / duration, 3) if duration else 0.0,
+            'errors': errors,
+            'error_rate': round(errors / len(rows), 4),
+            'client_errors': sum(1 for r in rows if r[2] is not None and 400 <= r[2] < 500),
+            'degraded': sum(1 for r in rows if r[3]),
+            'latency_ms': {
+                'mean': round(float(latencies.mean()), 2),
+                'p50': round(float(np.percentile(latencies, 50)), 2),
+                'p95': round(float(np.percentile(latencies, 95)), 2),
+                'p99': round(float(np.percentile(latencies, 99)), 2),
+                'max': round(float(latencies.max()), 2),
+            },
+        }
+
+    routes = {}
+    for row in samples:
+        routes.setdefault(row[0], []).append(row)
+    return {
+        'overall': stats(samples) if samples else {},
+        'routes': {route: stats(rows) for route, rows in sorted(routes.items())},
+    }
+
+
+def _pad(text, width, right=False):
+    """按显示宽度对齐（中文字符占两列）"""
+    padding = ' ' * max(0, width - sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text))
+    return padding + text if right else text + padding
+
+
+def print_summary(result):
+    print(f"\n📊 负载测试结果（{result['config']['mix']}，{result['config']['users']} 用户，{result['duration_s']} 秒）")
+    header = (_pad('路由', 38) + ''.join(_pad(h, w, right=True) for h, w in
+                                        (('请求', 8), ('RPS', 9), ('错误率', 9), ('p50', 10), ('p95', 10), ('p99', 10))))
+    print(header)
+    print('-' * 94)
+    rows = list(result['routes'].items()) + [('总计', result['overall'])]
+    for route, s in rows:
+        if not s:
+            continue
+        lat = s['latency_ms']
+        print(f"{_pad(route, 38)}{s['requests']:>8}{s['throughput_rps']:>9.2f}{s['error_rate']:>9.2%}"
+              f"{lat['p50']:>10.1f}{lat['p95']:>10.1f}{lat['p99']:>10.1f}")
+    if result.get('upstream_stub'):
+        print(f"🔌 上游替身: {json.dumps(result['upstream_stub'], ensure_ascii=False)}")
+
+
+def print_comparison(result, baseline):
+    """与基线结果逐路由对比 p95、吞吐与错误率"""
+    print(f"\n🔍 与基线对比（{baseline.get('git_revision') or '未知版本'} @ {baseline.get('started_at')}）")
+    for route, s in list(result['routes'].items()) + [('总计', result['overall'])]:
+        base = baseline['overall'] if route == '总计' else baseline.get('routes', {}).get(route)
+        if not s or not base:
+            continue
+        p95, base_p95 = s['latency_ms']['p95'], base['latency_ms']['p95']
+        change = (p95 - base_p95) / base_p95 * 100 if base_p95 else 0.0
+        print(f"  {route:<38} p95 {base_p95:.1f} → {p95:.1f} ms ({change:+.1f}%)  "
+              f"RPS {base['throughput_rps']:.2f} → {s['throughput_rps']:.2f}  "
+              f"错误率 {base['error_rate']:.2%} → {s['error_rate']:.2%}")
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_load_test(args):
+    catalog = StubCatalog(args.structures_dir, num_genes=args.genes)
+    stub, process = None, None
+    workdir = args.workdir or tempfile.mkdtemp(prefix='gene2pdb_load_')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        if args.api_url:
+            api_url = args.api_url.rstrip('/')
+        else:
+            stub = UpstreamStub(catalog, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                error_rate=args.error_rate, seed=args.seed)
+            upstream_base = stub.start()
+            print(f"🔌 上游替身: {upstream_base}（延迟 {args.latency_ms}±{args.jitter_ms} ms，错误率 {args.error_rate:.0%}）")
+            process, api_url = start_api(upstream_base, workdir, server=args.server, workers=args.workers,
+                                         result_store=args.result_store)
+            print(f"🚀 API 已启动: {api_url}（{args.server}，工作目录 {workdir}）")
+
+        recorder = Recorder()
+        stop_event = threading.Event()
+        users = [VirtualUser(api_url, catalog, MIXES[args.mix], recorder, stop_event, think_ms=args.think_ms,
+                             seed=args.seed + i) for i in range(args.users)]
+        started_at = datetime.now().isoformat(timespec='seconds')
+        start = time.perf_counter()
+        for user in users:
+            user.start()
+            if args.ramp_up:
+                time.sleep(args.ramp_up / args.users)
+        stop_event.wait(max(0.0, args.duration - (time.perf_counter() - start)))
+        stop_event.set()
+        for user in users:
+            user.join(timeout=args.timeout)
+        duration = time.perf_counter() - start
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if stub is not None:
+            stub.stop()
+
+    result = {
+        'format_version': 1,
+        'started_at': started_at,
+        'git_revision': _git_revision(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'duration_s': round(duration, 2),
+        'upstream_stub': stub.stats if stub else None,
+    }
+    result.update(summarize(recorder.samples, duration))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gene2PDB API 并发负载测试（上游使用本地替身）')
+    parser.add_argument('--structures-dir', default='.', help='替身提供下载的坐标文件目录（pdbXXXX.ent 或 .ent.gz）')
+    parser.add_argument('--mix', choices=sorted(MIXES), default='browse', help='流量组合')
+    parser.add_argument('--users', type=int, default=50, help='并发虚拟用户数')
+    parser.add_argument('--duration', type=float, default=60, help='持续时间（秒）')
+    parser.add_argument('--ramp-up', type=float, default=5, help='用户逐个启动的总时长（秒）')
+    parser.add_argument('--think-ms', type=float, default=200, help='场景之间的平均思考时间（毫秒）')
+    parser.add_argument('--timeout', type=float, default=120, help='单个请求超时（秒）')
+    parser.add_argument('--genes', type=int, default=10, help='替身中的合成基因数')
+    parser.add_argument('--latency-ms', type=float, default=50, help='上游注入延迟（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=20, help='上游延迟抖动（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='上游注入 503 的概率')
+    parser.add_argument('--server', choices=('threaded', 'serve'), default='threaded',
+                        help='threaded：单进程多线程；serve：serve.py 多 worker 进程')
+    parser.add_argument('--workers', type=int, default=4, help='--server serve 时的 worker 数')
+    parser.add_argument('--result-store', default=None, help='结果存储地址（默认工作目录下的 SQLite，off 关闭）')
+    parser.add_argument('--workdir', default=None, help='API 工作目录（默认新建临时目录，即冷缓存）')
+    parser.add_argument('--api-url', default=None, help='压测已运行的 API（不启动替身和子进程）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='结果JSON路径（默认 loadtest_results/<时间>_<组合>.json）')
+    parser.add_argument('--compare', default=None, help='与之对比的基线结果JSON')
+    args = parser.parse_args()
+
+    result = run_load_test(args)
+    print_summary(result)
+
+    output = args.output or os.path.join(
+        'loadtest_results', f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{args.mix}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as handle:
+        json.dump(result, handle, ensure_ascii=False, indent=2)
+    print(f"💾 结果已保存: {output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            print_comparison(result, json.load(handle))
+
+
+if __name__ == '__main__':
+    main()
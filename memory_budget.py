@@ -0,0 +1,262 @@
+# 文件：memory_budget.py
+# 内存核算与准入控制：分析前按原子数预估内存，全局预算内排队/降级/拒绝，按请求记录峰值内存（RSS 采样，可选 tracemalloc）
+import functools
+import inspect
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# PDB 坐标行固定 80 列 + 换行；按文件大小估算原子数（含头部与 ANISOU 行，偏保守）
+PDB_LINE_BYTES = 81
+
+# 各分析每个原子的峰值内存（字节）：按 tracemalloc 实测（对象树约 700 B/原子）再为 C 扩展内部分配留余量
+COST_PER_ATOM = {
+    'analysis': 1500,           # 对象树 + 坐标数组
+    'advanced': 2500,           # 对象树 + ShrakeRupley / DSSP 缓冲
+    'advanced_reduced': 1200,   # 降级：跳过 SASA 与 DSSP
+    'interfaces': 1500,         # 对象树 + 界面附近的SASA
+    'binding_sites': 600,       # 坐标数组 + KD树与近邻对
+    'contacts': 5000,           # 近邻搜索与距离数组
+    'composition': 1000,
+    'streaming': 50,            # 流式单遍统计，与原子数基本无关
+}
+BASE_COST = 32 * 1024 ** 2
+
+
+def estimate_bytes(kind, num_atoms):
+    """按原子数估算一次分析的峰值内存"""
+    return BASE_COST + COST_PER_ATOM[kind] * int(num_atoms)
+
+
+def current_rss():
+    """当前进程常驻内存（字节）；无法获取时返回0"""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            # 非Linux只能拿到历史峰值（macOS 单位为字节，其余为KB）
+            usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return usage if os.uname().sysname == 'Darwin' else usage * 1024
+        except (ImportError, OSError):
+            return 0
+
+
+def memory_admitted(kind, reduced_kind=None):
+    """
+    GGETPDB 方法装饰器：配置了 memory_budget 时按预估内存申请额度后再执行（放在 stored_result 之下，命中结果存储时不占额度）
+    reduced_kind: 降级模式的成本类型；组装体分析没有降级模式
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, pdb_id, *args, **kwargs):
+            assembly_id = signature.bind(self, pdb_id, *args, **kwargs).arguments.get('assembly_id')
+            with self._memory_admission(kind, pdb_id, assembly_id,
+                                        reduced_kind if assembly_id is None else None):
+                return method(self, pdb_id, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MemoryBudgetExceeded(Exception):
+    """预估内存超出预算（或排队超时）且无法降级"""
+
+    def __init__(self, message, estimate=0, retry_after=None):
+        super().__init__(message)
+        self.estimate = estimate
+        self.retry_after = retry_after
+
+
+class MemoryBudget:
+    """
+    进程内的全局内存预算
+    - 预估值在预算内：等待已占用的额度释放后执行（最多 queue_timeout 秒）
+    - 超出预算或排队超时：若提供了降级模式的预估且放得下，则以降级模式执行（总等待不超过 queue_timeout 秒）
+    - 否则拒绝（MemoryBudgetExceeded）
+    """
+
+    def __init__(self, limit_bytes, queue_timeout=30.0):
+        self.limit_bytes = limit_bytes
+        self.queue_timeout = queue_timeout
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waiting = 0
+        self._active = {}
+        self._condition = threading.Condition()
+        self.stats = {'admitted': 0, 'queued': 0, 'downgraded': 0, 'rejected': 0}
+
+    def _acquire(self, amount, deadline):
+        """在 deadline（time.monotonic() 时刻）之前等到额度；成功返回True"""
+        with self._condition:
+            if self.in_use + amount > self.limit_bytes:
+                if deadline <= time.monotonic():
+                    return False
+                self.stats['queued'] += 1
+                self.waiting += 1
+                try:
+                    while self.in_use + amount > self.limit_bytes:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_use += amount
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            return True
+
+    def _release(self, amount):
+        with self._condition:
+            self.in_use -= amount
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, label, estimate, reduced_estimate=None):
+        """
+        申请额度，值为运行模式 'full' 或 'reduced'
+        reduced_estimate: 降级模式的预估；为None表示没有降级模式
+        """
+        # 完整与降级两次尝试共用一个截止时间：完整模式等满后，降级只在额度立即可用时执行
+        mode, amount = None, estimate
+        deadline = time.monotonic() + self.queue_timeout
+        if estimate <= self.limit_bytes and self._acquire(estimate, deadline):
+            mode = 'full'
+        elif reduced_estimate is not None and reduced_estimate <= self.limit_bytes \
+                and self._acquire(reduced_estimate, deadline):
+            mode, amount = 'reduced', reduced_estimate
+
+        with self._condition:
+            if mode is None:
+                self.stats['rejected'] += 1
+            else:
+                self.stats['admitted' if mode == 'full' else 'downgraded'] += 1
+        if mode is None:
+            too_large = estimate > self.limit_bytes
+            raise MemoryBudgetExceeded(
+                f"{label} 预计需要 {estimate / 1024 ** 2:.0f} MB，"
+                + ("超出内存预算" if too_large else "等待内存额度超时"),
+                estimate=estimate, retry_after=None if too_large else int(self.queue_timeout))
+
+        token = object()
+        with self._condition:
+            self._active[token] = {'label': label, 'mode': mode, 'bytes': amount, 'since': time.time()}
+        try:
+            yield mode
+        finally:
+            with self._condition:
+                self._active.pop(token, None)
+            self._release(amount)
+
+    def status(self):
+        with self._condition:
+            return dict(self.stats, limit_mb=round(self.limit_bytes / 1024 ** 2, 1),
+                        in_use_mb=round(self.in_use / 1024 ** 2, 1),
+                        peak_in_use_mb=round(self.peak_in_use / 1024 ** 2, 1), waiting=self.waiting,
+                        active=[{'label': a['label'], 'mode': a['mode'], 'mb': round(a['bytes'] / 1024 ** 2, 1),
+                                 'since': a['since']} for a in self._active.values()])
+
+
+class MemoryMonitor:
+    """
+    按请求记录峰值内存：后台线程每 interval 秒采样 RSS（可选 tracemalloc 的当前分配量），
+    更新所有进行中请求的峰值；并发请求共享进程内存，单个请求的增量为近似值
+    采样线程在首次 begin()/start() 时按进程启动，fork 出的 worker 各自启动自己的采样线程
+    """
+
+    def __init__(self, interval=0.05, use_tracemalloc=False, history=200):
+        self.interval = interval
+        self.use_tracemalloc = use_tracemalloc
+        if use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.history = deque(maxlen=history)
+        self._active = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.process_peak_rss = current_rss()
+        self._sampler_pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """在当前进程中启动采样线程（每个进程一次；fork 后父进程的进行中记录与锁不再沿用）"""
+        if self._sampler_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._sampler_pid == os.getpid():
+                return
+            if self._sampler_pid is not None:
+                self._active = {}
+                self._lock = threading.Lock()
+                self.process_peak_rss = current_rss()
+            self._sampler_pid = os.getpid()
+            threading.Thread(target=self._sample_loop, name='memory-sampler', daemon=True).start()
+
+    def _sample(self):
+        rss = current_rss()
+        traced = tracemalloc.get_traced_memory()[0] if self.use_tracemalloc else None
+        return rss, traced
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            rss, traced = self._sample()
+            with self._lock:
+                self.process_peak_rss = max(self.process_peak_rss, rss)
+                for record in self._active.values():
+                    record['_peak_rss'] = max(record['_peak_rss'], rss)
+                    if traced is not None:
+                        record['_peak_traced'] = max(record['_peak_traced'], traced)
+
+    def begin(self, label):
+        """开始记录当前线程的请求"""
+        self.start()
+        rss, traced = self._sample()
+        record = {'label': label, 'started_at': time.time(), '_start': time.perf_counter(),
+                  '_start_rss': rss, '_peak_rss': rss, '_start_traced': traced, '_peak_traced': traced}
+        self._local.record = record
+        with self._lock:
+            self._active[id(record)] = record
+        return record
+
+    def annotate(self, **info):
+        """为当前请求附加信息（预估内存、准入模式等）"""
+        record = getattr(self._local, 'record', None)
+        if record is not None:
+            record.update(info)
+
+    def end(self):
+        """结束当前线程的请求，返回记录（峰值均为相对请求开始时的增量）"""
+        record = getattr(self._local, 'record', None)
+        if record is None:
+            return None
+        self._local.record = None
+        rss, traced = self._sample()
+        with self._lock:
+            self._active.pop(id(record), None)
+        result = {k: v for k, v in record.items() if not k.startswith('_')}
+        result['duration_s'] = round(time.perf_counter() - record['_start'], 3)
+        result['rss_mb'] = round(rss / 1024 ** 2, 1)
+        peak_rss = max(record['_peak_rss'], rss)
+        result['peak_rss_delta_mb'] = round(max(0, peak_rss - record['_start_rss']) / 1024 ** 2, 1)
+        if traced is not None:
+            peak_traced = max(record['_peak_traced'], traced)
+            result['peak_traced_delta_mb'] = round(max(0, peak_traced - record['_start_traced']) / 1024 ** 2, 1)
+        self.history.append(result)
+        return result
+
+    def status(self, recent=20):
+        """诊断信息：当前/峰值 RSS、进行中请求数、最近请求与峰值最大的请求"""
+        history = list(self.history)
+        return {
+            'rss_mb': round(current_rss() / 1024 ** 2, 1),
+            'process_peak_rss_mb': round(self.process_peak_rss / 1024 ** 2, 1),
+            'tracemalloc': self.use_tracemalloc,
+            'active_requests': len(self._active),
+            'recent': history[-recent:],
+            'largest': sorted(history, key=lambda r: -r['peak_rss_delta_mb'])[:5],
+        }
@@ -0,0 +1,377 @@
+# 文件：pdb_sync.py
+# 与 PDB 每周发布增量同步：比对条目修订，只重新下载已修订/已废弃的结构，只重算依赖它们的本地结果
+# 用法: python pdb_sync.py [--full] [--dry-run] [--workers 4] [--ids 1abc,2xyz]
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import Pool
+
+ENT_FILE_PATTERN = re.compile(r'^pdb([0-9][a-z0-9]{3})\.ent$', re.IGNORECASE)
+
+# 上次同步距今不超过该天数时，只检查每周修改/废弃列表中的条目（以及尚未记录修订的本地条目）
+WEEKLY_WINDOW_DAYS = 7
+
+# 结果存储中的分析类型 → 重算所用的 GGETPDB 方法
+RECOMPUTE_METHODS = {
+    'info': 'fetch_pdb_info',
+    'analysis': 'analyze_structure',
+    'advanced': 'analyze_advanced_structure',
+    'composition': 'analyze_sequence_composition',
+    'interfaces': 'analyze_interfaces',
+    'binding_sites': 'analyze_binding_sites',
+}
+
+# worker 进程内的分析器（由 _init_worker 设置）
+_worker_analyzer = None
+
+
+# ==================== 配置与状态 ====================
+def sync_config_from_env(pdb_dir='.'):
+    """与 app.py 相同的缓存目录与结果存储配置（环境变量）"""
+    cache_dir = os.environ.get('GENE2PDB_CACHE_DIR', '.gene2pdb_cache/arrays')
+    return {
+        'pdb_dir': pdb_dir,
+        'cache_dir': cache_dir,
+        'cache_max_mb': int(os.environ.get('GENE2PDB_CACHE_MAX_MB', 2048)),
+        'result_store': os.environ.get('GENE2PDB_RESULT_STORE', 'sqlite:///.gene2pdb_cache/results.db'),
+        'state_path': sync_state_path(cache_dir),
+    }
+
+
+def sync_state_path(cache_dir):
+    """同步状态文件位于缓存目录旁"""
+    return os.path.join(os.path.dirname(cache_dir), 'sync_state.json')
+
+
+def build_analyzer(config):
+    """按配置创建 GGETPDB（与服务共用缓存目录和结果存储）"""
+    from gget_pdb import GGETPDB
+    from result_store import ResultStore
+    from structure_cache import SharedStructureCache
+
+    result_store = ResultStore(config['result_store']) if config['result_store'] != 'off' else None
+    structure_cache = SharedStructureCache(config['cache_dir'], max_bytes=config['cache_max_mb'] * 1024 ** 2)
+    return GGETPDB(structure_cache=structure_cache, pdb_dir=config['pdb_dir'], result_store=result_store)
+
+
+def load_state(path):
+    """{'last_sync': 时间戳, 'entries': {pdb_id: {'revision', 'synced_at'} 或 {'obsolete': True, ...}}}"""
+    try:
+        with open(path) as handle:
+            state = json.load(handle)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault('last_sync', None)
+    state.setdefault('entries', {})
+    return state
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.json')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(state, handle, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def sync_status(path):
+    """同步状态摘要（/api/cache/stats）"""
+    state = load_state(path)
+    entries = state['entries'].values()
+    return {'last_sync': state['last_sync'],
+            'tracked': sum(1 for e in entries if not e.get('obsolete')),
+            'obsolete': sum(1 for e in entries if e.get('obsolete'))}
+
+
+# ==================== 本地条目 ====================
+def _prefixed_ids(directory):
+    """派生缓存目录中 '<pdb_id>_...' 形式的文件名对应的 PDB ID"""
+    if not os.path.isdir(directory):
+        return set()
+    return {name.split('_', 1)[0].lower() for name in os.listdir(directory) if '_' in name}
+
+
+def local_entries(analyzer):
+    """本地有坐标文件、缓存数组、保存结果或派生缓存的全部条目"""
+    ids = set()
+    if os.path.isdir(analyzer.pdb_dir):
+        for name in os.listdir(analyzer.pdb_dir):
+            match = ENT_FILE_PATTERN.match(name)
+            if match:
+                ids.add(match.group(1).lower())
+    if analyzer.structure_cache is not None:
+        ids.update(analyzer.structure_cache.cached_ids())
+    if analyzer.result_store is not None:
+        ids.update(analyzer.result_store.pdb_ids())
+    ids.update(_prefixed_ids(analyzer.residue_maps.cache_dir))
+    ids.update(_prefixed_ids(analyzer.contact_cache.cache_dir))
+    return ids
+
+
+def local_timestamp(analyzer, pdb_id):
+    """本地数据中最早的时间（坐标文件修改时间、最早保存的结果），没有则为None"""
+    times = []
+    ent_path = os.path.join(analyzer.pdb_dir, f'pdb{pdb_id}.ent')
+    if os.path.exists(ent_path):
+        times.append(os.path.getmtime(ent_path))
+    if analyzer.result_store is not None:
+        times.extend(e['created_at'] for e in analyzer.result_store.entries(pdb_id))
+    return min(times) if times else None
+
+
+def _revision_timestamp(revision_date):
+    """'2023-01-18T00:00:00+0000' → UTC 时间戳（只取日期）"""
+    try:
+        return datetime.strptime(revision_date[:10], '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+# ==================== 比对修订 ====================
+def weekly_changes(analyzer):
+    """最近一次每周发布中修改和废弃的条目 (modified, obsolete)"""
+    from Bio.PDB import PDBList
+    from gget_pdb import PDB_FILE_SERVER
+    from upstream import rewrite_url
+
+    _, modified, obsolete = PDBList(server=rewrite_url(PDB_FILE_SERVER), verbose=False).get_recent_changes()
+    return {p.lower() for p in modified}, {p.lower() for p in obsolete}
+
+
+def check_entry(analyzer, pdb_id, recorded):
+    """
+    查询条目当前修订并与本地记录比对
+    返回 (状态, 修订标识)，状态为 'changed' / 'unchanged' / 'obsolete' / 'unknown'
+    """
+    response = analyzer.http.get(f"{analyzer.rcsb_base}/core/entry/{pdb_id}")
+    if response.status_code == 404:
+        return 'obsolete', None
+    if response.status_code != 200 or response.stale:
+        return 'unknown', None
+    try:
+        accession = response.json().get('rcsb_accession_info', {})
+    except ValueError:
+        return 'unknown', None
+    revision = analyzer.revision_key(accession)
+
+    if recorded is not None:
+        return ('unchanged' if recorded == revision else 'changed'), revision
+    # 首次同步：本地数据早于最近一次修订的条目视为已修订
+    revised_at = _revision_timestamp(accession.get('revision_date'))
+    local_at = local_timestamp(analyzer, pdb_id)
+    stale = revised_at is not None and local_at is not None and local_at < revised_at
+    return ('changed' if stale else 'unchanged'), revision
+
+
+def plan_sync(analyzer, state, full=False, ids=None, threads=8):
+    """
+    找出需要更新的条目
+    - 指定 ids 时只检查这些条目
+    - 上次同步在 WEEKLY_WINDOW_DAYS 天内时只检查每周修改/废弃列表与本地的交集，以及尚未记录修订的条目
+    - 否则（或 full=True、每周列表不可用）逐个检查全部本地条目
+    """
+    local = local_entries(analyzer)
+    entries = state['entries']
+    weekly_obsolete = set()
+    last_sync = state.get('last_sync')
+
+    if ids:
+        mode, candidates = 'ids', {p.lower() for p in ids}
+    elif not full and last_sync and time.time() - last_sync < WEEKLY_WINDOW_DAYS * 86400:
+        try:
+            modified, weekly_obsolete = weekly_changes(analyzer)
+            mode = 'weekly'
+            candidates = (local & (modified | weekly_obsolete)) | {p for p in local if p not in entries}
+        except Exception as e:
+            print(f"⚠️  获取每周变更列表失败，改为检查全部本地条目: {e}")
+            mode, candidates = 'full', local
+    else:
+        mode, candidates = 'full', local
+    candidates = sorted(p for p in candidates if not entries.get(p, {}).get('obsolete'))
+
+    plan = {'mode': mode, 'local': len(local), 'checked': len(candidates),
+            'changed': {}, 'obsolete': [], 'unchanged': {}, 'unknown': []}
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        checks = executor.map(lambda p: check_entry(analyzer, p, entries.get(p, {}).get('revision')), candidates)
+        for pdb_id, (status, revision) in zip(candidates, checks):
+            if pdb_id in weekly_obsolete or status == 'obsolete':
+                plan['obsolete'].append(pdb_id)
+            elif status == 'unknown':
+                plan['unknown'].append(pdb_id)
+            else:
+                plan[status][pdb_id] = revision
+    return plan
+
+
+# ==================== 更新条目（worker 进程） ====================
+def redownload_entry(pdb_id, pdb_dir):
+    """下载到临时目录再原子替换，服务进程不会读到写了一半的文件；失败时保留旧文件"""
+    from gget_pdb import download_pdb_file
+
+    return download_pdb_file(pdb_id, pdb_dir, overwrite=True) is not None
+
+
+def _init_worker(config, verbose):
+    global _worker_analyzer
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    _worker_analyzer = build_analyzer(config)
+
+
+def refresh_entry(analyzer, pdb_id, obsolete=False, recompute=True):
+    """
+    失效一个条目的全部派生数据；未废弃时重新下载坐标文件，并只重算失效前已存在的结果
+    返回 {'pdb_id', 'action', 'redownloaded', 'updated', 'recomputed', 'errors'}
+    updated 为真表示新坐标文件已就位且旧派生数据已失效（重算失败的结果会在下次请求时计算，不影响该条目的同步状态）
+    """
+    report = {'pdb_id': pdb_id, 'action': 'obsolete' if obsolete else 'changed',
+              'redownloaded': False, 'updated': False, 'recomputed': [], 'errors': []}
+
+    # 1. 失效前记下依赖该条目的结果
+    results = analyzer.result_store.entries(pdb_id) if analyzer.result_store is not None else []
+    uniprot_ids = analyzer.residue_maps.keys_for(pdb_id)
+    contact_keys = analyzer.contact_cache.keys_for(pdb_id)
+    had_arrays = analyzer.structure_cache is not None and pdb_id in analyzer.structure_cache
+    ent_path = os.path.join(analyzer.pdb_dir, f'pdb{pdb_id}.ent')
+
+    # 2. 下载新版本（先下载：失败时保留旧数据，下次同步重试）
+    if not obsolete and os.path.exists(ent_path):
+        try:
+            report['redownloaded'] = redownload_entry(pdb_id, analyzer.pdb_dir)
+        except OSError as e:
+            report['errors'].append(f'download: {e}')
+        if not report['redownloaded']:
+            report['errors'].append('download: 重新下载失败，保留旧数据')
+            return report
+
+    # 3. 失效派生数据
+    if analyzer.result_store is not None:
+        analyzer.result_store.invalidate(pdb_id)
+    analyzer.residue_maps.invalidate(pdb_id)
+    analyzer.contact_cache.invalidate(pdb_id)
+    if analyzer.structure_cache is not None:
+        analyzer.structure_cache.invalidate(pdb_id)
+    if obsolete:
+        if os.path.exists(ent_path):
+            os.remove(ent_path)
+        report['updated'] = True
+        return report
+    report['updated'] = True
+
+    # 4. 只重算之前存在的结果（同一作用域内只解析一次）
+    if not recompute:
+        return report
+    tasks = []
+    if had_arrays:
+        tasks.append(('arrays', lambda: analyzer._load_arrays(pdb_id)))
+    for entry in results:
+        if entry['kind'] not in RECOMPUTE_METHODS:
+            report['errors'].append(f"{entry['kind']}: 没有对应的重算方法，跳过（下次请求时计算）")
+            continue
+        method = getattr(analyzer, RECOMPUTE_METHODS[entry['kind']])
+        tasks.append((entry['kind'], lambda m=method, p=entry['params']: m(pdb_id, **p)))
+    for uniprot_id in uniprot_ids:
+        tasks.append(('residue_map', lambda u=uniprot_id: analyzer.residue_map(pdb_id, u)))
+    for cutoff, mode in contact_keys:
+        tasks.append(('contacts', lambda c=cutoff, m=mode: analyzer.contact_map_bytes(pdb_id, c, m)))
+
+    with analyzer.parse_scope():
+        for name, task in tasks:
+            try:
+                result = task()
+                if isinstance(result, dict) and 'error' in result:
+                    report['errors'].append(f"{name}: {result['error']}")
+                else:
+                    report['recomputed'].append(name)
+            except Exception as e:
+                report['errors'].append(f'{name}: {e}')
+    return report
+
+
+def _refresh_task(task):
+    pdb_id, obsolete, recompute = task
+    try:
+        return refresh_entry(_worker_analyzer, pdb_id, obsolete, recompute)
+    except Exception as e:
+        return {'pdb_id': pdb_id, 'action': 'obsolete' if obsolete else 'changed', 'redownloaded': False,
+                'updated': False, 'recomputed': [], 'errors': [str(e)]}
+
+
+def apply_sync(config, plan, workers=4, recompute=True, verbose=False):
+    """多进程并行更新已修订/废弃的条目，返回各条目的报告"""
+    tasks = [(p, False, recompute) for p in sorted(plan['changed'])] + [(p, True, recompute) for p in plan['obsolete']]
+    if not tasks:
+        return []
+    reports = []
+    with Pool(processes=max(1, min(workers, len(tasks))), initializer=_init_worker,
+              initargs=(config, verbose)) as pool:
+        for report in pool.imap_unordered(_refresh_task, tasks):
+            reports.append(report)
+            status = '⚠️ ' if report['errors'] else '✅'
+            print(f"{status} {report['pdb_id']} ({report['action']}): 重算 {len(report['recomputed'])} 项"
+                  + (f"，错误: {'; '.join(report['errors'])}" if report['errors'] else ''))
+    return reports
+
+
+def record_sync(state, plan, reports):
+    """写回修订记录：成功更新与未变化的条目记录当前修订；未完成更新（下载失败、中途出错）的和未知的不记录（下次重试）"""
+    now = time.time()
+    updated = {r['pdb_id'] for r in reports if r.get('updated')}
+    for pdb_id, revision in plan['unchanged'].items():
+        state['entries'][pdb_id] = {'revision': revision, 'synced_at': now}
+    for pdb_id, revision in plan['changed'].items():
+        if pdb_id in updated:
+            state['entries'][pdb_id] = {'revision': revision, 'synced_at': now}
+    for pdb_id in plan['obsolete']:
+        if pdb_id in updated:
+            state['entries'][pdb_id] = {'obsolete': True, 'synced_at': now}
+    if plan['mode'] != 'ids':
+        state['last_sync'] = now
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description='与 PDB 每周发布增量同步本地结构与分析结果')
+    parser.add_argument('--pdb-dir', default='.', help='坐标文件目录（与服务的 pdb_dir 相同）')
+    parser.add_argument('--full', action='store_true', help='忽略每周列表，逐个检查全部本地条目的修订')
+    parser.add_argument('--ids', default='', help='只同步这些条目，逗号分隔')
+    parser.add_argument('--dry-run', action='store_true', help='只列出需要更新的条目')
+    parser.add_argument('--no-recompute', action='store_true', help='只失效，不重算（下次请求时再计算）')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='并行更新的进程数')
+    parser.add_argument('--verbose', action='store_true', help='显示每个结构的分析日志')
+    args = parser.parse_args()
+
+    config = sync_config_from_env(args.pdb_dir)
+    analyzer = build_analyzer(config)
+    state = load_state(config['state_path'])
+    ids = [p.strip() for p in args.ids.split(',') if p.strip()]
+
+    started = time.time()
+    plan = plan_sync(analyzer, state, full=args.full, ids=ids)
+    print(f"🔄 同步模式 {plan['mode']}: 本地 {plan['local']} 个条目，检查 {plan['checked']} 个 → "
+          f"已修订 {len(plan['changed'])}，已废弃 {len(plan['obsolete'])}，未变化 {len(plan['unchanged'])}，"
+          f"无法确认 {len(plan['unknown'])}")
+    for pdb_id, revision in sorted(plan['changed'].items()):
+        print(f"   {pdb_id}: {state['entries'].get(pdb_id, {}).get('revision', '未记录')} → {revision}")
+    for pdb_id in plan['obsolete']:
+        print(f"   {pdb_id}: 已废弃")
+    if args.dry_run:
+        return
+
+    reports = apply_sync(config, plan, workers=args.workers, recompute=not args.no_recompute,
+                         verbose=args.verbose)
+    save_state(config['state_path'], record_sync(state, plan, reports))
+    recomputed = sum(len(r['recomputed']) for r in reports)
+    failed = sum(1 for r in reports if r['errors'])
+    print(f"🎉 同步完成 ({time.time() - started:.1f}s)：更新 {len(reports)} 个条目，重算 {recomputed} 项结果，"
+          f"{failed} 个条目有错误")
+
+
+if __name__ == '__main__':
+    main()
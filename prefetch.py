@@ -0,0 +1,170 @@
+# 文件：prefetch.py
+# 后台预取：基因查询返回后预下载、预解析排名靠前的结构，并按访问频率在启动时预热
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 下不加跨进程锁
+    fcntl = None
+
+PDB_ID_PATTERN = re.compile(r'^[0-9][A-Za-z0-9]{3}$')
+# 访问日志超过该大小时压缩为每个结构一行；压缩后只保留访问最多的 MAX_LOG_ENTRIES 个结构
+COMPACT_BYTES = 1024 ** 2
+MAX_LOG_ENTRIES = 10000
+
+
+class StructurePrefetcher:
+    """有界并发的结构预取器（可禁用 / 限速）"""
+
+    def __init__(self, analyzer, top_n=2, max_workers=2, rate_per_minute=0, enabled=True,
+                 log_path='.gene2pdb_cache/access_log.txt'):
+        self.analyzer = analyzer
+        self.top_n = top_n
+        self.rate_per_minute = rate_per_minute  # 0 表示不限速
+        self.enabled = enabled
+        self.log_path = log_path
+        self.max_workers = max_workers
+        # 线程池在首次提交时按进程创建：fork 出的 worker 中父进程的线程并不存在
+        self._executor = None
+        self._pid = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._last_start = 0.0
+        self.stats = {'scheduled': 0, 'completed': 0, 'failed': 0, 'skipped': 0}
+
+    # ---------- 访问频率日志 ----------
+    @contextmanager
+    def _log_lock(self, exclusive=False):
+        """追加写持共享锁、压缩持排他锁，压缩期间的追加不会丢失"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.log_path + '.lock', 'a') as lock_handle:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_handle, fcntl.LOCK_UN)
+
+    def record_access(self, pdb_id):
+        """记录一次结构访问（追加写，多进程安全）；不是合法 PDB ID 的输入不记录"""
+        if not self.log_path or not isinstance(pdb_id, str) or not PDB_ID_PATTERN.match(pdb_id):
+            return
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+            with self._log_lock():
+                with open(self.log_path, 'a') as handle:
+                    handle.write(f"{pdb_id.lower()} 1\n")
+                    size = handle.tell()
+            if size > COMPACT_BYTES:
+                self.compact_log()
+        except OSError as e:
+            print(f"⚠️  记录访问日志失败: {e}")
+
+    def access_counts(self):
+        """汇总访问日志（每行: pdb_id 次数；跳过格式不合法的行）"""
+        counts = Counter()
+        try:
+            with open(self.log_path) as handle:
+                for line in handle:
+                    parts = line.split()
+                    if len(parts) == 2 and PDB_ID_PATTERN.match(parts[0]) and parts[1].isdigit():
+                        counts[parts[0]] += int(parts[1])
+        except OSError:
+            pass
+        return counts
+
+    def compact_log(self):
+        """把访问日志压缩为每个结构一行（只保留访问最多的 MAX_LOG_ENTRIES 个），返回汇总后的访问次数"""
+        with self._log_lock(exclusive=True):
+            counts = Counter(dict(self.access_counts().most_common(MAX_LOG_ENTRIES)))
+            if not counts:
+                return counts
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.log_path) or '.', prefix='.access_log-')
+            with os.fdopen(fd, 'w') as handle:
+                for pdb_id, count in counts.most_common():
+                    handle.write(f"{pdb_id} {count}\n")
+            os.replace(tmp_path, self.log_path)
+        return counts
+
+    def warm_from_log(self, limit=10):
+        """启动时按访问频率预热缓存"""
+        try:
+            counts = self.compact_log()
+        except OSError as e:
+            print(f"⚠️  压缩访问日志失败: {e}")
+            counts = self.access_counts()
+        popular = [pdb_id for pdb_id, _ in counts.most_common(limit)]
+        if popular:
+            print(f"🔥 正在预热 {len(popular)} 个热门结构...")
+        return self._submit(popular)
+
+    # ---------- 预取 ----------
+    def schedule(self, pdb_ids):
+        """基因解析出结构列表后，预取前 top_n 个"""
+        return self._submit(list(pdb_ids)[:self.top_n])
+
+    def _ensure_executor(self):
+        """当前进程的线程池（fork 后首次提交时重新创建，父进程未完成的预取不再计入）"""
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='prefetch')
+            self._in_flight = set()
+            self._pid = os.getpid()
+        return self._executor
+
+    def _submit(self, pdb_ids):
+        if not self.enabled:
+            return []
+        submitted = []
+        with self._lock:
+            executor = self._ensure_executor()
+            for pdb_id in pdb_ids:
+                key = pdb_id.lower()
+                if key in self._in_flight:
+                    self.stats['skipped'] += 1
+                    continue
+                self._in_flight.add(key)
+                self.stats['scheduled'] += 1
+                submitted.append(key)
+                executor.submit(self._prefetch, key)
+        return submitted
+
+    def _wait_for_rate_limit(self):
+        """按部署配置限速：两次预取开始之间至少间隔 60/rate 秒"""
+        if not self.rate_per_minute:
+            return
+        interval = 60.0 / self.rate_per_minute
+        with self._lock:
+            start = max(time.monotonic(), self._last_start + interval)
+            self._last_start = start
+        delay = start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _prefetch(self, pdb_id):
+        try:
+            self._wait_for_rate_limit()
+            # 下载并解析，写入共享结构缓存
+            if self.analyzer._load_arrays(pdb_id) is not None:
+                self.stats['completed'] += 1
+            else:
+                self.stats['failed'] += 1
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"⚠️  预取 {pdb_id} 失败: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(pdb_id)
+
+    def status(self):
+        """预取器状态"""
+        with self._lock:
+            return dict(self.stats, enabled=self.enabled, top_n=self.top_n,
+                        rate_per_minute=self.rate_per_minute, in_flight=sorted(self._in_flight))
@@ -0,0 +1,174 @@
+# 文件：profiling.py
+# 按需性能剖析：对单个请求（或一次命令行运行）所在线程采样调用栈，输出 collapsed-stack（火焰图输入）与热点函数排行
+# 命令行：python profiling.py [--interval-ms 5] [--top 30] script.py [参数...]
+import argparse
+import json
+import os
+import re
+import runpy
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 追踪ID只允许这些字符（用作文件名）
+TRACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def valid_trace_id(trace_id):
+    return bool(trace_id) and bool(TRACE_ID_PATTERN.match(trace_id)) and trace_id not in ('.', '..')
+
+
+def _frame_label(code):
+    """栈帧 → 'function (file:line)'；仓库内文件用相对路径，其余只保留文件名"""
+    filename = code.co_filename
+    if filename.startswith(REPO_DIR):
+        filename = os.path.relpath(filename, REPO_DIR)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    后台线程每 interval 秒采样一次目标线程的调用栈，按完整调用栈计数
+    只观察目标线程：线程池/其他请求的计算不计入；C 扩展内的耗时记在调用它的 Python 函数上
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._start
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = self._labels.get(code)
+                if label is None:
+                    label = self._labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """collapsed-stack 文本（每行 '根;...;叶 次数'），可直接交给 flamegraph.pl / speedscope"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, n=30):
+        """热点函数：self 为位于栈顶的样本数，total 为出现在栈中的样本数（递归只计一次）"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        samples = self.samples or 1
+        return [{'function': label, 'self_samples': own[label], 'self_pct': round(own[label] / samples * 100, 1),
+                 'total_samples': total[label], 'total_pct': round(total[label] / samples * 100, 1)}
+                for label, _ in sorted(total.items(), key=lambda item: (-own[item[0]], -item[1]))[:n]]
+
+    def summary(self, top_n=30, **info):
+        return dict(info, started_at=self.started_at, duration_s=round(self.duration, 3),
+                    interval_ms=self.interval * 1000, samples=self.samples, top=self.top(top_n))
+
+
+def save_profile(profiler, out_dir, trace_id, top_n=30, **info):
+    """写出 <trace_id>.collapsed 与 <trace_id>.json，返回摘要"""
+    os.makedirs(out_dir, exist_ok=True)
+    summary = profiler.summary(top_n, trace_id=trace_id, **info)
+    with open(os.path.join(out_dir, f"{trace_id}.collapsed"), 'w') as handle:
+        handle.write(profiler.collapsed())
+    with open(os.path.join(out_dir, f"{trace_id}.json"), 'w') as handle:
+        json.dump(summary, handle, ensure_ascii=False, indent=2)
+    return summary
+
+
+def load_profile(out_dir, trace_id, collapsed=False):
+    """读取已保存的剖析结果（摘要或 collapsed 文本）；不存在时返回None"""
+    if not valid_trace_id(trace_id):
+        return None
+    path = os.path.join(out_dir, f"{trace_id}.{'collapsed' if collapsed else 'json'}")
+    try:
+        with open(path) as handle:
+            return handle.read() if collapsed else json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def profiled(out_dir, trace_id=None, interval=0.005, top_n=30, **info):
+    """剖析 with 块内当前线程的执行，结束时保存；值为 (trace_id, 结果dict)，结果在退出后填充摘要"""
+    trace_id = trace_id or new_trace_id()
+    result = {}
+    profiler = SamplingProfiler(interval=interval).start()
+    try:
+        yield trace_id, result
+    finally:
+        profiler.stop()
+        result.update(save_profile(profiler, out_dir, trace_id, top_n, **info))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对一次命令行运行做采样剖析，输出火焰图输入与热点函数排行')
+    parser.add_argument('--out-dir', default=os.path.join(
+        os.path.dirname(os.environ.get('GENE2PDB_CACHE_DIR', '.gene2pdb_cache/arrays')), 'profiles'),
+        help='剖析结果目录')
+    parser.add_argument('--interval-ms', type=float, default=5.0, help='采样间隔（毫秒）')
+    parser.add_argument('--top', type=int, default=30, help='热点函数排行的条数')
+    parser.add_argument('script', help='要运行的脚本，如 run_analysis.py')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='脚本参数')
+    args = parser.parse_args()
+
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    with profiled(args.out_dir, interval=args.interval_ms / 1000, top_n=args.top,
+                  command=' '.join(sys.argv)) as (trace_id, result):
+        exit_code = 0
+        try:
+            runpy.run_path(args.script, run_name='__main__')
+        except SystemExit as e:
+            exit_code = e.code
+
+    print(f"🔬 剖析完成: {result['samples']} 个样本，{result['duration_s']}s → "
+          f"{os.path.join(args.out_dir, trace_id)}.collapsed / .json", file=sys.stderr)
+    for item in result['top'][:10]:
+        print(f"   {item['self_pct']:5.1f}% self {item['total_pct']:5.1f}% total  {item['function']}", file=sys.stderr)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# 文件：quick_jobs.py
+# 有时间预算的快速分析：各阶段在线程池中尽早并发执行，到期时返回已完成的部分，其余部分凭续取令牌稍后获取
+import base64
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def is_pdb_id(input_term):
+    """4 位字母数字视为 PDB ID（与 quick_analysis 的判断一致）"""
+    return len(input_term) == 4 and input_term.isalnum()
+
+
+def make_token(input_term):
+    """续取令牌：任务ID + 输入；多 worker 部署时落到其他进程也能据此重新发起"""
+    raw = json.dumps({'job': uuid.uuid4().hex[:16], 'input': input_term}, ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def parse_token(token):
+    """令牌 → 输入；无法解析时返回None"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        input_term = json.loads(raw).get('input')
+    except (ValueError, AttributeError, TypeError):
+        return None
+    return input_term if isinstance(input_term, str) and input_term else None
+
+
+class QuickJob:
+    """一次快速分析的各阶段结果；pending 为尚未完成的阶段"""
+
+    def __init__(self, token, input_term, sections, **values):
+        self.token = token
+        self.input_term = input_term
+        self.values = dict(values, **{section: None for section in sections})
+        self.pending = set(sections)
+        self.started_at = time.time()
+        self.finished_at = None
+        self._condition = threading.Condition()
+
+    def set(self, section, value):
+        with self._condition:
+            self.values[section] = value
+            self.pending.discard(section)
+            if not self.pending:
+                self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def wait(self, timeout):
+        """最多等待 timeout 秒（None 表示一直等到完成）"""
+        with self._condition:
+            self._condition.wait_for(lambda: not self.pending, timeout)
+
+    def snapshot(self):
+        with self._condition:
+            return dict(self.values), sorted(self.pending)
+
+
+class QuickAnalysisJobs:
+    """
+    快速分析任务表：基因 → 结构映射完成后，信息与结构分析并发执行
+    各阶段以回调衔接，不在线程池内阻塞等待；完成的任务保留 ttl 秒供续取
+    """
+
+    def __init__(self, analyzer, max_workers=4, ttl=600, max_jobs=1000):
+        self.analyzer = analyzer
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quick')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'started': 0, 'partial': 0, 'resumed': 0, 'restarted': 0}
+
+    def start(self, input_term, token=None):
+        """发起任务并立即返回（token 用于按续取令牌重新发起）"""
+        token = token or make_token(input_term)
+        if is_pdb_id(input_term):
+            job = QuickJob(token, input_term, ('info', 'analysis'), type='pdb_id', pdb_ids=[input_term])
+            self._register(job)
+            self._run_structure(job, input_term)
+        else:
+            job = QuickJob(token, input_term, ('pdb_ids', 'info', 'analysis'), type='gene', gene_name=input_term)
+            self._register(job)
+            self._submit(job, 'pdb_ids',
+                         lambda: self.analyzer.gene_to_structures(input_term, strategy='coverage'),
+                         then=self._on_mapped)
+        return job
+
+    def resume(self, token):
+        """按令牌取回任务；本进程中不存在（已过期或在其他 worker 上发起）时按令牌中的输入重新发起"""
+        self._purge()
+        with self._lock:
+            job = self._jobs.get(token)
+        if job is not None:
+            self.stats['resumed'] += 1
+            return job
+        input_term = parse_token(token)
+        if input_term is None:
+            return None
+        self.stats['restarted'] += 1
+        return self.start(input_term, token=token)
+
+    def collect(self, job, timeout):
+        """等待至多 timeout 秒，返回已完成的部分；未完成的阶段列在 pending 中并附带续取令牌"""
+        job.wait(timeout)
+        values, pending = job.snapshot()
+        if pending:
+            self.stats['partial'] += 1
+        values.update(pending=pending, complete=not pending, continuation_token=job.token if pending else None,
+                      elapsed_ms=round((time.time() - job.started_at) * 1000))
+        return values
+
+    def status(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.finished_at is None)
+            return dict(self.stats, jobs=len(self._jobs), running=running)
+
+    def _register(self, job):
+        self._purge()
+        with self._lock:
+            self._jobs[job.token] = job
+            self.stats['started'] += 1
+
+    def _purge(self):
+        """丢弃完成超过 ttl 秒的任务；任务数超出上限时从最早的已完成任务开始丢弃"""
+        now = time.time()
+        with self._lock:
+            for token, job in list(self._jobs.items()):
+                if job.finished_at is not None and (now - job.finished_at > self.ttl
+                                                    or len(self._jobs) > self.max_jobs):
+                    del self._jobs[token]
+
+    def _submit(self, job, section, compute, then=None):
+        def run():
+            try:
+                value = compute()
+            except Exception as e:
+                value = {'error': str(e)}
+            if then is not None:
+                then(job, value)
+            job.set(section, value)
+
+        self._executor.submit(run)
+
+    def _on_mapped(self, job, pdb_ids):
+        """基因映射完成：对第一个结构并发获取信息与分析；没有结构时两者为空"""
+        if isinstance(pdb_ids, list) and pdb_ids:
+            self._run_structure(job, pdb_ids[0])
+        else:
+            job.set('info', None)
+            job.set('analysis', None)
+
+    def _run_structure(self, job, pdb_id):
+        self._submit(job, 'info', lambda: self.analyzer.fetch_pdb_info(pdb_id))
+        self._submit(job, 'analysis', lambda: self.analyzer.analyze_structure(pdb_id))
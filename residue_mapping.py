@@ -0,0 +1,183 @@
+# 文件：residue_mapping.py
+# 残基级 UniProt ↔ PDB 编号映射：每条链存为紧凑整数数组，并持久化到本地缓存
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from alignment import best_alignment
+
+
+class ChainResidueMap:
+    """一条链的编号映射；下标为该链已观测标准残基的顺序（与 _chain_residues 一致）"""
+
+    def __init__(self, chain_id, resseq, icode, sequence, uniprot, uniprot_length, source):
+        self.chain_id = chain_id
+        self.resseq = np.asarray(resseq, dtype=np.int32)     # 作者编号
+        self.icode = np.asarray(icode, dtype='U1')           # 插入码
+        self.sequence = sequence                             # 已观测残基的单字母序列
+        self.uniprot = np.asarray(uniprot, dtype=np.int32)   # 对应的UniProt位置（1-based，-1为未映射）
+        self.uniprot_length = int(uniprot_length)
+        self.source = source                                 # 'sifts' 或 'alignment'
+
+        # UniProt位置 → 残基下标（O(1) 查询）
+        self.uniprot_to_index = np.full(self.uniprot_length + 1, -1, dtype=np.int32)
+        mapped = np.nonzero((self.uniprot > 0) & (self.uniprot <= self.uniprot_length))[0]
+        self.uniprot_to_index[self.uniprot[mapped]] = mapped
+        # 作者编号 → 残基下标
+        self._pdb_to_index = {(int(r), str(i).strip()): k for k, (r, i) in enumerate(zip(self.resseq, self.icode))}
+
+    def to_pdb(self, uniprot_pos):
+        """UniProt位置 → (作者编号, 插入码, 单字母残基)；未覆盖时返回None"""
+        if not 0 < uniprot_pos <= self.uniprot_length:
+            return None
+        k = self.uniprot_to_index[uniprot_pos]
+        if k < 0:
+            return None
+        return int(self.resseq[k]), str(self.icode[k]), self.sequence[k]
+
+    def to_uniprot(self, resseq, icode=''):
+        """作者编号 → UniProt位置；未映射时返回None"""
+        k = self._pdb_to_index.get((int(resseq), icode.strip()))
+        if k is None or self.uniprot[k] < 0:
+            return None
+        return int(self.uniprot[k])
+
+    def uniprot_mask(self, start, end):
+        """已观测残基中位于 UniProt [start, end] 区间的掩码"""
+        return (self.uniprot >= start) & (self.uniprot <= end)
+
+    def summary(self):
+        mapped = self.uniprot[self.uniprot > 0]
+        return {
+            'source': self.source,
+            'observed_residues': len(self.resseq),
+            'mapped_residues': int(len(mapped)),
+            'uniprot_start': int(mapped.min()) if len(mapped) else None,
+            'uniprot_end': int(mapped.max()) if len(mapped) else None,
+        }
+
+    def to_dict(self):
+        """完整映射数组（可JSON序列化）"""
+        return dict(self.summary(), resseq=self.resseq.tolist(),
+                    icode=[str(i).strip() for i in self.icode], uniprot=self.uniprot.tolist())
+
+
+def map_from_sifts(chain_id, resseq, icode, sequence, segments, uniprot_length):
+    """
+    用SIFTS区段构建映射；作者编号在区段内必须是连续线性的，否则返回None（改用比对）
+    segments: PDBe mappings/uniprot 中该链的 mapping 列表
+    """
+    uniprot = np.full(len(resseq), -1, dtype=np.int32)
+    blank_icode = np.char.strip(np.asarray(icode, dtype='U1')) == ''
+    for segment in segments:
+        start = segment.get('start', {}).get('author_residue_number')
+        end = segment.get('end', {}).get('author_residue_number')
+        unp_start, unp_end = segment.get('unp_start'), segment.get('unp_end')
+        if None in (start, end, unp_start, unp_end) or end - start != unp_end - unp_start:
+            return None
+        in_segment = blank_icode & (resseq >= start) & (resseq <= end)
+        uniprot[in_segment] = unp_start + (resseq[in_segment] - start)
+    return ChainResidueMap(chain_id, resseq, icode, sequence, uniprot, uniprot_length, 'sifts')
+
+
+def map_from_alignment(chain_id, resseq, icode, sequence, uniprot_seq):
+    """用已观测序列与UniProt序列的全局比对坐标块构建映射"""
+    uniprot = np.full(len(resseq), -1, dtype=np.int32)
+    aligned_uniprot, aligned_pdb = best_alignment(uniprot_seq, sequence).aligned
+    for (us, ue), (ps, pe) in zip(aligned_uniprot, aligned_pdb):
+        uniprot[ps:pe] = np.arange(us, ue, dtype=np.int32) + 1
+    return ChainResidueMap(chain_id, resseq, icode, sequence, uniprot, len(uniprot_seq), 'alignment')
+
+
+class ResidueMapIndex:
+    """按 (PDB ID, UniProt登录号) 缓存链映射：进程内字典 + 本地 .npz 文件"""
+
+    def __init__(self, cache_dir='.gene2pdb_cache/residue_maps'):
+        self.cache_dir = cache_dir
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def _path(self, pdb_id, uniprot_id):
+        return os.path.join(self.cache_dir, f"{pdb_id.lower()}_{uniprot_id.upper()}.npz")
+
+    def get(self, pdb_id, uniprot_id):
+        """返回 {chain_id: ChainResidueMap}；未缓存时返回None"""
+        key = (pdb_id.lower(), uniprot_id.upper())
+        path = self._path(pdb_id, uniprot_id)
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except OSError:
+            stamp = None
+        with self._lock:
+            cached = self._maps.get(key)
+            # 内存中的映射只在文件未被失效/重写（其他进程同步修订）时有效；未能落盘的映射直接使用
+            if cached is not None and (cached[1] is None or cached[1] == stamp):
+                return cached[0]
+        if stamp is None:
+            return None
+        try:
+            data = np.load(path)
+            chain_maps = {}
+            for chain_id in data['chains']:
+                chain_id = str(chain_id)
+                prefix = f"{chain_id}__"
+                chain_maps[chain_id] = ChainResidueMap(
+                    chain_id, data[prefix + 'resseq'], data[prefix + 'icode'],
+                    ''.join(data[prefix + 'sequence']), data[prefix + 'uniprot'],
+                    int(data[prefix + 'uniprot_length']), str(data[prefix + 'source']))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  读取残基映射缓存失败: {e}")
+            return None
+        with self._lock:
+            self._maps[key] = (chain_maps, stamp)
+        return chain_maps
+
+    def put(self, pdb_id, uniprot_id, chain_maps):
+        """写入缓存"""
+        arrays = {'chains': np.array(list(chain_maps), dtype='U4')}
+        for chain_id, m in chain_maps.items():
+            prefix = f"{chain_id}__"
+            arrays[prefix + 'resseq'] = m.resseq
+            arrays[prefix + 'icode'] = m.icode
+            arrays[prefix + 'sequence'] = np.array(list(m.sequence), dtype='U1')
+            arrays[prefix + 'uniprot'] = m.uniprot
+            arrays[prefix + 'uniprot_length'] = np.int32(m.uniprot_length)
+            arrays[prefix + 'source'] = np.array(m.source)
+        stamp = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # 每次写入使用独立的临时文件，多个进程/线程同时构建同一映射时不会写到同一个文件里
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.npz')
+            try:
+                with os.fdopen(fd, 'wb') as handle:
+                    np.savez(handle, **arrays)
+                os.replace(tmp_path, self._path(pdb_id, uniprot_id))
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+            stamp = os.stat(self._path(pdb_id, uniprot_id)).st_mtime_ns
+        except OSError as e:
+            print(f"⚠️  写入残基映射缓存失败: {e}")
+        with self._lock:
+            self._maps[(pdb_id.lower(), uniprot_id.upper())] = (chain_maps, stamp)
+
+    def keys_for(self, pdb_id):
+        """某个结构已缓存映射的 UniProt 登录号"""
+        prefix = pdb_id.lower() + '_'
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [name[len(prefix):-len('.npz')] for name in os.listdir(self.cache_dir)
+                if name.startswith(prefix) and name.endswith('.npz') and not name.endswith('.tmp.npz')]
+
+    def invalidate(self, pdb_id):
+        """删除某个结构的全部映射（结构更新后调用）"""
+        prefix = pdb_id.lower() + '_'
+        with self._lock:
+            for key in [k for k in self._maps if k[0] == pdb_id.lower()]:
+                del self._maps[key]
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,102 @@
+# 文件：residue_properties.py
+# 残基编码：每个残基一个 uint8 编码，属性为按编码索引的数组，整条链的统计用 bincount / 花式索引完成
+import numpy as np
+
+# 氨基酸属性常量（唯一数据源，下面的属性数组和分类都由它生成）
+AMINO_ACID_PROPERTIES = {
+    'A': {'name': 'Alanine', 'charge': 0, 'hydrophobic': True, 'volume': 88.6, 'polar': False, 'aromatic': False},
+    'C': {'name': 'Cysteine', 'charge': 0, 'hydrophobic': True, 'volume': 108.5, 'polar': False, 'aromatic': False},
+    'D': {'name': 'Aspartic acid', 'charge': -1, 'hydrophobic': False, 'volume': 111.1, 'polar': True, 'aromatic': False},
+    'E': {'name': 'Glutamic acid', 'charge': -1, 'hydrophobic': False, 'volume': 138.4, 'polar': True, 'aromatic': False},
+    'F': {'name': 'Phenylalanine', 'charge': 0, 'hydrophobic': True, 'volume': 189.9, 'polar': False, 'aromatic': True},
+    'G': {'name': 'Glycine', 'charge': 0, 'hydrophobic': True, 'volume': 60.1, 'polar': False, 'aromatic': False},
+    'H': {'name': 'Histidine', 'charge': 0.5, 'hydrophobic': False, 'volume': 153.2, 'polar': True, 'aromatic': False},
+    'I': {'name': 'Isoleucine', 'charge': 0, 'hydrophobic': True, 'volume': 166.7, 'polar': False, 'aromatic': False},
+    'K': {'name': 'Lysine', 'charge': 1, 'hydrophobic': False, 'volume': 168.6, 'polar': True, 'aromatic': False},
+    'L': {'name': 'Leucine', 'charge': 0, 'hydrophobic': True, 'volume': 166.7, 'polar': False, 'aromatic': False},
+    'M': {'name': 'Methionine', 'charge': 0, 'hydrophobic': True, 'volume': 162.9, 'polar': False, 'aromatic': False},
+    'N': {'name': 'Asparagine', 'charge': 0, 'hydrophobic': False, 'volume': 114.1, 'polar': True, 'aromatic': False},
+    'P': {'name': 'Proline', 'charge': 0, 'hydrophobic': True, 'volume': 112.7, 'polar': False, 'aromatic': False},
+    'Q': {'name': 'Glutamine', 'charge': 0, 'hydrophobic': False, 'volume': 143.8, 'polar': True, 'aromatic': False},
+    'R': {'name': 'Arginine', 'charge': 1, 'hydrophobic': False, 'volume': 173.4, 'polar': True, 'aromatic': False},
+    'S': {'name': 'Serine', 'charge': 0, 'hydrophobic': False, 'volume': 89.0, 'polar': True, 'aromatic': False},
+    'T': {'name': 'Threonine', 'charge': 0, 'hydrophobic': False, 'volume': 116.1, 'polar': True, 'aromatic': False},
+    'V': {'name': 'Valine', 'charge': 0, 'hydrophobic': True, 'volume': 140.0, 'polar': False, 'aromatic': False},
+    'W': {'name': 'Tryptophan', 'charge': 0, 'hydrophobic': True, 'volume': 227.8, 'polar': False, 'aromatic': True},
+    'Y': {'name': 'Tyrosine', 'charge': 0, 'hydrophobic': False, 'volume': 193.6, 'polar': True, 'aromatic': True},
+}
+
+# 三字母到单字母氨基酸转换
+THREE_TO_ONE = {
+    'ALA': 'A', 'CYS': 'C', 'ASP': 'D', 'GLU': 'E', 'PHE': 'F',
+    'GLY': 'G', 'HIS': 'H', 'ILE': 'I', 'LYS': 'K', 'LEU': 'L',
+    'MET': 'M', 'ASN': 'N', 'PRO': 'P', 'GLN': 'Q', 'ARG': 'R',
+    'SER': 'S', 'THR': 'T', 'VAL': 'V', 'TRP': 'W', 'TYR': 'Y'
+}
+
+# 编码 0-19 对应 AMINO_ACIDS 中的标准氨基酸，20 为未知/非标准残基
+AMINO_ACIDS = ''.join(AMINO_ACID_PROPERTIES)
+UNKNOWN = len(AMINO_ACIDS)
+NUM_CODES = UNKNOWN + 1
+AMINO_ACID_LETTERS = np.array(list(AMINO_ACIDS) + ['X'], dtype='U1')
+
+# 按编码索引的属性数组（未知残基：电荷0、体积0、各类标志均为False）
+CHARGE = np.array([p['charge'] for p in AMINO_ACID_PROPERTIES.values()] + [0], dtype=np.float64)
+VOLUME = np.array([p['volume'] for p in AMINO_ACID_PROPERTIES.values()] + [0], dtype=np.float64)
+HYDROPHOBIC = np.array([p['hydrophobic'] for p in AMINO_ACID_PROPERTIES.values()] + [False])
+POLAR = np.array([p['polar'] for p in AMINO_ACID_PROPERTIES.values()] + [False])
+AROMATIC = np.array([p['aromatic'] for p in AMINO_ACID_PROPERTIES.values()] + [False])
+STANDARD = np.arange(NUM_CODES) < UNKNOWN
+
+# 组成分类：每类为一个按编码索引的布尔数组
+CATEGORIES = {
+    'charged_positive': CHARGE > 0,
+    'charged_negative': CHARGE < 0,
+    'hydrophobic': HYDROPHOBIC,
+    'polar_uncharged': POLAR & (CHARGE == 0),
+    'aromatic': AROMATIC,
+}
+
+# ASCII 单字母 → 编码
+_ONE_LETTER_LOOKUP = np.full(256, UNKNOWN, dtype=np.uint8)
+for _code, _letter in enumerate(AMINO_ACIDS):
+    _ONE_LETTER_LOOKUP[ord(_letter)] = _code
+    _ONE_LETTER_LOOKUP[ord(_letter.lower())] = _code
+_THREE_LETTER_CODES = {three: AMINO_ACIDS.index(one) for three, one in THREE_TO_ONE.items()}
+
+
+def encode_sequence(sequence):
+    """单字母序列 → uint8 编码数组"""
+    raw = np.frombuffer(sequence.encode('ascii', errors='replace'), dtype=np.uint8)
+    return _ONE_LETTER_LOOKUP[raw]
+
+
+def encode_resnames(resnames):
+    """三字母残基名数组 → uint8 编码数组（每种残基名只查一次表）"""
+    resnames = np.asarray(resnames)
+    if not len(resnames):
+        return np.zeros(0, dtype=np.uint8)
+    names, inverse = np.unique(resnames, return_inverse=True)
+    table = np.array([_THREE_LETTER_CODES.get(str(name), UNKNOWN) for name in names], dtype=np.uint8)
+    return table[inverse.reshape(-1)]
+
+
+def decode(codes):
+    """编码数组 → 单字母序列（未知残基为 X）"""
+    return ''.join(AMINO_ACID_LETTERS[codes])
+
+
+def code_of(one_letter):
+    """单个氨基酸的编码；非标准氨基酸返回None"""
+    code = AMINO_ACIDS.find(one_letter.upper()) if len(one_letter) == 1 else -1
+    return code if code >= 0 else None
+
+
+def residue_counts(codes):
+    """每种编码的残基数（长度 NUM_CODES）"""
+    return np.bincount(codes, minlength=NUM_CODES)
+
+
+def category_counts(counts):
+    """由 residue_counts 结果得到各分类的残基数"""
+    return {name: int(counts[mask].sum()) for name, mask in CATEGORIES.items()}
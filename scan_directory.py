@@ -0,0 +1,287 @@
+# 文件：scan_directory.py
+# 离线批量扫描：对本地PDB镜像目录中的全部结构运行分析，按分析类型输出 Parquet/Arrow 列式表
+# 用法: python scan_directory.py /data/pdb/mirror -o scan_output --workers 16
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Pool, util
+
+ANALYSES = ('structure', 'advanced', 'composition')
+PDB_FILE_PATTERN = re.compile(r'^(?:pdb)?([0-9][a-z0-9]{3})\.(?:ent|pdb)(?:\.gz)?$', re.IGNORECASE)
+
+# worker 进程内的全局状态（由 _init_worker 设置）
+_worker_analyzer = None
+_worker_tmp_dir = None
+
+
+def find_pdb_files(input_dir):
+    """递归查找镜像目录中的PDB文件（支持 pdbXXXX.ent[.gz] 与 XXXX.pdb[.gz]），返回排序后的路径列表"""
+    files = []
+    for root, _, names in os.walk(input_dir):
+        for name in names:
+            if PDB_FILE_PATTERN.match(name):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+
+def pdb_id_from_path(path):
+    """从文件名解析PDB ID"""
+    match = PDB_FILE_PATTERN.match(os.path.basename(path))
+    return match.group(1).lower() if match else None
+
+
+# ==================== 结果展平为列式行 ====================
+def structure_rows(result):
+    """analyze_structure 结果 → 每个结构一行"""
+    ss = result.get('secondary_structure') or {}
+
+    def number(value):
+        return value if isinstance(value, (int, float)) else None
+
+    return [{
+        'pdb_id': result['pdb_id'],
+        'num_chains': result['num_chains'],
+        'num_residues': result['num_residues'],
+        'num_atoms': result['num_atoms'],
+        'helix': number(ss.get('helix')),
+        'beta_sheet': number(ss.get('beta_sheet')),
+        'coil': number(ss.get('coil')),
+        'helix_pct': number(ss.get('helix_pct')),
+        'beta_pct': number(ss.get('beta_pct')),
+        'coil_pct': number(ss.get('coil_pct')),
+        'ss_source': ss.get('source'),
+    }]
+
+
+def advanced_rows(result):
+    """analyze_advanced_structure 结果 → 每条链一行（结构级统计随行重复）"""
+    hbonds = result.get('hydrogen_bonds') or {}
+    backbone = hbonds.get('backbone_hbonds')
+    sasa = result.get('sasa_per_chain') or {}
+    hydro = result.get('hydrophobicity_per_chain') or {}
+    rows = []
+    for chain_id in sorted(set(sasa) | set(hydro)):
+        if chain_id == 'error':
+            continue
+        chain_hydro = hydro.get(chain_id, {})
+        rows.append({
+            'pdb_id': result['pdb_id'],
+            'chain_id': chain_id,
+            'disulfide_count': result['disulfide_bonds']['count'],
+            'salt_bridge_count': result['salt_bridges']['count'],
+            'backbone_hbonds': backbone if isinstance(backbone, int) else None,
+            'sasa': sasa.get(chain_id),
+            'hydrophobic_count': chain_hydro.get('hydrophobic_count'),
+            'hydrophilic_count': chain_hydro.get('hydrophilic_count'),
+            'hydrophobic_ratio': chain_hydro.get('hydrophobic_ratio'),
+            'total_residues': chain_hydro.get('total_residues'),
+        })
+    return rows
+
+
+def composition_rows(result):
+    """analyze_sequence_composition 结果 → 每条链一行，20种氨基酸计数各占一列"""
+    rows = []
+    for chain_id, chain in result.get('chains', {}).items():
+        row = {'pdb_id': result['pdb_id'], 'chain_id': chain_id,
+               'length': chain['length'], 'sequence': chain['sequence']}
+        row.update({f'count_{aa}': count for aa, count in chain['amino_acid_counts'].items()})
+        row.update({k: v for k, v in chain['category_statistics'].items() if not k.endswith('_pct')})
+        rows.append(row)
+    return rows
+
+
+ROW_BUILDERS = {'structure': structure_rows, 'advanced': advanced_rows, 'composition': composition_rows}
+
+
+def table_schema(name):
+    """各分析表的固定列类型（保证不同分片可以合并读取，即使某分片整列为空）"""
+    import pyarrow as pa
+    from gget_pdb import AMINO_ACID_PROPERTIES
+
+    if name == 'structure':
+        columns = [('pdb_id', pa.string()), ('num_chains', pa.int32()), ('num_residues', pa.int32()),
+                   ('num_atoms', pa.int64()), ('helix', pa.int32()), ('beta_sheet', pa.int32()),
+                   ('coil', pa.int32()), ('helix_pct', pa.float64()), ('beta_pct', pa.float64()),
+                   ('coil_pct', pa.float64()), ('ss_source', pa.string())]
+    elif name == 'advanced':
+        columns = [('pdb_id', pa.string()), ('chain_id', pa.string()), ('disulfide_count', pa.int32()),
+                   ('salt_bridge_count', pa.int32()), ('backbone_hbonds', pa.int32()), ('sasa', pa.float64()),
+                   ('hydrophobic_count', pa.int32()), ('hydrophilic_count', pa.int32()),
+                   ('hydrophobic_ratio', pa.float64()), ('total_residues', pa.int32())]
+    else:
+        columns = [('pdb_id', pa.string()), ('chain_id', pa.string()), ('length', pa.int32()),
+                   ('sequence', pa.string())]
+        columns += [(f'count_{aa}', pa.int32()) for aa in AMINO_ACID_PROPERTIES]
+        columns += [(c, pa.int32()) for c in ('charged_positive', 'charged_negative', 'hydrophobic',
+                                               'polar_uncharged', 'aromatic')]
+    return pa.schema(columns)
+
+
+# ==================== worker ====================
+def _init_worker(memory_limit_mb, verbose):
+    """worker 初始化：限制地址空间、准备解压目录与分析器实例"""
+    global _worker_analyzer, _worker_tmp_dir
+    if memory_limit_mb:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 ** 2
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"⚠️  无法设置内存上限: {e}", file=sys.stderr)
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+    from gget_pdb import GGETPDB
+    _worker_tmp_dir = tempfile.mkdtemp(prefix='gene2pdb-scan-')
+    util.Finalize(None, shutil.rmtree, args=(_worker_tmp_dir, True), exitpriority=10)
+    _worker_analyzer = GGETPDB(pdb_dir=_worker_tmp_dir, use_remote_annotations=False)
+
+
+def _stage_file(path, pdb_id):
+    """把镜像文件放到分析器的PDB目录（.gz 解压，其余建软链接），返回暂存路径"""
+    staged = os.path.join(_worker_tmp_dir, f'pdb{pdb_id}.ent')
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as src, open(staged, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+    else:
+        os.symlink(os.path.abspath(path), staged)
+    return staged
+
+
+def _scan_batch(task):
+    """分析一个分片中的所有文件，返回 (分片号, 文件列表, {分析类型: 行列表}, 错误列表)"""
+    batch_index, paths, analyses = task
+    runners = {
+        'structure': _worker_analyzer.analyze_structure,
+        'advanced': _worker_analyzer.analyze_advanced_structure,
+        'composition': _worker_analyzer.analyze_sequence_composition,
+    }
+    rows = {name: [] for name in analyses}
+    errors = []
+    for path in paths:
+        pdb_id = pdb_id_from_path(path)
+        staged = None
+        try:
+            staged = _stage_file(path, pdb_id)
+            # 同一文件的多个分析共用一次解析；作用域按文件结束，解析结果不在分片内累积
+            with _worker_analyzer.parse_scope():
+                for name in analyses:
+                    result = runners[name](pdb_id)
+                    if result and 'error' not in result:
+                        rows[name].extend(ROW_BUILDERS[name](result))
+        except MemoryError:
+            errors.append({'path': path, 'error': 'MemoryError: 超出单个 worker 的内存上限'})
+        except Exception as e:
+            errors.append({'path': path, 'error': f'{type(e).__name__}: {e}'})
+        finally:
+            if staged and os.path.lexists(staged):
+                os.remove(staged)
+    return batch_index, paths, rows, errors
+
+
+# ==================== 输出与检查点 ====================
+class ScanWriter:
+    """按分片写出列式文件，并在分片落盘后追加检查点"""
+
+    def __init__(self, output_dir, fmt='parquet'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("❌ 需要 pyarrow 才能写出 Parquet/Arrow 表，请运行: pip install pyarrow")
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.checkpoint_path = os.path.join(output_dir, 'checkpoint.txt')
+        self.errors_path = os.path.join(output_dir, 'errors.jsonl')
+        os.makedirs(output_dir, exist_ok=True)
+
+    def completed(self):
+        """已完成（或已记录失败）的文件"""
+        try:
+            with open(self.checkpoint_path) as handle:
+                return {line.rstrip('\n') for line in handle if line.strip()}
+        except OSError:
+            return set()
+
+    def write_batch(self, batch_index, paths, rows, errors):
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
+        for name, table_rows in rows.items():
+            if not table_rows:
+                continue
+            table_dir = os.path.join(self.output_dir, name)
+            os.makedirs(table_dir, exist_ok=True)
+            table = pa.Table.from_pylist(table_rows, schema=table_schema(name))
+            # 每个分片一个文件，文件名含时间戳避免断点续跑时覆盖
+            stem = os.path.join(table_dir, f'part-{batch_index:06d}-{int(time.time() * 1000)}')
+            if self.fmt == 'parquet':
+                pq.write_table(table, stem + '.parquet')
+            else:
+                feather.write_feather(table, stem + '.arrow')
+
+        if errors:
+            with open(self.errors_path, 'a') as handle:
+                for error in errors:
+                    handle.write(json.dumps(error, ensure_ascii=False) + '\n')
+
+        # 数据落盘之后才写检查点，中断时最多重算一个分片
+        with open(self.checkpoint_path, 'a') as handle:
+            handle.write(''.join(path + '\n' for path in paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线批量扫描本地PDB镜像目录')
+    parser.add_argument('input_dir', help='本地PDB镜像目录（递归查找 pdbXXXX.ent[.gz] / XXXX.pdb[.gz]）')
+    parser.add_argument('-o', '--output', default='scan_output', help='输出目录')
+    parser.add_argument('--analyses', default=','.join(ANALYSES),
+                        help=f'要运行的分析，逗号分隔（可选: {",".join(ANALYSES)}）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker 进程数')
+    parser.add_argument('--batch-size', type=int, default=50, help='每个分片的文件数')
+    parser.add_argument('--memory-limit-mb', type=int, default=4096, help='单个 worker 的内存上限（0 不限制）')
+    parser.add_argument('--max-tasks-per-child', type=int, default=20, help='每个 worker 处理多少个分片后重启，释放内存')
+    parser.add_argument('--format', choices=('parquet', 'arrow'), default='parquet', help='输出格式')
+    parser.add_argument('--verbose', action='store_true', help='显示每个结构的分析日志')
+    args = parser.parse_args()
+
+    analyses = [a.strip() for a in args.analyses.split(',') if a.strip()]
+    unknown = set(analyses) - set(ANALYSES)
+    if unknown:
+        parser.error(f"未知的分析类型: {', '.join(sorted(unknown))}")
+
+    writer = ScanWriter(args.output, args.format)
+    all_files = find_pdb_files(args.input_dir)
+    done = writer.completed()
+    pending = [path for path in all_files if path not in done]
+    print(f"📂 共 {len(all_files)} 个结构文件，已完成 {len(all_files) - len(pending)} 个，待处理 {len(pending)} 个")
+    if not pending:
+        return
+
+    batches = [(i, pending[start:start + args.batch_size], analyses)
+               for i, start in enumerate(range(0, len(pending), args.batch_size))]
+
+    started = time.time()
+    processed = 0
+    failed = 0
+    with Pool(processes=args.workers, initializer=_init_worker,
+              initargs=(args.memory_limit_mb, args.verbose),
+              maxtasksperchild=args.max_tasks_per_child) as pool:
+        for batch_index, paths, rows, errors in pool.imap_unordered(_scan_batch, batches):
+            writer.write_batch(batch_index, paths, rows, errors)
+            processed += len(paths)
+            failed += len(errors)
+            rate = processed / max(time.time() - started, 1e-6)
+            print(f"✅ {processed}/{len(pending)} 个结构 ({rate:.1f}/s, 失败 {failed})")
+
+    print(f"🎉 扫描完成，结果写入 {args.output}/<分析类型>/")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+# 文件：sequence_index.py
+# 本地序列相似性检索：链序列的 k-mer 倒排索引，增量更新，候选结果再用 PairwiseAligner 精排
+import json
+import os
+import threading
+
+import numpy as np
+from Bio.Align import PairwiseAligner, substitution_matrices
+
+AMINO_ACIDS = 'ACDEFGHIKLMNPQRSTVWY'
+# 字符 → 0..20 编码（非标准氨基酸为20）
+_CODE_TABLE = np.full(256, len(AMINO_ACIDS), dtype=np.int64)
+for _i, _aa in enumerate(AMINO_ACIDS):
+    _CODE_TABLE[ord(_aa)] = _i
+
+
+def kmer_codes(sequence, k):
+    """序列中所有不含非标准氨基酸的 k-mer 的整数编码（去重、排序）"""
+    if len(sequence) < k:
+        return np.zeros(0, dtype=np.int64)
+    residues = _CODE_TABLE[np.frombuffer(sequence.upper().encode(), dtype=np.uint8)]
+    windows = np.lib.stride_tricks.sliding_window_view(residues, k)
+    valid = (windows < len(AMINO_ACIDS)).all(axis=1)
+    base = len(AMINO_ACIDS) ** np.arange(k - 1, -1, -1, dtype=np.int64)
+    return np.unique(windows[valid] @ base)
+
+
+def _make_local_aligner():
+    """候选精排用的局部比对器（BLOSUM62）"""
+    aligner = PairwiseAligner()
+    aligner.mode = 'local'
+    aligner.substitution_matrix = substitution_matrices.load('BLOSUM62')
+    aligner.open_gap_score = -10
+    aligner.extend_gap_score = -0.5
+    return aligner
+
+
+class KmerSequenceIndex:
+    """
+    唯一序列级的 k-mer 倒排索引
+    主体为CSR结构（k-mer → 序列编号）；新增序列先进入小的增量区，超过阈值再合并进主体
+    新增记录追加写入 JSONL 日志，重启或其他进程通过回放日志恢复；合并在检索时按需进行
+    """
+
+    def __init__(self, k=3, log_path='.gene2pdb_cache/sequence_index.jsonl', merge_threshold=256):
+        self.k = k
+        self.log_path = log_path
+        self.merge_threshold = merge_threshold
+        self.n_codes = len(AMINO_ACIDS) ** k
+        self._sequences = []      # 序列编号 → 序列
+        self._sequence_ids = {}   # 序列 → 序列编号
+        self._members = []        # 序列编号 → [(pdb_id, chain_id)]
+        self._structures = set()  # 已索引的 PDB ID
+        self._codes = []          # 序列编号 → k-mer 编码
+        self._offsets = np.zeros(self.n_codes + 1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._base_count = 0      # CSR 主体覆盖的序列数，其余在增量区
+        self._log_offset = 0
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def __len__(self):
+        return sum(len(m) for m in self._members)
+
+    def __contains__(self, pdb_id):
+        return pdb_id.lower() in self._structures
+
+    # ---------- 增量更新 ----------
+    def _add(self, pdb_id, chain_sequences):
+        pdb_id = pdb_id.lower()
+        if pdb_id in self._structures:
+            return False
+        self._structures.add(pdb_id)
+        for chain_id, sequence in chain_sequences.items():
+            if len(sequence) < self.k:
+                continue
+            seq_id = self._sequence_ids.get(sequence)
+            if seq_id is None:
+                seq_id = len(self._sequences)
+                self._sequence_ids[sequence] = seq_id
+                self._sequences.append(sequence)
+                self._members.append([])
+                self._codes.append(kmer_codes(sequence, self.k))
+            self._members[seq_id].append((pdb_id, chain_id))
+        return True
+
+    def add_structure(self, pdb_id, chain_sequences):
+        """加入一个结构的链序列 {chain_id: sequence}；已索引时跳过"""
+        with self._lock:
+            self.refresh()
+            if not self._add(pdb_id, chain_sequences):
+                return False
+            if self.log_path:
+                try:
+                    os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+                    with open(self.log_path, 'a') as handle:
+                        handle.write(json.dumps({'pdb_id': pdb_id.lower(), 'chains': chain_sequences}) + '\n')
+                    self._log_offset = os.path.getsize(self.log_path)
+                except OSError as e:
+                    print(f"⚠️  写入序列索引日志失败: {e}")
+            return True
+
+    def refresh(self):
+        """回放日志中其他进程新增的记录"""
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        with self._lock:
+            with open(self.log_path) as handle:
+                handle.seek(self._log_offset)
+                for line in handle:
+                    if not line.endswith('\n'):
+                        break  # 其他进程尚未写完
+                    self._log_offset += len(line.encode())
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._add(record['pdb_id'], record['chains'])
+
+    def _merge(self):
+        """把增量区合并进CSR主体"""
+        lengths = np.array([len(c) for c in self._codes], dtype=np.int64)
+        all_codes = np.concatenate(self._codes) if self._codes else np.zeros(0, dtype=np.int64)
+        seq_ids = np.repeat(np.arange(len(self._codes), dtype=np.int32), lengths)
+        order = np.argsort(all_codes, kind='stable')
+        self._postings = seq_ids[order]
+        self._offsets = np.zeros(self.n_codes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(all_codes, minlength=self.n_codes), out=self._offsets[1:])
+        self._base_count = len(self._codes)
+
+    # ---------- 检索 ----------
+    def shared_kmer_counts(self, query_codes):
+        """每条已索引序列与查询共享的 k-mer 数"""
+        counts = np.zeros(len(self._sequences), dtype=np.int32)
+        if len(self._postings):
+            starts, ends = self._offsets[query_codes], self._offsets[query_codes + 1]
+            hit_lengths = ends - starts
+            if hit_lengths.sum():
+                # 把各 k-mer 的倒排区间拼成一个下标数组后一次性计数
+                positions = np.repeat(ends - np.cumsum(hit_lengths), hit_lengths) + np.arange(hit_lengths.sum())
+                counts[:self._base_count] = np.bincount(self._postings[positions], minlength=self._base_count)
+        for seq_id in range(self._base_count, len(self._sequences)):
+            counts[seq_id] = len(np.intersect1d(self._codes[seq_id], query_codes, assume_unique=True))
+        return counts
+
+    def search(self, sequence, top_n=10, candidates=20, min_shared=1):
+        """按共享 k-mer 数选出候选，再用局部比对精排"""
+        sequence = ''.join(sequence.split()).upper()
+        query_codes = kmer_codes(sequence, self.k)
+        with self._lock:
+            self.refresh()
+            if len(self._sequences) - self._base_count > self.merge_threshold:
+                self._merge()
+            counts = self.shared_kmer_counts(query_codes)
+            n_candidates = min(candidates, int(np.count_nonzero(counts >= max(min_shared, 1))))
+            if n_candidates == 0:
+                return []
+            top = np.argpartition(-counts, n_candidates - 1)[:n_candidates]
+            top = [int(i) for i in top]
+            shortlist = [(i, self._sequences[i], int(counts[i]), list(self._members[i])) for i in top]
+
+        # 先只算比对得分（无回溯）排序，再为前 top_n 个计算一致性与覆盖率
+        aligner = _make_local_aligner()
+        scored = sorted(((aligner.score(sequence, target_seq), seq_id, target_seq, shared, members)
+                         for seq_id, target_seq, shared, members in shortlist), key=lambda x: x[0], reverse=True)
+        query = np.frombuffer(sequence.encode(), dtype=np.uint8)
+        hits = []
+        for score, seq_id, target_seq, shared, members in scored[:top_n]:
+            alignment = aligner.align(sequence, target_seq)[0]
+            target = np.frombuffer(target_seq.encode(), dtype=np.uint8)
+            matches = aligned_query = 0
+            for (qs, qe), (ts, te) in zip(*alignment.aligned):
+                matches += int(np.count_nonzero(query[qs:qe] == target[ts:te]))
+                aligned_query += int(qe - qs)
+            hits.append({
+                'sequence_length': len(target_seq),
+                'shared_kmers': shared,
+                'alignment_score': float(score),
+                'identity_percent': round(matches / aligned_query * 100, 2) if aligned_query else 0,
+                'query_coverage_percent': round(aligned_query / len(sequence) * 100, 2) if sequence else 0,
+                'structures': [{'pdb_id': p, 'chain': c} for p, c in members],
+            })
+        return hits
+
+    def status(self):
+        return {'k': self.k, 'structures': len(self._structures), 'chains': len(self),
+                'unique_sequences': len(self._sequences), 'pending_merge': len(self._sequences) - self._base_count}
@@ -0,0 +1,123 @@
+# 文件：serialization.py
+# 响应序列化：numpy 感知的JSON编码、按 ?fields= 投影字段、列式（每条链一个数组）响应
+import numpy as np
+
+# 投影时始终保留的顶层字段
+ALWAYS_FIELDS = ('pdb_id', 'error', 'downgraded')
+
+
+def json_default(value):
+    """
+    numpy 标量/数组的JSON序列化
+    float32/float16 按其最短十进制表示输出（2.05 而不是 2.049999952316284）
+    """
+    if isinstance(value, (np.float32, np.float16)):
+        return float(str(value))
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f' and value.dtype.itemsize < 8:
+            return value.astype(str).astype(float).tolist()
+        return value.tolist()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def parse_fields(text):
+    """?fields= 参数 → 字段路径列表（逗号分隔，点号分隔层级，* 匹配任意键）；未指定时返回None"""
+    if not text:
+        return None
+    fields = [f.strip() for f in text.split(',') if f.strip()]
+    return fields or None
+
+
+def _segments_match(a, b):
+    return all(x == y or '*' in (x, y) for x, y in zip(a, b))
+
+
+def wants(fields, path):
+    """
+    是否需要计算 path 对应的部分：未指定 fields、请求了它、它的上级或它的下级时为真
+    如 fields=['chains.*.length'] 时 wants(fields, 'chains.*.amino_acid_counts') 为假
+    """
+    if fields is None:
+        return True
+    path = path.split('.')
+    return any(_segments_match(field.split('.'), path) for field in fields)
+
+
+def _field_tree(fields):
+    """字段路径 → 嵌套字典；空字典表示整个子树"""
+    tree = {}
+    for field in fields:
+        node = tree
+        parts = field.split('.')
+        for i, part in enumerate(parts):
+            if part in node and not node[part]:
+                break  # 已请求整个子树
+            if i == len(parts) - 1:
+                node[part] = {}
+            else:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def _merge_trees(trees):
+    if any(not tree for tree in trees):
+        return {}
+    merged = {}
+    for tree in trees:
+        for key, sub in tree.items():
+            merged[key] = _merge_trees([merged[key], sub]) if key in merged else sub
+    return merged
+
+
+def _apply_tree(value, tree):
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [_apply_tree(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    projected = {}
+    for key, sub in value.items():
+        subtrees = [tree[k] for k in (key, '*') if k in tree]
+        if subtrees:
+            projected[key] = _apply_tree(sub, _merge_trees(subtrees))
+    return projected
+
+
+def project(result, fields):
+    """只保留 fields 指定的字段（列表中的字典逐项投影）；pdb_id/error/downgraded 始终保留"""
+    if fields is None or not isinstance(result, dict):
+        return result
+    projected = _apply_tree(result, _field_tree(fields))
+    for key in ALWAYS_FIELDS:
+        if key in result:
+            projected.setdefault(key, result[key])
+    return projected
+
+
+def _same_keys(rows):
+    return bool(rows) and all(isinstance(row, dict) and row for row in rows) \
+        and all(row.keys() == rows[0].keys() for row in rows)
+
+
+def _columns(rows):
+    return {field: columnar([row[field] for row in rows]) for field in rows[0]}
+
+
+def columnar(value):
+    """
+    列式表示：键集相同的字典的字典（如每条链一个字典）→ {'keys': [链...], 字段: [每条链的值...]}
+    键集相同的字典列表（如二硫键、盐桥列表）→ {字段: [值...]}；逐层递归
+    """
+    if isinstance(value, dict):
+        rows = list(value.values())
+        if _same_keys(rows):
+            return {'keys': list(value), **_columns(rows)}
+        return {key: columnar(sub) for key, sub in value.items()}
+    if isinstance(value, list):
+        if _same_keys(value):
+            return _columns(value)
+        return [columnar(item) for item in value]
+    return value
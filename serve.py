@@ -0,0 +1,117 @@
+# 文件：serve.py
+# 生产模式启动：多 worker 进程，各进程通过 SharedStructureCache 零拷贝共享已解析的结构数组
+# app 在每个 worker 中 fork 之后才导入：数据库连接、后台线程与锁都属于各自的 worker，不从主进程继承
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+# worker 启动后不足该秒数即退出时，延迟重启
+RESPAWN_MIN_SECONDS = 1.0
+
+
+def load_app():
+    """在 worker 进程中导入 app 并启动该 worker 的后台任务"""
+    from app import app, start_worker_services
+    start_worker_services()
+    return app
+
+
+def _spawn_worker(host, port, listener):
+    """fork 一个 worker：导入 app 后在共享的监听 fd 上以多线程方式处理请求"""
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 1
+        try:
+            from werkzeug.serving import make_server
+            make_server(host, port, load_app(), threaded=True, fd=listener.fileno()).serve_forever()
+            code = 0
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve_prefork(host, port, workers):
+    """
+    未安装 gunicorn 时的预派生模式：主进程只监听端口，各 worker 在 fork 后导入 app 并在同一端口上接受连接
+    每个 worker 每个连接一个线程（慢分析、下载、流式响应不会阻塞该 worker 的其他请求）；退出的 worker 会被重新拉起
+    """
+    listener = socket.create_server((host, port), reuse_port=False)
+    listener.set_inheritable(True)
+    children = {_spawn_worker(host, port, listener): time.monotonic() for _ in range(workers)}
+
+    # 主进程收到 SIGTERM/Ctrl-C 时结束全部 worker
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while True:
+            pid, status = os.wait()
+            started = children.pop(pid, None)
+            if started is None:
+                continue
+            print(f"⚠️  worker {pid} 已退出（退出码 {os.waitstatus_to_exitcode(status)}），重新启动")
+            if time.monotonic() - started < RESPAWN_MIN_SECONDS:
+                time.sleep(RESPAWN_MIN_SECONDS)  # 启动即崩溃时不要空转
+            children[_spawn_worker(host, port, listener)] = time.monotonic()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gene2PDB 生产模式服务（多进程）')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='worker 进程数')
+    parser.add_argument('--threads', type=int, default=8, help='每个 worker 的线程数（gunicorn gthread）')
+    parser.add_argument('--timeout', type=int, default=300,
+                        help='gunicorn worker 超时（秒），需覆盖 DSSP/界面分析等长请求')
+    parser.add_argument('--cache-dir', default=os.environ.get('GENE2PDB_CACHE_DIR', '.gene2pdb_cache/arrays'),
+                        help='共享结构缓存目录')
+    parser.add_argument('--cache-max-mb', type=int, default=int(os.environ.get('GENE2PDB_CACHE_MAX_MB', 2048)),
+                        help='共享结构缓存容量（MB）')
+    args = parser.parse_args()
+
+    # 在导入 app 之前设置，所有 worker 使用同一缓存目录；worker 数用于在各进程间平分内存预算
+    os.environ['GENE2PDB_CACHE_DIR'] = args.cache_dir
+    os.environ['GENE2PDB_CACHE_MAX_MB'] = str(args.cache_max_mb)
+    os.environ['GENE2PDB_WORKERS'] = str(args.workers)
+
+    print(f"🚀 PDB分析后端服务（生产模式）: {args.workers} 个 worker, 缓存目录 {args.cache_dir}")
+    try:
+        # 优先使用 gunicorn（预派生 worker 池；不使用 preload，load() 在每个 worker 中调用）
+        from gunicorn.app.base import BaseApplication
+
+        class StandaloneApplication(BaseApplication):
+            def load_config(self):
+                self.cfg.set('bind', f'{args.host}:{args.port}')
+                self.cfg.set('workers', args.workers)
+                # 默认 sync worker 一次只处理一个请求，且 30 秒无响应即被 WORKER TIMEOUT 杀掉
+                self.cfg.set('worker_class', 'gthread')
+                self.cfg.set('threads', args.threads)
+                self.cfg.set('timeout', args.timeout)
+                self.cfg.set('graceful_timeout', args.timeout)
+                self.cfg.set('preload_app', False)
+
+            def load(self):
+                return load_app()
+
+        StandaloneApplication().run()
+    except ImportError:
+        serve_prefork(args.host, args.port, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# 文件：single_flight.py
+# 计算级单飞（single-flight）：同一 (方法, PDB ID, 参数) 的并发调用只执行一次，其余调用等待并共享结果
+import copy
+import functools
+import inspect
+import threading
+import time
+
+
+def single_flight(kind):
+    """
+    GGETPDB 方法装饰器：按 (kind, 各参数) 合并进行中的相同计算（放在 stored_result 之上，存储查询也只做一次）
+    pdb_id 不区分大小写；未配置 single_flight 时直接执行
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.single_flight is None:
+                return method(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            key = (kind,) + tuple((name, _freeze(value.lower() if name == 'pdb_id' and isinstance(value, str)
+                                                 else value))
+                                  for name, value in bound.arguments.items() if name != 'self')
+            return self.single_flight.do(key, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def _freeze(value):
+    """参数 → 可哈希的键"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class _Call:
+    """一次进行中的计算"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.thread = threading.get_ident()
+        self.started = time.perf_counter()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+        self.events = []  # 领头线程计算期间记录的上游过期/降级事件
+
+
+class SingleFlight:
+    """
+    进程内的单飞表：首个调用者执行计算，同时到达的调用者等待其完成后各拿一份结果副本
+    结果不缓存，计算结束即从表中移除（持久化由结果存储/结构缓存负责）
+    events: 按线程记录上游降级事件的对象（UpstreamClient）；等待者会继承领头线程计算期间的事件
+    """
+
+    def __init__(self, events=None):
+        self.events = events
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def do(self, key, compute):
+        """执行 compute 或等待进行中的同键计算；计算抛出的异常同样传给等待者"""
+        kind = key[0]
+        with self._lock:
+            stats = self.stats.setdefault(kind, {'calls': 0, 'executed': 0, 'shared': 0, 'errors': 0,
+                                                 'saved_seconds': 0.0, 'waited_seconds': 0.0})
+            stats['calls'] += 1
+            call = self._calls.get(key)
+            # 同一线程重入同一计算时直接执行，避免等待自己
+            reentrant = call is not None and call.thread == threading.get_ident()
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            if leader or reentrant:
+                stats['executed'] += 1
+            else:
+                call.waiters += 1
+                stats['shared'] += 1
+
+        if reentrant:
+            return compute()
+        if leader:
+            return self._lead(key, call, compute, stats)
+
+        waited_from = time.perf_counter()
+        call.done.wait()
+        with self._lock:
+            stats['waited_seconds'] += time.perf_counter() - waited_from
+        if self.events is not None and call.events:
+            self.events.replay_events(call.events)
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result)
+
+    def _lead(self, key, call, compute, stats):
+        mark = self.events.event_count() if self.events is not None else 0
+        try:
+            result = compute()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            if self.events is not None:
+                call.events = self.events.events_since(mark)
+            with self._lock:
+                self._calls.pop(key, None)
+                duration = time.perf_counter() - call.started
+                if call.error is not None:
+                    stats['errors'] += 1
+                else:
+                    # 每个等待者都省下了一次完整计算
+                    stats['saved_seconds'] += duration * call.waiters
+                waiters = call.waiters
+            if call.error is None and waiters:
+                # 调用方可能修改返回值：等待者从完成时的快照复制
+                call.result = copy.deepcopy(result)
+            call.done.set()
+        return result
+
+    def status(self):
+        with self._lock:
+            kinds = {kind: dict(s, saved_seconds=round(s['saved_seconds'], 3),
+                                waited_seconds=round(s['waited_seconds'], 3)) for kind, s in self.stats.items()}
+            totals = {name: sum(s[name] for s in kinds.values()) for name in ('calls', 'executed', 'shared')}
+            return dict(totals, saved_seconds=round(sum(s['saved_seconds'] for s in kinds.values()), 3),
+                        in_flight=len(self._calls), by_kind=kinds)
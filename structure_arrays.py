@@ -0,0 +1,175 @@
+# 文件：structure_arrays.py
+# 结构的扁平坐标数组表示，以及基于数组的几何工具（包围盒、SASA）
+import math
+
+import numpy as np
+from Bio.PDB.kdtrees import KDTree
+from Bio.PDB.SASA import ATOMIC_RADII
+
+
+class AtomArrays:
+    """每个原子一行的结构数组：坐标 + 链/残基/原子注释"""
+
+    FIELDS = ('coords', 'chain', 'resname', 'resseq', 'icode', 'name', 'element', 'hetero')
+
+    def __init__(self, coords, chain, resname, resseq, icode, name, element, hetero):
+        self.coords = coords      # (N, 3) float32
+        self.chain = chain        # (N,) 链ID
+        self.resname = resname    # (N,) 三字母残基名
+        self.resseq = resseq      # (N,) int32 作者编号
+        self.icode = icode        # (N,) 插入码
+        self.name = name          # (N,) 原子名
+        self.element = element    # (N,) 元素
+        self.hetero = hetero      # (N,) bool，HETATM/水
+
+    @classmethod
+    def from_model(cls, model):
+        """从Bio.PDB的Model构建数组（无序原子取代表构象）"""
+        coords, chain, resname, resseq, icode, name, element, hetero = [], [], [], [], [], [], [], []
+        for ch in model:
+            for residue in ch:
+                hetflag, seq, ins = residue.id
+                for atom in residue:
+                    coords.append(atom.coord)
+                    chain.append(ch.id)
+                    resname.append(residue.get_resname())
+                    resseq.append(seq)
+                    icode.append(ins)
+                    name.append(atom.get_id())
+                    element.append(atom.element)
+                    hetero.append(hetflag != ' ')
+        return cls(
+            np.asarray(coords, dtype=np.float32).reshape(-1, 3),
+            np.asarray(chain, dtype='U4'),
+            np.asarray(resname, dtype='U3'),
+            np.asarray(resseq, dtype=np.int32),
+            np.asarray(icode, dtype='U1'),
+            np.asarray(name, dtype='U4'),
+            np.asarray(element, dtype='U2'),
+            np.asarray(hetero, dtype=bool),
+        )
+
+    def __len__(self):
+        return len(self.coords)
+
+    def select(self, mask):
+        """按布尔掩码或索引取子集"""
+        return AtomArrays(*(getattr(self, f)[mask] for f in self.FIELDS))
+
+    def chain_ids(self):
+        """按出现顺序返回链ID"""
+        _, first = np.unique(self.chain, return_index=True)
+        return [str(c) for c in self.chain[np.sort(first)]]
+
+    def residue_starts(self):
+        """每个残基第一个原子的下标（相邻原子链/编号/插入码变化处即新残基）"""
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        changed = ((self.chain[1:] != self.chain[:-1])
+                   | (self.resseq[1:] != self.resseq[:-1])
+                   | (self.icode[1:] != self.icode[:-1]))
+        return np.concatenate(([0], np.nonzero(changed)[0] + 1))
+
+
+def bounding_box(coords):
+    """返回坐标的轴对齐包围盒 (min, max)"""
+    return coords.min(axis=0), coords.max(axis=0)
+
+
+def boxes_overlap(box1, box2, margin=0.0):
+    """判断两个包围盒在扩展 margin 后是否相交"""
+    lo1, hi1 = box1
+    lo2, hi2 = box2
+    return bool(np.all(lo1 - margin <= hi2) and np.all(lo2 - margin <= hi1))
+
+
+def atom_pairs_within(coords1, coords2, cutoff):
+    """返回两组坐标间距离 <= cutoff 的原子对 (i, j, distance)"""
+    coords1 = np.asarray(coords1, dtype=np.float64)
+    coords2 = np.ascontiguousarray(coords2, dtype=np.float64)
+    if len(coords1) == 0 or len(coords2) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    if len(coords1) * len(coords2) <= 1_000_000:
+        d = np.sqrt(((coords1[:, None, :] - coords2[None, :, :]) ** 2).sum(axis=2))
+        i_idx, j_idx = np.nonzero(d <= cutoff)
+        return i_idx, j_idx, d[i_idx, j_idx]
+
+    # 大规模时使用KD树
+    kdt = KDTree(coords2, 10)
+    i_list, j_list, d_list = [], [], []
+    for i, point in enumerate(coords1):
+        for p in kdt.search(point, cutoff):
+            i_list.append(i)
+            j_list.append(p.index)
+            d_list.append(p.radius)
+    return np.array(i_list, dtype=np.int64), np.array(j_list, dtype=np.int64), np.array(d_list)
+
+
+def atom_pairs_self(coords, cutoff):
+    """返回同一组坐标内距离 <= cutoff 的原子对 (i, j, distance)，i < j"""
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    if len(coords) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    if len(coords) <= 1000:
+        d = np.sqrt(((coords[:, None, :] - coords[None, :, :]) ** 2).sum(axis=2))
+        i_idx, j_idx = np.nonzero(np.triu(d <= cutoff, k=1))
+        return i_idx, j_idx, d[i_idx, j_idx]
+
+    # 大规模时由KD树在C层一次性枚举全部近邻对
+    neighbors = KDTree(coords, 10).neighbor_search(cutoff)
+    if not neighbors:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    pairs = np.array([(n.index1, n.index2) for n in neighbors], dtype=np.int64)
+    dist = np.array([n.radius for n in neighbors])
+    i_idx, j_idx = pairs.min(axis=1), pairs.max(axis=1)
+    return i_idx, j_idx, dist
+
+
+def atomic_radii(elements, radii_dict=None):
+    """按元素查找原子半径（未知元素按碳处理）"""
+    table = radii_dict or ATOMIC_RADII
+    return np.array([table.get(str(e).upper(), table['C']) for e in elements], dtype=np.float64)
+
+
+def _sphere_points(n_points):
+    """黄金螺旋法在单位球面上取点（与 Bio.PDB.SASA.ShrakeRupley 一致）"""
+    k = np.arange(n_points)
+    dz = 2.0 / n_points
+    z = 1 - dz / 2 - k * dz
+    r = np.sqrt(1 - z * z)
+    longitude = k * (math.pi * (3 - 5 ** 0.5))
+    return np.column_stack((np.cos(longitude) * r, np.sin(longitude) * r, z))
+
+
+def shrake_rupley(coords, radii, probe_radius=1.40, n_points=100, indices=None):
+    """
+    基于数组的Shrake-Rupley SASA
+    只计算 indices 指定原子的SASA，其余原子仅作为遮挡参与；返回与 indices 等长的数组
+    """
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    radii = np.asarray(radii, dtype=np.float64) + probe_radius
+    if indices is None:
+        indices = np.arange(len(coords))
+    indices = np.asarray(indices, dtype=np.int64)
+    sasa = np.zeros(len(indices), dtype=np.float64)
+    if len(coords) == 0 or len(indices) == 0:
+        return sasa
+
+    sphere = _sphere_points(n_points)
+    kdt = KDTree(coords, 10)
+    max_radius = float(radii.max())
+
+    for k, i in enumerate(indices):
+        r_i = radii[i]
+        neighbors = np.array([p.index for p in kdt.search(coords[i], r_i + max_radius) if p.index != i],
+                             dtype=np.int64)
+        points = sphere * r_i + coords[i]
+        if len(neighbors):
+            d2 = ((points[:, None, :] - coords[neighbors][None, :, :]) ** 2).sum(axis=2)
+            exposed = np.count_nonzero(~np.any(d2 < radii[neighbors] ** 2, axis=1))
+        else:
+            exposed = n_points
+        sasa[k] = 4 * math.pi * r_i * r_i * exposed / n_points
+    return sasa
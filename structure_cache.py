@@ -0,0 +1,229 @@
+# 文件：structure_cache.py
+# 多进程共享的结构数组缓存：数组以 .npy 落盘，各 worker 以 mmap 只读方式零拷贝挂载
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from structure_arrays import AtomArrays
+
+try:
+    import fcntl
+except ImportError:  # Windows 下退化为进程内锁
+    fcntl = None
+
+
+class SharedStructureCache:
+    """热门结构的坐标数组缓存，由一个小的共享索引协调 LRU 淘汰"""
+
+    INDEX_FILE = 'index.json'
+    LOCK_FILE = 'index.lock'
+    READ_RETRIES = 3
+
+    def __init__(self, cache_dir='.gene2pdb_cache/arrays', max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._attached = {}  # 本进程已挂载的结构
+        self._local_lock = threading.Lock()
+        # 命中次数先在进程内累计，下次写索引时合并（命中路径不加跨进程锁、不重写索引）
+        self._pending_hits = {}
+        self._hits_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---------- 共享索引 ----------
+    @contextmanager
+    def _locked_index(self):
+        """跨进程加锁读写索引"""
+        with self._local_lock:
+            lock_path = os.path.join(self.cache_dir, self.LOCK_FILE)
+            with open(lock_path, 'a') as lock_handle:
+                if fcntl:
+                    fcntl.flock(lock_handle, fcntl.LOCK_EX)
+                try:
+                    index = self._read_index()
+                    self._merge_pending_hits(index)
+                    self._prune_attached(index)
+                    yield index
+                    self._write_index(index)
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_handle, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE)) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    def _merge_pending_hits(self, index):
+        with self._hits_lock:
+            pending, self._pending_hits = self._pending_hits, {}
+        for key, hits in pending.items():
+            if key in index:
+                index[key]['hits'] = index[key].get('hits', 0) + hits
+
+    def _prune_attached(self, index):
+        """释放已被其他进程淘汰/失效的条目的 mmap"""
+        for key in list(self._attached):
+            if key not in index:
+                self._attached.pop(key, None)
+
+    def _last_access(self, key, entry):
+        """最近访问时间：索引记录与条目目录 mtime（命中时 touch）中较新的一个"""
+        try:
+            return max(entry['last_access'], os.stat(self._entry_dir(key)).st_mtime)
+        except OSError:
+            return entry['last_access']
+
+    def _write_index(self, index):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.json')
+        with os.fdopen(fd, 'w') as handle:
+            json.dump(index, handle)
+        os.replace(tmp_path, os.path.join(self.cache_dir, self.INDEX_FILE))
+
+    def _entry_dir(self, pdb_id):
+        return os.path.join(self.cache_dir, pdb_id.lower())
+
+    # ---------- 读写 ----------
+    def get(self, pdb_id):
+        """返回mmap挂载的 AtomArrays；未缓存时返回None"""
+        key = pdb_id.lower()
+        entry_dir = self._entry_dir(key)
+        for _ in range(self.READ_RETRIES):
+            try:
+                stamp = os.stat(os.path.join(entry_dir, 'coords.npy')).st_mtime_ns
+            except OSError:
+                self._attached.pop(key, None)
+                return None
+
+            # 条目被其他进程失效并重建后（修订同步）重新挂载
+            attached = self._attached.get(key)
+            if attached is None or attached[1] != stamp:
+                arrays = self._load(entry_dir, stamp)
+                if arrays is None:
+                    continue  # 挂载途中条目被淘汰或重建，重新读取
+                attached = self._attached[key] = (arrays, stamp)
+            break
+        else:
+            return None
+
+        # 访问记录：touch 条目目录供 LRU 淘汰参考，命中数留待下次写索引时合并
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        with self._hits_lock:
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+        return attached[0]
+
+    def _load(self, entry_dir, stamp):
+        """逐字段挂载；每个文件挂载后须仍带有同一写入版本（mtime == stamp）且长度一致，否则返回None"""
+        fields = []
+        try:
+            for f in AtomArrays.FIELDS:
+                path = os.path.join(entry_dir, f'{f}.npy')
+                data = np.load(path, mmap_mode='r')
+                if os.stat(path).st_mtime_ns != stamp:
+                    return None  # 新旧两次写入的文件混在一起
+                fields.append(data)
+        except (OSError, ValueError):
+            return None
+        if any(len(data) != len(fields[0]) for data in fields):
+            return None
+        return AtomArrays(*fields)
+
+    def _stamp(self, entry_dir):
+        """条目所有字段文件共同的写入版本；文件缺失或版本不一致时返回None"""
+        try:
+            stamps = {os.stat(os.path.join(entry_dir, f'{f}.npy')).st_mtime_ns for f in AtomArrays.FIELDS}
+        except OSError:
+            return None
+        return stamps.pop() if len(stamps) == 1 else None
+
+    def put(self, pdb_id, arrays):
+        """写入数组（先写临时目录再原子改名），返回mmap挂载后的版本"""
+        key = pdb_id.lower()
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=f'.{key}-')
+        version = time.time_ns()  # 同一次写入的所有文件共用一个 mtime，读取时据此校验
+        nbytes = 0
+        for f in AtomArrays.FIELDS:
+            data = np.ascontiguousarray(getattr(arrays, f))
+            path = os.path.join(tmp_dir, f'{f}.npy')
+            np.save(path, data)
+            os.utime(path, ns=(version, version))
+            nbytes += data.nbytes
+
+        entry_dir = self._entry_dir(key)
+        self._attached.pop(key, None)
+        with self._locked_index() as index:
+            if self._stamp(entry_dir) is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)  # 其他worker已写入
+            else:
+                shutil.rmtree(entry_dir, ignore_errors=True)  # 残缺或旧版本格式的条目
+                os.rename(tmp_dir, entry_dir)
+            index[key] = {'bytes': nbytes, 'last_access': time.time(),
+                          'hits': index.get(key, {}).get('hits', 0)}
+            self._evict(index, keep=key)
+
+        return self.get(key)
+
+    def get_or_build(self, pdb_id, builder):
+        """命中则直接挂载，否则调用 builder() 构建并写入缓存"""
+        arrays = self.get(pdb_id)
+        if arrays is not None:
+            return arrays
+        built = builder()
+        if built is None:
+            return None
+        return self.put(pdb_id, built)
+
+    def invalidate(self, pdb_id):
+        """删除某个结构的缓存数组（结构修订后调用）"""
+        key = pdb_id.lower()
+        self._attached.pop(key, None)
+        with self._locked_index() as index:
+            index.pop(key, None)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def atom_count(self, pdb_id):
+        """已缓存结构的原子数（只读 .npy 头）；未缓存时返回None"""
+        try:
+            return np.load(os.path.join(self._entry_dir(pdb_id), 'coords.npy'), mmap_mode='r').shape[0]
+        except (OSError, ValueError):
+            return None
+
+    def __contains__(self, pdb_id):
+        return os.path.exists(os.path.join(self._entry_dir(pdb_id), 'coords.npy'))
+
+    def cached_ids(self):
+        """当前缓存中的全部 PDB ID"""
+        index = self._read_index()
+        self._prune_attached(index)
+        return list(index)
+
+    def _evict(self, index, keep=None):
+        """超出容量时按最近访问时间淘汰（已挂载该结构的进程仍可继续读取）"""
+        total = sum(e['bytes'] for e in index.values())
+        for key in sorted(index, key=lambda k: self._last_access(k, index[k])):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= index.pop(key)['bytes']
+
+    def stats(self):
+        """缓存统计"""
+        with self._locked_index() as index:
+            return {
+                'entries': len(index),
+                'bytes': sum(e['bytes'] for e in index.values()),
+                'max_bytes': self.max_bytes,
+                'attached_in_process': len(self._attached),
+            }
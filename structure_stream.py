@@ -0,0 +1,80 @@
+# 文件：structure_stream.py
+# 流式结构统计：逐行读取坐标文件，一遍得到链/残基/原子计数与每条链的序列，不构建 Bio.PDB 对象树
+import gzip
+
+
+def iter_atom_records(pdb_file):
+    """
+    逐条产出第一个模型的原子记录 (chain, resname, resseq, icode, name, altloc, hetero)
+    只保存当前行，内存占用与文件大小无关
+    """
+    opener = gzip.open if str(pdb_file).endswith('.gz') else open
+    with opener(pdb_file, 'rt') as handle:
+        in_model = False
+        for line in handle:
+            record = line[:6]
+            if record == 'ATOM  ' or record == 'HETATM':
+                try:
+                    resseq = int(line[22:26])
+                except ValueError:
+                    continue
+                yield (line[21], line[17:20].strip(), resseq, line[26].strip(),
+                       line[12:16].strip(), line[16], record == 'HETATM')
+            elif record == 'MODEL ':
+                if in_model:
+                    return
+                in_model = True
+            elif record == 'ENDMDL':
+                return
+
+
+class StreamingStructureSummary:
+    """
+    单遍累加的结构摘要
+    残基边界规则与 AtomArrays.residue_starts 一致（链/编号/插入码变化即新残基），
+    交替构象只计第一个，与 Bio.PDB 的代表构象计数一致
+    """
+
+    def __init__(self, three_to_one):
+        self.three_to_one = three_to_one
+        self.num_atoms = 0
+        self.num_residues = 0
+        self.chain_order = []         # 出现顺序
+        self.sequences = {}           # 链 → 标准残基单字母列表
+        self._chains = set()
+        self._residue_key = None
+        self._residue_atoms = set()   # 当前残基已计的原子名（用于跳过交替构象）
+
+    def feed(self, record):
+        chain, resname, resseq, icode, name, altloc, hetero = record
+        key = (chain, resseq, icode)
+        if key != self._residue_key:
+            self._residue_key = key
+            self._residue_atoms = set()
+            self.num_residues += 1
+            if chain not in self._chains:
+                self._chains.add(chain)
+                self.chain_order.append(chain)
+            one_letter = self.three_to_one.get(resname)
+            if one_letter:
+                self.sequences.setdefault(chain, []).append(one_letter)
+        if altloc != ' ' and name in self._residue_atoms:
+            return
+        self._residue_atoms.add(name)
+        self.num_atoms += 1
+
+    @property
+    def num_chains(self):
+        return len(self.chain_order)
+
+    def chain_sequences(self):
+        """{chain_id: 单字母序列}"""
+        return {chain_id: ''.join(letters) for chain_id, letters in self.sequences.items()}
+
+
+def summarize_pdb_file(pdb_file, three_to_one):
+    """一遍扫描坐标文件，返回 StreamingStructureSummary"""
+    summary = StreamingStructureSummary(three_to_one)
+    for record in iter_atom_records(pdb_file):
+        summary.feed(record)
+    return summary
@@ -0,0 +1,57 @@
+# 文件：tests/test_result_store.py
+# 结果存储汇总列的回归测试
+import json
+import time
+
+import pytest
+
+from result_store import RESULT_VERSIONS, ResultStore
+
+
+def advanced_result(disulfides, salt_bridges):
+    """构造一条最小的高级分析结果（二硫键/盐桥与 analyze_advanced_structure 的返回结构一致）"""
+    return {
+        'pdb_id': '1tst',
+        'disulfide_bonds': {'count': disulfides, 'bonds': [{'residue1': f'A:CYS{i}'} for i in range(disulfides)]},
+        'salt_bridges': {'count': salt_bridges, 'bridges': [{'acid': f'A:ASP{i}'} for i in range(salt_bridges)]},
+        'hydrophobicity_per_chain': {'A': {'total_residues': 10, 'hydrophobic_count': 4}},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(f"sqlite:///{tmp_path / 'results.db'}")
+
+
+def summary(store, pdb_id):
+    return next(row for row in store.query(limit=1000) if row['pdb_id'] == pdb_id)
+
+
+def test_summary_counts_come_from_count_field(store):
+    store.put('1TST', 'advanced', {}, advanced_result(disulfides=3, salt_bridges=0))
+
+    row = summary(store, '1tst')
+    assert row['num_disulfide_bonds'] == 3
+    assert row['num_salt_bridges'] == 0
+    assert row['hydrophobic_ratio'] == 40.0
+    assert [r['pdb_id'] for r in store.query(min_disulfide_bonds=3)] == ['1tst']
+    assert store.query(min_salt_bridges=1) == []
+
+
+def test_stale_summary_columns_cleared_on_startup(store):
+    # 旧版本写入的错误汇总（dict 的 len() 恒为 2）
+    ph = store._ph
+    store._execute(
+        f"INSERT INTO analysis_results (pdb_id, kind, version, params, payload, created_at) "
+        f"VALUES ({ph}, {ph}, {ph}, {ph}, {ph}, {ph})",
+        ('2old', 'advanced', RESULT_VERSIONS['advanced'] - 1, '{}', json.dumps(advanced_result(5, 1)), time.time()))
+    store._execute(
+        f"INSERT INTO structure_summary (pdb_id, num_chains, num_disulfide_bonds, num_salt_bridges, updated_at) "
+        f"VALUES ({ph}, {ph}, {ph}, {ph}, {ph})", ('2old', 1, 2, 2, time.time()))
+    store.put('1tst', 'advanced', {}, advanced_result(disulfides=3, salt_bridges=0))
+
+    reopened = ResultStore(store.url)
+    stale = summary(reopened, '2old')
+    assert stale['num_disulfide_bonds'] is None and stale['num_salt_bridges'] is None
+    assert summary(reopened, '1tst')['num_disulfide_bonds'] == 3
+    assert reopened.get('2old', 'advanced') is None
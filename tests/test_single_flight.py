@@ -0,0 +1,50 @@
+# 文件：tests/test_single_flight.py
+# 单飞等待者继承领头线程的上游降级记录
+import threading
+import time
+
+import requests
+
+import upstream
+from single_flight import SingleFlight
+from upstream import UpstreamClient
+
+URL = 'https://www.ebi.ac.uk/pdbe/api/pdb/entry/summary/1tst'
+
+
+def test_waiter_inherits_degraded_upstream_events(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise requests.ConnectionError('upstream down')
+
+    monkeypatch.setattr(upstream.requests, 'get', unavailable)
+    http = UpstreamClient()
+    flight = SingleFlight(events=http)
+    key = ('info', ('pdb_id', '1tst'))
+
+    def compute():
+        response = http.get(URL)
+        # 等第二个调用者成为等待者后再返回
+        deadline = time.monotonic() + 5
+        while flight._calls[key].waiters == 0 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return {'pdb_id': '1tst', 'status': response.status_code}
+
+    results, events = {}, {}
+
+    def caller(name):
+        http.reset_events()
+        results[name] = flight.do(key, compute)
+        events[name] = http.request_events()
+
+    threads = [threading.Thread(target=caller, args=(name,)) for name in ('leader', 'waiter')]
+    threads[0].start()
+    while key not in flight._calls:
+        time.sleep(0.001)
+    threads[1].start()
+    for thread in threads:
+        thread.join(10)
+
+    assert flight.status()['shared'] == 1
+    assert results['leader'] == results['waiter'] == {'pdb_id': '1tst', 'status': 503}
+    for name in ('leader', 'waiter'):
+        assert [(e['upstream'], e['kind']) for e in events[name]] == [('pdbe', 'degraded')]
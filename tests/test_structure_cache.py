@@ -0,0 +1,46 @@
+# 文件：tests/test_structure_cache.py
+# 共享结构缓存：挂载途中条目被重建时不会混用新旧两次写入的数组
+import numpy as np
+
+import structure_cache
+from structure_arrays import AtomArrays
+from structure_cache import SharedStructureCache
+
+
+def atom_arrays(n, chain):
+    return AtomArrays(
+        coords=np.zeros((n, 3), dtype=np.float32),
+        chain=np.array([chain] * n),
+        resname=np.array(['ALA'] * n),
+        resseq=np.arange(n, dtype=np.int32),
+        icode=np.array([' '] * n),
+        name=np.array(['CA'] * n),
+        element=np.array(['C'] * n),
+        hetero=np.zeros(n, dtype=bool),
+    )
+
+
+def test_get_does_not_mix_old_and_new_entry(tmp_path, monkeypatch):
+    cache = SharedStructureCache(str(tmp_path))
+    writer = SharedStructureCache(str(tmp_path))  # 模拟另一个 worker
+    cache.put('1TST', atom_arrays(4, 'A'))
+    cache._attached.clear()
+
+    real_load = np.load
+    rebuilt = []
+
+    def load(path, *args, **kwargs):
+        data = real_load(path, *args, **kwargs)
+        if not rebuilt and str(path).endswith('coords.npy'):
+            # 读完旧坐标后，另一个 worker 完成修订同步：失效并写入新版本
+            rebuilt.append(True)
+            writer.invalidate('1tst')
+            writer.put('1tst', atom_arrays(6, 'B'))
+        return data
+
+    monkeypatch.setattr(structure_cache.np, 'load', load)
+    arrays = cache.get('1tst')
+
+    assert rebuilt
+    assert len(arrays.coords) == len(arrays.chain) == 6
+    assert set(arrays.chain) == {'B'}
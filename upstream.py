@@ -0,0 +1,273 @@
+# 文件：upstream.py
+# 外部接口（PDBe / RCSB / UniProt）访问层：按上游熔断、404负缓存、过期数据先返回再后台刷新
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse
+
+import requests
+
+# 域名 → 上游名称（每个上游一个熔断器）
+UPSTREAM_NAMES = {
+    'www.ebi.ac.uk': 'pdbe',
+    'data.rcsb.org': 'rcsb',
+    'search.rcsb.org': 'rcsb',
+    'rest.uniprot.org': 'uniprot',
+}
+
+# 设置后所有外部请求改发到该地址（https://host/path → {UPSTREAM_BASE}/host/path），用于负载测试的本地替身
+UPSTREAM_BASE = os.environ.get('GENE2PDB_UPSTREAM_BASE', '').rstrip('/')
+
+
+def rewrite_url(url):
+    """按 UPSTREAM_BASE 改写外部地址；未设置时原样返回"""
+    if not UPSTREAM_BASE:
+        return url
+    parsed = urlparse(url)
+    return f"{UPSTREAM_BASE}/{parsed.netloc}{parsed.path}" + (f"?{parsed.query}" if parsed.query else '')
+
+
+class UpstreamResponse:
+    """与 requests.Response 用法一致的精简响应（status_code / json() / text）"""
+
+    def __init__(self, status_code, text='', source='network', stale=False, degraded=False):
+        self.status_code = status_code
+        self.text = text
+        self.source = source        # network / cache / negative_cache / stale_cache / unavailable
+        self.stale = stale
+        self.degraded = degraded
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class CircuitBreaker:
+    """
+    连续失败或慢响应达到阈值后熔断；熔断期间直接拒绝调用，
+    reset_timeout 后放行一个探测请求，成功则恢复
+    """
+
+    def __init__(self, name, failure_threshold=5, slow_call_seconds=5.0, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'trips': 0}
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probe_in_flight = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record(self, ok, elapsed):
+        """记录一次调用结果；成功但超过 slow_call_seconds 也按失败计"""
+        slow = elapsed > self.slow_call_seconds
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['slow_calls'] += int(slow)
+            self._probe_in_flight = False
+            if ok and not slow:
+                self.failures = 0
+                self.state = 'closed'
+                return
+            self.stats['failures'] += int(not ok)
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.stats['trips'] += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats, state=self.state, consecutive_failures=self.failures)
+
+
+class UpstreamClient:
+    """
+    带缓存的上游GET客户端
+    - 200 在 fresh_ttl 内直接命中；超过 fresh_ttl、未超过 stale_ttl 时先返回旧数据并在后台刷新
+    - 404 负缓存 negative_ttl 秒
+    - 上游熔断或请求失败时退回旧数据（标记 degraded），没有旧数据则返回 503
+    """
+
+    def __init__(self, timeout=(3.05, 10), fresh_ttl=3600, stale_ttl=7 * 86400, negative_ttl=3600,
+                 max_entries=4096, breaker_options=None):
+        self.timeout = timeout
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.breaker_options = breaker_options or {}
+        self.breakers = {}
+        self._cache = OrderedDict()  # key -> (status_code, text, fetched_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upstream-refresh')
+
+    # ---------- 降级记录 ----------
+    def _events(self):
+        if not hasattr(self._local, 'events'):
+            self._local.events = deque(maxlen=50)
+            self._local.count = 0
+        return self._local.events
+
+    def _note(self, upstream, url, kind, reason):
+        self._events().append({'upstream': upstream, 'url': url, 'kind': kind, 'reason': reason})
+        self._local.count += 1
+
+    def reset_events(self):
+        """开始一次新的请求记录（Flask before_request 调用）"""
+        self._events().clear()
+
+    def request_events(self):
+        """本线程自上次 reset_events 以来返回过期/降级数据的记录"""
+        return list(self._events())
+
+    def event_count(self):
+        """本线程累计的过期/降级次数（用于判断一段计算是否用到了降级数据）"""
+        self._events()
+        return self._local.count
+
+    def events_since(self, count):
+        """本线程自累计次数为 count 以来新增的记录（最多保留最近 50 条）"""
+        events = self._events()
+        added = self._local.count - count
+        return list(events)[-added:] if added > 0 else []
+
+    def replay_events(self, events):
+        """把其他线程的记录计入本线程（单飞等待者共享领头线程的结果时，同时继承其降级情况）"""
+        for event in events:
+            self._events().append(dict(event))
+            self._local.count += 1
+
+    # ---------- 熔断器 ----------
+    def breaker_for(self, url):
+        host = urlparse(url).netloc
+        return self.breaker_named(UPSTREAM_NAMES.get(host, host))
+
+    def breaker_named(self, name):
+        with self._lock:
+            if name not in self.breakers:
+                self.breakers[name] = CircuitBreaker(name, **self.breaker_options)
+            return self.breakers[name]
+
+    # ---------- 请求 ----------
+    @staticmethod
+    def _key(url, params):
+        return url + ('?' + urlencode(sorted(params.items())) if params else '')
+
+    def _store(self, key, status_code, text):
+        with self._lock:
+            self._cache[key] = (status_code, text, time.time())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _fetch(self, key, url, params, breaker):
+        """实际请求上游；返回 UpstreamResponse，失败返回None"""
+        start = time.monotonic()
+        try:
+            response = requests.get(rewrite_url(url), params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            breaker.record(False, time.monotonic() - start)
+            print(f"⚠️  上游 {breaker.name} 请求失败: {e}")
+            return None
+        elapsed = time.monotonic() - start
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record(False, elapsed)
+            return None
+        breaker.record(True, elapsed)
+        if response.status_code in (200, 404):
+            self._store(key, response.status_code, response.text)
+        return UpstreamResponse(response.status_code, response.text)
+
+    def _refresh(self, key, url, params, breaker):
+        try:
+            if breaker.allow():
+                self._fetch(key, url, params, breaker)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, url, params=None):
+        """GET请求；返回值可像 requests.Response 一样使用"""
+        key = self._key(url, params)
+        breaker = self.breaker_for(url)
+        with self._lock:
+            entry = self._cache.get(key)
+        age = time.time() - entry[2] if entry else None
+
+        if entry and entry[0] == 404 and age < self.negative_ttl:
+            return UpstreamResponse(404, entry[1], source='negative_cache')
+        if entry and entry[0] == 200:
+            if age < self.fresh_ttl:
+                return UpstreamResponse(200, entry[1], source='cache')
+            if age < self.stale_ttl:
+                # 先返回旧数据，后台刷新
+                with self._lock:
+                    schedule = key not in self._refreshing
+                    self._refreshing.add(key)
+                if schedule:
+                    self._executor.submit(self._refresh, key, url, params, breaker)
+                self._note(breaker.name, url, 'stale', f'缓存已过期 {int(age)} 秒，后台刷新中')
+                return UpstreamResponse(200, entry[1], source='stale_cache', stale=True)
+
+        if breaker.allow():
+            response = self._fetch(key, url, params, breaker)
+            if response is not None:
+                return response
+            reason = '上游请求失败'
+        else:
+            reason = '上游已熔断'
+
+        if entry and entry[0] == 200:
+            self._note(breaker.name, url, 'degraded', f'{reason}，返回缓存数据')
+            return UpstreamResponse(200, entry[1], source='stale_cache', stale=True, degraded=True)
+        self._note(breaker.name, url, 'degraded', f'{reason}，无可用缓存')
+        return UpstreamResponse(503, '', source='unavailable', degraded=True)
+
+    def call(self, upstream, func, *args, **kwargs):
+        """
+        经熔断器调用不走HTTP GET的上游客户端（如 gget 访问的 Ensembl）
+        熔断或调用失败时记录降级并返回None，由调用方走备用方案
+        """
+        breaker = self.breaker_named(upstream)
+        label = f"{upstream}/{getattr(func, '__name__', 'call')}"
+        if not breaker.allow():
+            self._note(upstream, label, 'degraded', '上游已熔断')
+            return None
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            breaker.record(False, time.monotonic() - start)
+            print(f"⚠️  上游 {upstream} 请求失败: {e}")
+            self._note(upstream, label, 'degraded', '上游请求失败')
+            return None
+        breaker.record(True, time.monotonic() - start)
+        return result
+
+    def status(self):
+        """各上游熔断器与缓存状态"""
+        with self._lock:
+            breakers = list(self.breakers.values())
+            entries = len(self._cache)
+        return {'cache_entries': entries, 'breakers': {b.name: b.status() for b in breakers}}
@@ -0,0 +1,246 @@
+# 文件：variant_annotation.py
+# 批量变异注释：每个基因只解析一次，变异按覆盖它的结构分组，每个结构只下载/解析/跑一次DSSP与SASA
+# 命令行：python variant_annotation.py variants.tsv -o annotated.tsv
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from residue_properties import AMINO_ACID_PROPERTIES, THREE_TO_ONE
+from serialization import json_default
+from structure_arrays import atomic_radii, shrake_rupley
+
+# DSSP 二级结构代码 → 名称
+SS_NAMES = {
+    'H': 'α-螺旋', 'G': '3₁₀-螺旋', 'I': 'π-螺旋',
+    'E': 'β-折叠', 'B': 'β-桥', 'T': '转角',
+    'S': '弯曲', '-': '环区'
+}
+
+# 残基完全暴露时的最大可及表面积（Å²，Tien et al. 2013 理论值），用于计算相对可及表面积
+MAX_ASA = {
+    'A': 129.0, 'R': 274.0, 'N': 195.0, 'D': 193.0, 'C': 167.0, 'E': 223.0, 'Q': 225.0,
+    'G': 104.0, 'H': 224.0, 'I': 197.0, 'L': 201.0, 'K': 236.0, 'M': 224.0, 'F': 240.0,
+    'P': 159.0, 'S': 155.0, 'T': 172.0, 'W': 285.0, 'Y': 263.0, 'V': 174.0,
+}
+# 相对可及表面积低于该值视为埋藏残基
+BURIED_RSA = 0.25
+
+# 输入表中基因列与变异列的可用列名（不区分大小写）
+GENE_COLUMNS = ('gene', 'gene_name', 'symbol', 'hugo_symbol')
+VARIANT_COLUMNS = ('variant', 'protein_change', 'hgvsp', 'hgvs_p', 'mutation', 'aa_change')
+
+# 输出列（输入表的其他列原样放在前面）
+OUTPUT_FIELDS = (
+    'index', 'gene', 'variant', 'uniprot_id', 'uniprot_position', 'wild_type', 'mutant',
+    'pdb_id', 'chain', 'pdb_residue', 'resolution', 'found_residue', 'matches_wt',
+    'secondary_structure', 'relative_sasa', 'buried',
+    'charge_change', 'volume_change', 'hydrophobicity_change', 'polarity_change',
+    'impact_score', 'impact_level', 'impact_reasons', 'warning', 'error',
+)
+
+_THREE_LETTER = {three.capitalize(): one for three, one in THREE_TO_ONE.items()}
+_ONE_LETTER_CHANGE = re.compile(r'^(?:P\.)?([A-Z])(\d+)([A-Z])$')
+_THREE_LETTER_CHANGE = re.compile(r'^(?:p\.)?\(?([A-Z][a-z]{2})(\d+)([A-Z][a-z]{2})\)?$')
+
+
+def parse_protein_change(text):
+    """
+    蛋白层面的错义变异 → (野生型, UniProt位置, 突变型)；无法识别时返回None
+    支持 R1699W、p.R1699W、p.Arg1699Trp、p.(Arg1699Trp)
+    """
+    text = str(text or '').strip()
+    match = _THREE_LETTER_CHANGE.match(text)
+    if match:
+        wt, mut = _THREE_LETTER.get(match.group(1)), _THREE_LETTER.get(match.group(3))
+        position = match.group(2)
+    else:
+        match = _ONE_LETTER_CHANGE.match(text.upper())
+        if not match:
+            return None
+        wt, position, mut = match.groups()
+    if wt not in AMINO_ACID_PROPERTIES or mut not in AMINO_ACID_PROPERTIES or int(position) < 1:
+        return None
+    return wt, int(position), mut
+
+
+def substitution_impact(wt_aa, mut_aa):
+    """
+    按理化性质评估替换：电荷、体积、疏水性、极性
+    返回 {'charge_change', 'volume_change', 'hydrophobicity_change', 'polarity_change', 'score', 'reasons'}
+    """
+    wt_props, mut_props = AMINO_ACID_PROPERTIES[wt_aa], AMINO_ACID_PROPERTIES[mut_aa]
+    charge_change = mut_props['charge'] - wt_props['charge']
+    volume_change = mut_props['volume'] - wt_props['volume']
+    hydrophobicity_change = mut_props['hydrophobic'] != wt_props['hydrophobic']
+    polarity_change = mut_props['polar'] != wt_props['polar']
+
+    score = 0
+    reasons = []
+    if abs(charge_change) >= 1:
+        score += 3
+        reasons.append(f"电荷变化: {'+' if charge_change > 0 else ''}{charge_change}")
+
+    if abs(volume_change) > 50:
+        score += 2
+        reasons.append(f"体积变化: {'+' if volume_change > 0 else ''}{volume_change:.1f}Å³")
+    elif abs(volume_change) > 20:
+        score += 1
+        reasons.append(f"中等体积变化: {'+' if volume_change > 0 else ''}{volume_change:.1f}Å³")
+
+    if hydrophobicity_change:
+        score += 2
+        if wt_props['hydrophobic']:
+            reasons.append("疏水 → 亲水 (可能影响蛋白折叠)")
+        else:
+            reasons.append("亲水 → 疏水 (可能影响溶解性)")
+
+    if polarity_change:
+        score += 1
+        reasons.append("极性变化")
+
+    return {'charge_change': charge_change, 'volume_change': volume_change,
+            'hydrophobicity_change': hydrophobicity_change, 'polarity_change': polarity_change,
+            'score': score, 'reasons': reasons}
+
+
+def impact_level(score):
+    """影响评分 → (等级, 说明)"""
+    if score >= 5:
+        return "高", "该突变可能严重影响蛋白结构或功能"
+    if score >= 3:
+        return "中", "该突变可能对蛋白有中等程度的影响"
+    return "低", "该突变可能是保守性替换，影响较小"
+
+
+def residue_burial(arrays, residues, probe_radius=1.40):
+    """
+    指定残基的相对可及表面积 {(chain, resseq, icode): rsa}
+    只计算这些残基原子的SASA，结构中其余非水重原子作为遮挡；非标准残基不出现在结果中
+    """
+    if not residues or not len(arrays):
+        return {}
+    occluders = np.nonzero((arrays.resname != 'HOH') & (arrays.element != 'H') & (arrays.element != 'D'))[0]
+    if not len(occluders):
+        return {}
+    chain, resseq, icode = arrays.chain[occluders], arrays.resseq[occluders], arrays.icode[occluders]
+    wanted = set(residues)
+    # 先按作者编号粗筛，只对候选原子逐个比对链与插入码
+    candidates = np.nonzero(np.isin(resseq, [r for _, r, _ in wanted]))[0]
+    targets = np.array([k for k in candidates if (str(chain[k]), int(resseq[k]), str(icode[k]).strip()) in wanted],
+                       dtype=np.int64)
+    if not len(targets):
+        return {}
+
+    sasa = shrake_rupley(arrays.coords[occluders], atomic_radii(arrays.element[occluders]),
+                         probe_radius=probe_radius, indices=targets)
+    totals, resnames = {}, {}
+    for k, value in zip(targets, sasa):
+        key = (str(chain[k]), int(resseq[k]), str(icode[k]).strip())
+        totals[key] = totals.get(key, 0.0) + float(value)
+        resnames[key] = THREE_TO_ONE.get(str(arrays.resname[occluders[k]]))
+    return {key: round(min(total / MAX_ASA[resnames[key]], 1.0), 3)
+            for key, total in totals.items() if resnames[key]}
+
+
+def normalize_records(records):
+    """
+    输入记录（dict列表）→ [{'gene', 'variant', 'extra': {其他列}}]
+    基因列与变异列按 GENE_COLUMNS / VARIANT_COLUMNS 识别；缺少时抛出 ValueError
+    """
+    records = list(records)
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    lowered = {str(c).strip().lower(): c for c in columns}
+    gene_col = next((lowered[c] for c in GENE_COLUMNS if c in lowered), None)
+    variant_col = next((lowered[c] for c in VARIANT_COLUMNS if c in lowered), None)
+    if records and (gene_col is None or variant_col is None):
+        raise ValueError(f"输入须包含基因列（{'/'.join(GENE_COLUMNS)}）与变异列（{'/'.join(VARIANT_COLUMNS)}）")
+    extra_columns = [c for c in columns if c not in (gene_col, variant_col)]
+    normalized = [{'gene': str(record.get(gene_col) or '').strip(),
+                   'variant': str(record.get(variant_col) or '').strip(),
+                   'extra': {c: record.get(c, '') for c in extra_columns}} for record in records]
+    return normalized, extra_columns
+
+
+def read_variant_table(text):
+    """CSV/TSV 文本 → dict列表（按首行自动识别分隔符；# 开头的行视为注释）"""
+    lines = [line for line in text.splitlines() if line.strip() and not line.startswith('#')]
+    if not lines:
+        return []
+    delimiter = '\t' if '\t' in lines[0] else ','
+    return list(csv.DictReader(io.StringIO('\n'.join(lines)), delimiter=delimiter))
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return '; '.join(str(v) for v in value)
+    return str(value)
+
+
+def format_rows(rows, fmt='ndjson', extra_columns=()):
+    """注释行 → 逐行文本：ndjson 每行一个JSON对象；tsv 先输出表头"""
+    if fmt == 'tsv':
+        header = list(extra_columns) + list(OUTPUT_FIELDS)
+        yield '\t'.join(header) + '\n'
+        for row in rows:
+            yield '\t'.join(_cell(row.get(c)).replace('\t', ' ') for c in header) + '\n'
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False, default=json_default) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量注释错义变异：每个结构只解析一次，逐行流式输出')
+    parser.add_argument('input', help='变异表（CSV/TSV，须含 gene 与 variant 列；- 表示标准输入）')
+    parser.add_argument('-o', '--output', default='-', help='输出文件（默认标准输出）')
+    parser.add_argument('--format', choices=('tsv', 'ndjson'), default='tsv', help='输出格式')
+    parser.add_argument('--species', default='human', help='基因所属物种')
+    parser.add_argument('--pdb-dir', default='.', help='坐标文件目录（与服务的 pdb_dir 相同）')
+    parser.add_argument('--verbose', action='store_true', help='显示每个结构的分析日志')
+    args = parser.parse_args()
+
+    from pdb_sync import build_analyzer, sync_config_from_env
+
+    if args.input == '-':
+        text = sys.stdin.read()
+    else:
+        with open(args.input, encoding='utf-8') as handle:
+            text = handle.read()
+    records, extra_columns = normalize_records(read_variant_table(text))
+    analyzer = build_analyzer(sync_config_from_env(args.pdb_dir))
+
+    started = time.time()
+    counts = {'annotated': 0, 'failed': 0}
+
+    def counted(rows):
+        for row in rows:
+            counts['failed' if row.get('error') else 'annotated'] += 1
+            yield row
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        # 分析日志写到标准错误（--verbose）或丢弃，不混入结果
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(sys.stderr if args.verbose else devnull):
+            rows = counted(analyzer.annotate_variants(records, species=args.species))
+            for line in format_rows(rows, args.format, extra_columns):
+                out.write(line)
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"🎉 注释完成 ({time.time() - started:.1f}s)：{counts['annotated']} 个变异已注释，"
+          f"{counts['failed']} 个无法注释", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()